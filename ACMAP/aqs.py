@@ -15,7 +15,7 @@ from netCDF4 import Dataset
 import statsmodels.formula.api as smf
 import logging
 # logging.basicConfig(level=logging.INFO)
-from popy import popy,datetime2datenum,datedev_py,Level3_List
+from popy import popy,datetime2datenum,datedev_py,Level3_List,F_polygon_mask,F_points_in_polygons
 
 class Monitor():
     '''class for an individual aqs monitor'''
@@ -86,8 +86,7 @@ class Monitor():
         l2g = {k:v[mask,] for (k,v) in l2g_data.items()}
         
         if if_strict_overlap and len(l2g['latc']) > 0:
-            mask = np.array([path.Path([(x,y) for x,y in zip(lonr,latr)]).contains_point([self.lon,self.lat])\
-                             for lonr,latr in zip(l2g['lonr'],l2g['latr'])])
+            mask = F_points_in_polygons(self.lon,self.lat,l2g['lonr'],l2g['latr'])
             l2g = {k:v[mask,] for (k,v) in l2g.items()}
         
         if 'n_pixel_per_monitor' in df.keys():
@@ -564,12 +563,7 @@ class AQS():
                                          'era5_t2m','era5_blh','surface_pressure'])
         l3 = l3ds.aggregate()
         # create region mask
-        lonmesh,latmesh = np.meshgrid(l3['xgrid'],l3['ygrid'])
-        region_mask = np.zeros(l3['num_samples'].shape,dtype=bool)
-        for xy in self.xys:
-            boundary_polygon = path.Path([(x,y) for x,y in zip(*xy)])
-            all_points = np.column_stack((lonmesh.ravel(),latmesh.ravel()))
-            region_mask = region_mask | boundary_polygon.contains_points(all_points).reshape(lonmesh.shape)
+        region_mask = F_polygon_mask(l3['xgrid'],l3['ygrid'],self.xys)
         # create topo mask
         min_windtopo = topo_kw.pop('min_windtopo',0.001)
         max_windtopo = topo_kw.pop('max_windtopo',0.1)
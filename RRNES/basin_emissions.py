@@ -5,7 +5,7 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import geopandas as gpd
 import logging
-from popy import Level3_Data, F_center2edge, Level3_List
+from popy import Level3_Data, F_center2edge, Level3_List, F_polygon_mask
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from matplotlib.axes import Axes
@@ -13,10 +13,32 @@ from cartopy.mpl.geoaxes import GeoAxes
 GeoAxes._pcolormesh_patched = Axes.pcolormesh
 from matplotlib import path 
 
+def F_overlap_matrix(src_edges,dst_edges):
+    '''sparse (ndst, nsrc) matrix of overlap lengths between 1d source and destination cells
+    src_edges, dst_edges:
+        ascending cell edges, (nsrc+1,) and (ndst+1,)
+    '''
+    from scipy.sparse import coo_matrix
+    nsrc = len(src_edges)-1;ndst = len(dst_edges)-1
+    first = np.clip(np.searchsorted(dst_edges,src_edges[:-1],side='right')-1,0,ndst)
+    last = np.clip(np.searchsorted(dst_edges,src_edges[1:],side='left'),0,ndst)
+    noverlap = np.maximum(last-first,0)
+    isrc = np.repeat(np.arange(nsrc),noverlap)
+    idst = first[isrc]+np.arange(len(isrc))-np.repeat(np.cumsum(noverlap)-noverlap,noverlap)
+    length = np.minimum(src_edges[1:][isrc],dst_edges[1:][idst])-np.maximum(src_edges[:-1][isrc],dst_edges[:-1][idst])
+    keep = length > 0
+    return coo_matrix((length[keep],(idst[keep],isrc[keep])),shape=(ndst,nsrc)).tocsr()
+
 class Inventory(dict):
     '''class based on dict, representing a gridded emission inventory'''
+    # number of target grids whose overlap matrices are kept by get_overlap
+    overlap_cache_size = 8
+    
     def __init__(self,name=None,west=-180,east=180,south=-90,north=90):
+        from collections import OrderedDict
         self.logger = logging.getLogger(__name__)
+        # sparse overlap matrices for conservative regridding, keyed by source and target grids
+        self.overlap_cache = OrderedDict()
         self.name = name
         self.west = west
         self.east = east
@@ -65,8 +87,37 @@ class Inventory(dict):
         self['grid_size_in_m2'] = grid_size_in_m2
         return self
     
+    def get_overlap(self,xgrid,ygrid,grid_size):
+        '''x and y overlap matrices from self's grid to cells of grid_size centered at x/ygrid,
+        cached per (source grid, target grid) pair in a per-inventory lru of overlap_cache_size.
+        the 2d overlap is their outer product
+        '''
+        import hashlib
+        h = hashlib.md5()
+        for a in [self['xgrid'],self['ygrid'],[self.grid_size],xgrid,ygrid,[grid_size]]:
+            h.update(np.ascontiguousarray(a,dtype=np.float64).tobytes())
+        key = h.hexdigest()
+        if key in self.overlap_cache:
+            self.overlap_cache.move_to_end(key)
+        else:
+            overlaps = []
+            for src_grid,dst_grid in zip([self['xgrid'],self['ygrid']],[xgrid,ygrid]):
+                order = np.argsort(src_grid)
+                src_edges = np.append(src_grid[order]-self.grid_size/2,src_grid[order][-1]+self.grid_size/2)
+                dst_edges = np.append(dst_grid-grid_size/2,dst_grid[-1]+grid_size/2)
+                # columns back in the source order
+                overlaps.append(F_overlap_matrix(src_edges,dst_edges)[:,np.argsort(order)].tocsr())
+            self.overlap_cache[key] = overlaps
+            while len(self.overlap_cache) > self.overlap_cache_size:
+                self.overlap_cache.popitem(last=False)
+        return self.overlap_cache[key]
+    
     def regrid(self,l3,fields_to_copy=None,method=None):
-        '''regrid inventory to match a l3 data object'''
+        '''regrid inventory to match a l3 data object
+        method:
+            'interpolate', 'drop_in_the_box' (mean of source cells whose centers fall in each l3
+            cell), or 'conservative' (area-weighted mean of source cells by overlap)
+        '''
         from scipy.interpolate import RegularGridInterpolator
         if fields_to_copy is None:
             fields_to_copy = ['vcd','wind_topo','surface_altitude']
@@ -92,15 +143,27 @@ class Inventory(dict):
             f = RegularGridInterpolator((self['ygrid'],self['xgrid']),self['data'],bounds_error=False)
             inv['data'] = f((ymesh,xmesh)).T
         elif method in ['drop_in_the_box']:
-            data = np.full((len(inv['ygrid']),len(inv['xgrid'])),np.nan)
-            for iy,y in enumerate(inv['ygrid']):
-                ymask = (self['ygrid']>=y-inv.grid_size/2) & (self['ygrid']<y+inv.grid_size/2)
-                for ix,x in enumerate(inv['xgrid']):
-                    xmask = (self['xgrid']>=x-inv.grid_size/2) & (self['xgrid']<x+inv.grid_size/2)
-                    if np.sum(ymask) == 0 and np.sum(xmask) == 0:
-                        continue
-                    data[iy,ix] = np.nanmean(self['data'][np.ix_(ymask,xmask)])
-            inv['data'] = data
+            nrow,ncol = len(inv['ygrid']),len(inv['xgrid'])
+            col = np.floor((self['xgrid']-(inv['xgrid'][0]-inv.grid_size/2))/inv.grid_size).astype(int)
+            row = np.floor((self['ygrid']-(inv['ygrid'][0]-inv.grid_size/2))/inv.grid_size).astype(int)
+            col_ok = (col >= 0) & (col < ncol)
+            row_ok = (row >= 0) & (row < nrow)
+            data = self['data'][np.ix_(row_ok,col_ok)]
+            cell = (row[row_ok][:,np.newaxis]*ncol+col[col_ok][np.newaxis,:]).ravel()
+            finite = np.isfinite(data.ravel())
+            total = np.bincount(cell[finite],weights=data.ravel()[finite],minlength=nrow*ncol)
+            count = np.bincount(cell[finite],minlength=nrow*ncol)
+            with np.errstate(invalid='ignore',divide='ignore'):
+                inv['data'] = (total/count).reshape(nrow,ncol)
+        elif method in ['conservative']:
+            xoverlap,yoverlap = self.get_overlap(inv['xgrid'],inv['ygrid'],inv.grid_size)
+            # source cell areas scale with cos(lat)
+            area = np.cos(np.deg2rad(self['ygrid']))[:,np.newaxis]
+            finite = np.isfinite(self['data'])
+            above = yoverlap@(np.where(finite,self['data'],0.)*area)@xoverlap.T
+            below = yoverlap@(finite*area)@xoverlap.T
+            with np.errstate(invalid='ignore',divide='ignore'):
+                inv['data'] = np.where(below > 0,above/below,np.nan)
         for field in fields_to_copy:
             if field in l3.keys():
                 inv[field] = l3[field].copy()
@@ -286,15 +349,9 @@ class Basin():
             
         if fit_topo_kw is None and fit_chem_kw is None and fit_bc_kw is None:#for sub domain
             if hasattr(l3s[0].topo_fit,'bootstrap_params'):
-                b_sum_mat = np.full((len(l3s),l3s[0].topo_fit.nbootstrap),np.nan)
-                for il,l in enumerate(l3s):
-                    for ib,bparam in enumerate(l.topo_fit.bootstrap_params):
-                        b_field_name = f'wind_column_topo_b{ib}'
-                        l[b_field_name] = l['wind_column'] - bparam['wt']*l['wind_topo']
-                        #always remove intercept for subdomains
-                        l[b_field_name] -= bparam['Intercept']
-                        b_sum_mat[il,ib] = l.sum_by_mask(xys=self.xys,fields_to_sum=[b_field_name])[b_field_name]
-                        l.pop(b_field_name)
+                #always remove intercept for subdomains
+                b_sum_mat = self.get_bootstrap_sum_mat(l3s,'topo_fit','wind_column',{'wt':'wind_topo'},
+                                                       remove_intercept=True)
                 l3s.topo_b_sum_mat = b_sum_mat
                 l3s.df['summed_wind_column_topo_std'] = np.std(b_sum_mat,axis=1)
                 for percentile in [1,2.5,5,10,25,50,75,90,95,97.5,99]:
@@ -302,17 +359,9 @@ class Basin():
             
             if hasattr(l3s[0],'bc_fit'):
                 if hasattr(l3s[0].bc_fit,'bootstrap_params'):
-                    b_sum_mat = np.full((len(l3s),l3s[0].bc_fit.nbootstrap),np.nan)
-                    for il,l in enumerate(l3s):
-                        for ib,bparam in enumerate(l.bc_fit.bootstrap_params):
-                            b_field_name = f'wind_column_topo_bc_b{ib}'
-                            l[b_field_name] = l['wind_column_topo'].copy()
-                            for bc_field in l.bc_fields:
-                                l[b_field_name] -= bparam[bc_field]*l[bc_field]
-                            #always remove intercept for subdomains
-                            l[b_field_name] -= bparam['Intercept']
-                            b_sum_mat[il,ib] = l.sum_by_mask(xys=self.xys,fields_to_sum=[b_field_name])[b_field_name]
-                            l.pop(b_field_name)
+                    #always remove intercept for subdomains
+                    b_sum_mat = self.get_bootstrap_sum_mat(l3s,'bc_fit','wind_column_topo',
+                                                           remove_intercept=True)
                     l3s.bc_b_sum_mat = b_sum_mat
                     l3s.df['summed_wind_column_topo_bc_std'] = np.std(b_sum_mat,axis=1)
                     for percentile in [1,2.5,5,10,25,50,75,90,95,97.5,99]:
@@ -332,16 +381,8 @@ class Basin():
             fit_topo_kw['nbootstrap'] = None
         l3s.fit_topography(**fit_topo_kw)
         if fit_topo_kw['nbootstrap'] is not None:
-            b_sum_mat = np.full((len(l3s),fit_topo_kw['nbootstrap']),np.nan)
-            for il,l in enumerate(l3s):
-                for ib,bparam in enumerate(l.topo_fit.bootstrap_params):
-                    b_field_name = f'wind_column_topo_b{ib}'
-                    l[b_field_name] = l['wind_column'] - bparam['wt']*l['wind_topo']
-                    if 'remove_intercept' in fit_topo_kw.keys():
-                        if fit_topo_kw['remove_intercept']:
-                            l[b_field_name] -= bparam['Intercept']
-                    b_sum_mat[il,ib] = l.sum_by_mask(xys=self.xys,fields_to_sum=[b_field_name])[b_field_name]
-                    l.pop(b_field_name)
+            b_sum_mat = self.get_bootstrap_sum_mat(l3s,'topo_fit','wind_column',{'wt':'wind_topo'},
+                                                   remove_intercept=fit_topo_kw.get('remove_intercept',False))
             
             l3s.topo_b_sum_mat = b_sum_mat
             l3s.df['summed_wind_column_topo_std'] = np.std(b_sum_mat,axis=1)
@@ -368,18 +409,8 @@ class Basin():
                     else:
                         fit_bc_kw['nbootstrap'] = None
                 if fit_bc_kw['nbootstrap'] is not None or fit_bc_kw['if_propagate_bootstrap']:
-                    b_sum_mat = np.full((len(l3s),fit_bc_kw['nbootstrap']),np.nan)
-                    for il,l in enumerate(l3s):
-                        for ib,bparam in enumerate(l.bc_fit.bootstrap_params):
-                            b_field_name = f'wind_column_topo_bc_b{ib}'
-                            l[b_field_name] = l['wind_column_topo'].copy()
-                            for bc_field in l.bc_fields:
-                                l[b_field_name] -= bparam[bc_field]*l[bc_field]
-                            if 'remove_intercept' in fit_bc_kw.keys():
-                                if fit_bc_kw['remove_intercept']:
-                                    l[b_field_name] -= bparam['Intercept']
-                            b_sum_mat[il,ib] = l.sum_by_mask(xys=self.xys,fields_to_sum=[b_field_name])[b_field_name]
-                            l.pop(b_field_name)
+                    b_sum_mat = self.get_bootstrap_sum_mat(l3s,'bc_fit','wind_column_topo',
+                                                           remove_intercept=fit_bc_kw.get('remove_intercept',False))
 
                     l3s.bc_b_sum_mat = b_sum_mat
                     l3s.df['summed_wind_column_topo_bc_std'] = np.std(b_sum_mat,axis=1)
@@ -425,6 +456,41 @@ class Basin():
                                      fields_to_average=['num_samples'])
                 return
         
+    def get_bootstrap_sum_mat(self,l3s,fit_name,base_field,basis_fields=None,remove_intercept=False):
+        '''basin sums of the bootstrap fields base_field-sum(bparam[k]*l[field])(-bparam['Intercept'])
+        for all bootstrap params of each l3's fit_name, without forming the fields. the masked sum in
+        Level3_Data.sum_by_mask is linear in the field, so each l3 only needs the masked sums of
+        base_field, the basis fields, and a constant, and all replicates are one matrix product
+        fit_name:
+            'topo_fit' or 'bc_fit'
+        basis_fields:
+            dict of {param name: field name}, default the l3's bc_fields
+        return:
+            (len(l3s), nbootstrap) array, same as summing each replicate field with sum_by_mask
+        '''
+        nbootstrap = getattr(l3s[0],fit_name).nbootstrap
+        b_sum_mat = np.full((len(l3s),nbootstrap),np.nan)
+        for il,l in enumerate(l3s):
+            if l.proj is not None:
+                self.logger.error('proj is not implemented yet!');return
+            basis = basis_fields if basis_fields is not None else {k:k for k in l.bc_fields}
+            mask = F_polygon_mask(l['xgrid'],l['ygrid'],self.xys)
+            latmesh = np.broadcast_to(l['ygrid'][:,np.newaxis],mask.shape)
+            grid_m2 = (np.square(l.grid_size*111e3)*np.cos(latmesh/180*np.pi))[mask]
+            weight = l['total_sample_weight'][mask]
+            # rows: base field, basis fields, constant
+            fields = np.array([l[base_field][mask]]+[l[v][mask] for v in basis.values()]
+                              +[np.ones(np.sum(mask))])
+            valid = np.isfinite(fields).all(axis=0) & np.isfinite(weight*grid_m2)
+            basis_sums = fields[:,valid]@(weight*grid_m2)[valid]
+            with np.errstate(invalid='ignore',divide='ignore'):
+                factor = np.nansum(grid_m2)/np.nansum(weight*grid_m2)
+            coef = np.array([[1.]+[-bparam[k] for k in basis.keys()]
+                             +[-bparam['Intercept'] if remove_intercept else 0.]
+                             for bparam in getattr(l,fit_name).bootstrap_params])
+            b_sum_mat[il] = coef@basis_sums*factor
+        return b_sum_mat
+    
     def plot(self,ax=None,reset_extent=True,**kwargs):
         '''overview subregions'''
         
@@ -5,7 +5,7 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import geopandas as gpd
 import logging
-from popy import Level3_Data, F_center2edge, Level3_List
+from popy import Level3_Data, F_center2edge, Level3_List, F_polygon_mask
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from matplotlib.axes import Axes
@@ -50,12 +50,9 @@ class Geo_Raster(dict):
     def trim_by_polygon(self,boundary_x,boundary_y,
                         in_boundary_value=None,out_boundary_value=None,name=None):
         
-        boundary_polygon = path.Path([(bx,by) for (bx,by) in zip(boundary_x,boundary_y)])
         name = name or self.name
         new = Geo_Raster(name)
-        xmesh,ymesh = np.meshgrid(self['xgrid'],self['ygrid'])
-        grid_points = np.column_stack((xmesh.ravel(),ymesh.ravel()))
-        in_mask = boundary_polygon.contains_points(grid_points).reshape(xmesh.shape)
+        in_mask = F_polygon_mask(self['xgrid'],self['ygrid'],(boundary_x,boundary_y))
         new['xgrid'] = self['xgrid']
         new['ygrid'] = self['ygrid']
         new['xres'] = self['xres']
@@ -267,8 +264,7 @@ class Region(dict):
                     mask = mask & (l3['wind_column']<=chem_max_wind_column)
                 fit_chem_kw['mask'] = mask
             l3s_m = l3s.fit_chemistry(**fit_chem_kw)
-            [l3s.average_by_finerMask(tif_dict=city_raster) \
-                                       for city_raster in v['city_raster_list']];
+            l3s.average_by_finerMasks(v['city_raster_list'])
             v['l3s'] = l3s            
         
     def plot_monthly_emission(self,subregion_name,nrow=3,ncol=3,hspace=0.39,wspace=0.15,
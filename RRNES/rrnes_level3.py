@@ -16,7 +16,7 @@ import os
 import logging
 import matplotlib.pyplot as plt
 sys.path.append(control['popy directory'])
-from popy import popy, F_collocate_l2g, datedev_py
+from popy import popy, F_collocate_l2g, datedev_py, F_polygon_mask
 if 'if verbose' not in control.keys(): control['if verbose']=False
 if 'smoke density threshold' not in control.keys():
     control['smoke density threshold'] = np.inf
@@ -130,18 +130,20 @@ for year in range(start_year,end_year+1):
                       start_year=year,start_month=month,start_day=1,
                       end_year=year,end_month=month,end_day=monthrange(year,month)[-1],
                       grid_size=grid_size,verbose=control['if verbose'])
-            ai.F_mat_reader(os.path.join(control['AI level 2g directory'],
-                                    control['AI level 2g file header']
-                                    +'_%04d'%year+'_%02d'%month+'.mat'))
+            ai_l2g_path = os.path.join(control['AI level 2g directory'],
+                                       control['AI level 2g file header']
+                                       +'_%04d'%year+'_%02d'%month)
+            # prefer the l2g store directory saved by popy.F_save_l2g_to_store
+            ai.F_mat_reader(ai_l2g_path if os.path.isdir(ai_l2g_path) else ai_l2g_path+'.mat')
         if 'basin_grid_mask' not in locals():
-            grid_points = np.hstack((p.xmesh.flatten()[:,np.newaxis],p.ymesh.flatten()[:,np.newaxis]))
-            basin_grid_mask = basin_polygon.contains_points(grid_points).reshape(p.xmesh.shape)
+            basin_grid_mask = F_polygon_mask(p.xgrid,p.ygrid,basin_polygon)
         p.maxcf = control['maximal cloud fraction']
         p.maxsza = control['maximal solar zenith angle']
         p.min_qa_value = control['minimal qa_value']
-        p.F_mat_reader(os.path.join(control['level 2g directory'],
-                                    control['level 2g file header']
-                                    +'_%04d'%year+'_%02d'%month+'.mat'))
+        l2g_path = os.path.join(control['level 2g directory'],
+                                control['level 2g file header']
+                                +'_%04d'%year+'_%02d'%month)
+        p.F_mat_reader(l2g_path if os.path.isdir(l2g_path) else l2g_path+'.mat')
         if p.nl2 == 0:
             logging.warning('Nothing left in this month!')
             continue
@@ -272,11 +274,12 @@ for year in range(start_year,end_year+1):
         ime_dx = np.full(nbin,np.nan)
         ime_sp = np.full(nbin,np.nan)
         ime_ws = np.full(nbin,np.nan)
+        # all wind speed bins are oversampled in one pass
+        l3_bins = p.F_parallel_regrid(l2g_data=l2g_data,ncores=ncores,block_length=block_length,
+                                      bin_by='ws',bin_edges=ws_bin)
         for ibin in range(nbin):
-            mask = (l2g_data['ws'] >= ws_bin[ibin]) & (l2g_data['ws'] <= ws_bin[ibin+1])
-            l2g_bin = {k:v[mask,] for (k,v) in l2g_data.items()}
-            l3_bin = p.F_parallel_regrid(l2g_data=l2g_bin,ncores=ncores,block_length=block_length)
-            if not l3_bin:
+            l3_bin = l3_bins[ibin]
+            if np.sum(l3_bin['total_sample_weight']) == 0:
                 continue
             ime_B[ibin] = np.nansum(l3_bin['total_sample_weight'][basin_grid_mask])
             ime_D[ibin] = np.nanmean(l3_bin['num_samples'][basin_grid_mask])
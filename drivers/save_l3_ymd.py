@@ -16,7 +16,7 @@ with open(control_txt_fn,'r') as stream:
     control = yaml.full_load(stream)
 # https://github.com/Kang-Sun-CfA/Oversampling_matlab/blob/master/popy.py
 sys.path.append(control['popy_dir'])
-from popy import F_wrapper_l3, popy
+from popy import F_wrapper_l3, popy, RegridExecutor
 
 product = control['product']
 instrum = control['instrum']
@@ -65,6 +65,7 @@ algorithm = control.pop('algorithm',None)
 oversampling_list = control.pop('oversampling_list',None) 
 if_use_presaved_l2g = control.pop('if_use_presaved_l2g',True)
 ncores = control.pop('ncores',None)
+maxtasksperchild = control.pop('maxtasksperchild',None)
 block_length=control.pop('block_length',300)
 ellipse_lut_path = control.pop('ellipse_lut_path' or '/projects/academic/kangsun/data/IASIaNH3/daysss.mat')
 # if those important inputs are not given, assign None and later product-specific values
@@ -226,6 +227,10 @@ if not os.path.exists(os.path.split(l3_path_pattern)[0]):
     logging.warning(f'creating {os.path.split(l3_path_pattern)[0]}')
     os.makedirs(os.path.split(l3_path_pattern)[0])
 
+# regrid processes are forked once and reused by all time intervals
+executor = None
+if ncores != 0:
+    executor = RegridExecutor(ncores=ncores,maxtasksperchild=maxtasksperchild).start()
 # loop over time intervals
 for ip,p in enumerate(ps):
     if product == 'NH3':
@@ -278,7 +283,7 @@ for ip,p in enumerate(ps):
                 logging.warning(iasi_date.strftime(l3_path_pattern)+' is empty')
                 continue
         iasi0.F_prepare_gradient(**gradient_kw)
-        l3 = iasi0.F_parallel_regrid(ncores=ncores,block_length=block_length)
+        l3 = iasi0.F_parallel_regrid(ncores=ncores,block_length=block_length,executor=executor)
     else:
         try:
             l2_list = None
@@ -298,10 +303,13 @@ for ip,p in enumerate(ps):
                              end_date_array=[p.end_time],
                              proj=None,nudge_grid_origin=None,inflatex=None,inflatey=None,
                              flux_kw=None,gradient_kw=gradient_kw,flux_grid_size=flux_grid_size,
-                             error_model=error_model,oversampling_list=oversampling_list)
+                             error_model=error_model,oversampling_list=oversampling_list,
+                             executor=executor)
         except Exception as e:
             logging.warning(e)
             logging.warning(p.strftime('%Y%m%d seems to be empty!'))
             continue
     l3.save_nc(l3_filename=p.strftime(l3_path_pattern),
                fields_name=save_fields)
+if executor is not None:
+    executor.shutdown()
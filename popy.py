@@ -25,6 +25,7 @@ Created on Sat Jan 26 15:50:30 2019
 2022/10/16: Level3_List class
 2023/09/19: fix num_samples bias for quadrilateral pixels
 2023/11/01: add TEMPONO2
+2026/10/17: vectorized regrid engine
 """
 
 import numpy as np
@@ -58,7 +59,7 @@ def F_wrapper_l3(instrum,product,grid_size,
                  nudge_grid_origin=None,
                  k1=None,k2=None,k3=None,inflatex=None,inflatey=None,
                  flux_kw=None,gradient_kw=None,flux_grid_size=None,
-                 oversampling_list=None,error_model=None):
+                 oversampling_list=None,error_model=None,engine='loop',executor=None):
     '''
     instrum:
         instrument name
@@ -82,7 +83,8 @@ def F_wrapper_l3(instrum,product,grid_size,
         a list of level 2 file paths. If provided, l2_path_pattern will be ignored.
     l2_path_pattern:
         a format string indicating the path structure of level 2 (or level 2g if if_use_presaved_l2g is True). e.g.,
-        r'C:/data/*O2-CH4_%Y%m%dT*CO2proxy.nc' for level 2 or r'C:/data/CONUS_%Y_%m.mat' for level 2g
+        r'C:/data/*O2-CH4_%Y%m%dT*CO2proxy.nc' for level 2 or r'C:/data/CONUS_%Y_%m.mat' for level 2g.
+        level 2g can also be l2g store directories saved by popy.F_save_l2g_to_store, e.g., r'C:/data/CONUS_%Y_%m'
     ncores:
         0 means serial, None uses half, > max cpu uses max cpu
     block_length:
@@ -114,6 +116,10 @@ def F_wrapper_l3(instrum,product,grid_size,
     error_model:
         how to weight using retrieval uncertainties {'linear','square','log','ones'}. 
         if None, use instrument-specific default
+    engine:
+        regrid engine, 'loop' or 'vectorized'. see F_block_regrid_ccm
+    executor:
+        optional RegridExecutor, so that regrid processes are reused across periods and calls
     output:
         if if_plot_l3 is False, return a Level3_Data object. otherwise return a dictionary containing the 
         Level3_Data object and the figout dictionary
@@ -241,9 +247,9 @@ def F_wrapper_l3(instrum,product,grid_size,
                         mask = (o.l2g_data[iorbit]['column_amount'] > 0) & (o.l2g_data[iorbit]['column_uncertainty'] > 0)
                         o.l2g_data[iorbit] = {k:v[mask,] for (k,v) in o.l2g_data[iorbit].items()}
             if proj is not None:
-                l3_data0 = o.F_parallel_regrid_proj(ncores=ncores,block_length=block_length)
+                l3_data0 = o.F_parallel_regrid_proj(ncores=ncores,block_length=block_length,engine=engine,executor=executor)
             else:
-                l3_data0 = o.F_parallel_regrid(ncores=ncores,block_length=block_length)
+                l3_data0 = o.F_parallel_regrid(ncores=ncores,block_length=block_length,engine=engine,executor=executor)
         else:
             l3_data0 = Level3_Data(proj=proj)
             for year in range(start_date.year,end_date.year+1):
@@ -287,9 +293,9 @@ def F_wrapper_l3(instrum,product,grid_size,
                             if o.default_column_unit == 'mol/m2':
                                 o.l2g_data['column_amount'] = o.l2g_data['column_amount']*1e6
                     if proj is not None:
-                        monthly_l3_data = o.F_parallel_regrid_proj(ncores=ncores,block_length=block_length)
+                        monthly_l3_data = o.F_parallel_regrid_proj(ncores=ncores,block_length=block_length,engine=engine,executor=executor)
                     else:
-                        monthly_l3_data = o.F_parallel_regrid(ncores=ncores,block_length=block_length)
+                        monthly_l3_data = o.F_parallel_regrid(ncores=ncores,block_length=block_length,engine=engine,executor=executor)
                     l3_data0 = l3_data0.merge(monthly_l3_data)
         l3_data = l3_data.merge(l3_data0)
     if hasattr(l3_data,'check'):
@@ -469,9 +475,169 @@ def F_collocate_l2g(l2g_data1,l2g_data2,hour_difference=0.5,
     l2g_data1_hasnot2 = {k:v[~overlap_mask,] for (k,v) in l2g_data1.items()}
     return l2g_data1_has2, l2g_data1_hasnot2
     
+class MetCache(object):
+    '''
+    cache of decoded met fields shared across F_interp_* calls, so that sampling
+    the same met days again (other products, months, orbits, reruns) costs an
+    array slice instead of a file decode
+    max_bytes:
+        capacity of the in-process lru, keyed by (source, file, variable, window)
+    cache_dir:
+        if provided, floating point fields (ndim >= 2) are also saved as float32
+        .npy cubes under cache_dir/source and memory-mapped on later reads.
+        coordinates keep their dtype. cubes are invalidated by file mtime
+    created on 2026/10/17
+    '''
+    def __init__(self,max_bytes=2**31,cache_dir=None):
+        from collections import OrderedDict
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.data = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        if cache_dir is not None and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+    
+    def F_key(self,source,fn,varname,window=None):
+        '''
+        hashable cache key. window is a tuple of slices or None
+        '''
+        if window is not None:
+            window = repr(window)
+        return (source,os.path.abspath(fn),str(varname),window)
+    
+    def F_npy_path(self,key):
+        '''
+        path of the on-disk cube of a key, tagged by the mtime of the source file
+        '''
+        import hashlib
+        source,fn,varname,window = key
+        tag = hashlib.md5(repr((fn,varname,window,os.path.getmtime(fn))).encode()).hexdigest()[:16]
+        npy_name = '{}_{}_{}.npy'.format(os.path.basename(fn),varname.replace(os.sep,'_'),tag)
+        return os.path.join(self.cache_dir,source,npy_name)
+    
+    def F_put(self,key,value):
+        '''
+        add an array to the lru, evicting the least recently used ones
+        '''
+        if key in self.data:
+            self.nbytes -= self.data.pop(key).nbytes
+        self.data[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes and len(self.data) > 1:
+            _,old = self.data.popitem(last=False)
+            self.nbytes -= old.nbytes
+    
+    def F_save_npy(self,key,value):
+        '''
+        save value as npy cube and return it memory-mapped, or value itself
+        if it is not numeric
+        '''
+        if value.dtype.kind not in 'fiub':
+            return value
+        if value.dtype.kind == 'f' and value.ndim >= 2:
+            value = value.astype(np.float32)
+        npy_path = self.F_npy_path(key)
+        if not os.path.exists(os.path.dirname(npy_path)):
+            os.makedirs(os.path.dirname(npy_path),exist_ok=True)
+        # write then rename, so that concurrent workers never see partial cubes
+        tmp_path = npy_path[:-4]+'_{}.tmp.npy'.format(os.getpid())
+        np.save(tmp_path,value)
+        os.replace(tmp_path,npy_path)
+        return np.load(npy_path,mmap_mode='r')
+    
+    def F_read(self,source,fn,varnames,reader=None,window=None):
+        '''
+        return a dict of read-only arrays of varnames in fn. only variables 
+        missing from the lru and cache_dir are decoded by reader
+        source:
+            name of the met source/reader, e.g., 'era5', 'narr'
+        reader:
+            reader(fn,varnames) returning a dict, default F_ncread_selective.
+            called as reader(fn,varnames,window=window) if window is not None
+        window:
+            tuple of slices applied to variables when reading
+        '''
+        reader = reader or F_ncread_selective
+        outp = {}
+        missing = []
+        for varname in varnames:
+            key = self.F_key(source,fn,varname,window)
+            if key in self.data:
+                self.data.move_to_end(key)
+                outp[varname] = self.data[key]
+                self.hits += 1
+                continue
+            if self.cache_dir is not None and os.path.exists(self.F_npy_path(key)):
+                value = np.load(self.F_npy_path(key),mmap_mode='r')
+                self.F_put(key,value)
+                outp[varname] = value
+                self.hits += 1
+                continue
+            missing.append(varname)
+        if not missing:
+            return outp
+        self.misses += len(missing)
+        self.logger.debug('decoding {} from {}'.format(missing,fn))
+        if window is None:
+            decoded = reader(fn,missing)
+        else:
+            decoded = reader(fn,missing,window=window)
+        for varname in missing:
+            key = self.F_key(source,fn,varname,window)
+            value = np.asarray(decoded[varname])
+            if self.cache_dir is not None:
+                value = self.F_save_npy(key,value)
+            if not isinstance(value,np.memmap):
+                value.flags.writeable = False
+            self.F_put(key,value)
+            outp[varname] = value
+        return outp
+    
+    def F_clear(self):
+        '''
+        empty the in-process lru. cubes in cache_dir are kept
+        '''
+        self.data.clear()
+        self.nbytes = 0
+
+def F_met_read(fn,varnames,source='nc',reader=None,met_cache=None,window=None):
+    '''
+    read varnames from a met file, through met_cache if provided
+    fn:
+        met file path
+    source:
+        name of the met source/reader, part of the cache key
+    reader:
+        reader(fn,varnames) returning a dict, default F_ncread_selective
+    met_cache:
+        a MetCache instance or None
+    window:
+        tuple of slices applied to variables when reading
+    created on 2026/10/17
+    '''
+    reader = reader or F_ncread_selective
+    if met_cache is not None:
+        return met_cache.F_read(source,fn,varnames,reader,window)
+    if window is None:
+        return reader(fn,varnames)
+    return reader(fn,varnames,window=window)
+
+def F_gcrs_reader(fn,varnames):
+    '''
+    reader of gcrs nc files keeping the raw (unmasked) data, as in F_interp_gcrs
+    '''
+    from netCDF4 import Dataset
+    ncid = Dataset(fn,'r')
+    outp = {varname:np.ma.getdata(ncid[varname][:]) for varname in varnames}
+    ncid.close()
+    return outp
+    
 def F_interp_gcrs(sounding_lon,sounding_lat,sounding_datenum,sounding_ps,
                   gcrs_dir='/mnt/Data2/GEOS-Chem_Silvern/',
-                  product='NO2',if_monthly=False):
+                  product='NO2',if_monthly=False,met_cache=None):
     """
     sample a field from GEOS-Chem data by Rachel Silvern (gcrs) in .nc format. 
     sounding_lon:
@@ -486,9 +652,10 @@ def F_interp_gcrs(sounding_lon,sounding_lat,sounding_datenum,sounding_ps,
         directory where geos chem data are saved
     if_monthly:
         if use monthly profile, instead of daily profile
+    met_cache:
+        a MetCache instance to share decoded fields across calls
     created on 2020/03/09
     """
-    from netCDF4 import Dataset
     from scipy.interpolate import RegularGridInterpolator
     from calendar import isleap
     # hybrid Ap parameter in Pa
@@ -535,10 +702,11 @@ def F_interp_gcrs(sounding_lon,sounding_lat,sounding_datenum,sounding_ps,
             loop_sounding_doy = loop_sounding_doy[f1&f2]
             gc_fn = os.path.join(gcrs_dir,'NO2_PROF.05x0625_NA.%0d.nc'%year)
             print('loading '+gc_fn)
-            gc_id = Dataset(gc_fn)
-            gc_gas = gc_id['NO2_ppb'][:].astype(np.float32)
-            gc_lon = gc_id['longitude'][:]
-            gc_lat = gc_id['latitude'][:]
+            gc_id = F_met_read(gc_fn,['NO2_ppb','longitude','latitude'],
+                               source='gcrs',reader=F_gcrs_reader,met_cache=met_cache)
+            gc_gas = gc_id['NO2_ppb'].astype(np.float32)
+            gc_lon = gc_id['longitude']
+            gc_lat = gc_id['latitude']
             for doy in loop_sounding_doy:
                 # remember python is 0-based
                 gc_gas_doy = gc_gas[doy-1,...].squeeze()
@@ -554,10 +722,11 @@ def F_interp_gcrs(sounding_lon,sounding_lat,sounding_datenum,sounding_ps,
             loop_month = np.unique(sounding_month[sounding_year==year])
             gc_fn = os.path.join(gcrs_dir,'NH3_HCHO_PROF.05x0625_NA.%0d.nc'%year)
             print('loading '+gc_fn)
-            gc_id = Dataset(gc_fn)
-            gc_gas = gc_id[product+'_ppb'][:].astype(np.float32)
-            gc_lon = gc_id['longitude'][:]
-            gc_lat = gc_id['latitude'][:]
+            gc_id = F_met_read(gc_fn,[product+'_ppb','longitude','latitude'],
+                               source='gcrs',reader=F_gcrs_reader,met_cache=met_cache)
+            gc_gas = gc_id[product+'_ppb'].astype(np.float32)
+            gc_lon = gc_id['longitude']
+            gc_lat = gc_id['latitude']
             for month in loop_month:
                 # remember python is 0-based
                 gc_gas_doy = gc_gas[month-1,...].squeeze()
@@ -571,7 +740,7 @@ def F_interp_gcrs(sounding_lon,sounding_lat,sounding_datenum,sounding_ps,
 def F_interp_merra2_global(sounding_lon,sounding_lat,sounding_datenum,\
                   merra2_dir='/mnt/Data2/MERRA2_2x2.5/',\
                   interp_fields=None,\
-                  fn_suffix='.A1.2x25'):
+                  fn_suffix='.A1.2x25',met_cache=None):
     """
     sample a field from geos chem merra2 data
     see /mnt/Data2/MERRA2_2x2.5/test_download_cris.py for downloading
@@ -587,6 +756,8 @@ def F_interp_merra2_global(sounding_lon,sounding_lat,sounding_datenum,\
         variables to interpolate from merra2, only 2d fields are supported
     fn_suffix:
         only A1 2d data are supported
+    met_cache:
+        a MetCache instance to share decoded fields across calls
     created on 2021/04/18
     """
     import glob
@@ -613,8 +784,8 @@ def F_interp_merra2_global(sounding_lon,sounding_lat,sounding_datenum,\
             continue
         fn = merra_flist[0]
         if not merra2_data:
-            nc_out = F_ncread_selective(fn,np.concatenate(
-                    (interp_fields,['lat','lon','time'])))
+            nc_out = F_met_read(fn,np.concatenate(
+                    (interp_fields,['lat','lon','time'])),source='merra2_global',met_cache=met_cache)
             merra2_data['lon'] = np.append(nc_out['lon'],180.)
             merra2_data['lat'] = nc_out['lat']
             # how many hours are there in each daily file? have to be the same 
@@ -629,8 +800,8 @@ def F_interp_merra2_global(sounding_lon,sounding_lat,sounding_datenum,\
                 # add 180 longitude dummy
                 merra2_data[field][...,iday*nhour:((iday+1)*nhour)] = np.append(tmp,tmp[[0],:,:],axis=0)
         else:
-            nc_out = F_ncread_selective(fn,np.concatenate(
-                    (interp_fields,['time'])))
+            nc_out = F_met_read(fn,np.concatenate(
+                    (interp_fields,['time'])),source='merra2_global',met_cache=met_cache)
             # merra2 time is defined as minutes since 00:30:00 on that day
             merra2_data['datenum'][iday*nhour:((iday+1)*nhour)] = DATE.toordinal()+366.+(nc_out['time']+30)/1440
             for field in interp_fields:
@@ -655,7 +826,7 @@ def F_interp_merra2_global(sounding_lon,sounding_lat,sounding_datenum,\
 def F_interp_merra2(sounding_lon,sounding_lat,sounding_datenum,\
                   merra2_dir='/mnt/Data2/MERRA/',\
                   interp_fields=None,\
-                  fn_header='MERRA2_300.tavg1_2d_slv_Nx'):
+                  fn_header='MERRA2_300.tavg1_2d_slv_Nx',met_cache=None):
     """
     sample a field from merra2 data in .nc format. 
     see download_merra2.py for downloading
@@ -671,6 +842,8 @@ def F_interp_merra2(sounding_lon,sounding_lat,sounding_datenum,\
         variables to interpolate from merra2, only 2d fields are supported
     fn_header:
         following nasa ges disc naming
+    met_cache:
+        a MetCache instance to share decoded fields across calls
     created on 2020/03/09
     noted on 2021/03/01 that some troppt is masked
     """
@@ -698,8 +871,8 @@ def F_interp_merra2(sounding_lon,sounding_lat,sounding_datenum,\
             continue
         fn = merra_flist[0]
         if not merra2_data:
-            nc_out = F_ncread_selective(fn,np.concatenate(
-                    (interp_fields,['lat','lon','time'])))
+            nc_out = F_met_read(fn,np.concatenate(
+                    (interp_fields,['lat','lon','time'])),source='merra2',met_cache=met_cache)
             merra2_data['lon'] = nc_out['lon']
             merra2_data['lat'] = nc_out['lat']
             # how many hours are there in each daily file? have to be the same 
@@ -712,8 +885,8 @@ def F_interp_merra2(sounding_lon,sounding_lat,sounding_datenum,\
                 # was read in as 3-d array in time, lat, lon; transpose to lon, lat, time
                 merra2_data[field][...,iday*nhour:((iday+1)*nhour)] = nc_out[field].transpose((2,1,0))
         else:
-            nc_out = F_ncread_selective(fn,np.concatenate(
-                    (interp_fields,['time'])))
+            nc_out = F_met_read(fn,np.concatenate(
+                    (interp_fields,['time'])),source='merra2',met_cache=met_cache)
             # merra2 time is defined as minutes since 00:30:00 on that day
             merra2_data['datenum'][iday*nhour:((iday+1)*nhour)] = DATE.toordinal()+366.+(nc_out['time']+30)/1440
             for field in interp_fields:
@@ -740,7 +913,7 @@ def F_interp_era5_3D(sounding_lon,sounding_lat,sounding_datenum,
                      sounding_p0,sounding_p1,nlevel=10,\
                      era5_dir='/mnt/Data2/ERA5/',\
                      interp_fields=None,\
-                     fn_header='CONUS'):
+                     fn_header='CONUS',met_cache=None):
     """
     sample 3D field from era5 data in .nc format. 
     see era5.py for era5 downloading/subsetting
@@ -762,6 +935,8 @@ def F_interp_era5_3D(sounding_lon,sounding_lat,sounding_datenum,
         variables to interpolate from era5, u and v
     fn_header:
         in general should denote domain location of era5 data
+    met_cache:
+        a MetCache instance to share decoded fields across calls
     created on 2020/09/20
     """
     from scipy.interpolate import RegularGridInterpolator
@@ -786,8 +961,8 @@ def F_interp_era5_3D(sounding_lon,sounding_lat,sounding_datenum,
                                    DATE.strftime('D%d'),\
                                    fn_header+'_3D_'+DATE.strftime('%Y%m%d')+'.nc')
         if not era5_data:
-            nc_out = F_ncread_selective(fn,np.concatenate(
-                    (interp_fields,['latitude','longitude','time','level'])))
+            nc_out = F_met_read(fn,np.concatenate(
+                    (interp_fields,['latitude','longitude','time','level'])),source='era5_3D',met_cache=met_cache)
             era5_data['lon'] = nc_out['longitude']
             era5_data['level'] = nc_out['level']*100 # hPa to Pa
             era5_data['lat'] = nc_out['latitude'][::-1]
@@ -805,8 +980,8 @@ def F_interp_era5_3D(sounding_lon,sounding_lat,sounding_datenum,
                 # was read in as 4-d array in time, level, lat, lon; transpose to lon, lat, level, time
                 era5_data[field][...,iday*nhour:((iday+1)*nhour)] = nc_out[field].transpose((3,2,1,0))[:,::-1,:,:]
         else:
-            nc_out = F_ncread_selective(fn,np.concatenate(
-                    (interp_fields,['time'])))
+            nc_out = F_met_read(fn,np.concatenate(
+                    (interp_fields,['time'])),source='era5_3D',met_cache=met_cache)
             # era5 time is defined as 'hours since 1900-01-01 00:00:00.0'
             era5_data['datenum'][iday*nhour:((iday+1)*nhour)] = nc_out['time']/24.+693962.
             for field in interp_fields:
@@ -832,7 +1007,7 @@ def F_interp_era5_3D(sounding_lon,sounding_lat,sounding_datenum,
 def F_interp_era5(sounding_lon,sounding_lat,sounding_datenum,\
                   era5_dir='/mnt/Data2/ERA5/',\
                   interp_fields=None,\
-                  fn_header=None):
+                  fn_header=None,met_cache=None):
     """
     sample a field from era5 data in .nc format. 
     see era5.py for era5 downloading/subsetting
@@ -848,6 +1023,8 @@ def F_interp_era5(sounding_lon,sounding_lat,sounding_datenum,\
         variables to interpolate from era5, only 2d fields are supported
     fn_header:
         in general should denote domain location of era5 data
+    met_cache:
+        a MetCache instance to share decoded fields across calls
     created on 2019/09/18
     """
     from scipy.interpolate import RegularGridInterpolator
@@ -877,8 +1054,8 @@ def F_interp_era5(sounding_lon,sounding_lat,sounding_datenum,\
                                        DATE.strftime('D%d'),\
                                        fn_header+'_2D_'+DATE.strftime('%Y%m%d')+'.nc')
         if not era5_data:
-            nc_out = F_ncread_selective(fn,np.concatenate(
-                    (interp_fields,['latitude','longitude','time'])))
+            nc_out = F_met_read(fn,np.concatenate(
+                    (interp_fields,['latitude','longitude','time'])),source='era5',met_cache=met_cache)
             era5_data['lon'] = nc_out['longitude']
             era5_data['lat'] = nc_out['latitude'][::-1]
             # how many hours are there in each daily file? have to be the same 
@@ -895,8 +1072,8 @@ def F_interp_era5(sounding_lon,sounding_lat,sounding_datenum,\
                 # was read in as 3-d array in time, lat, lon; transpose to lon, lat, time
                 era5_data[field][...,iday*nhour:((iday+1)*nhour)] = nc_out[field].transpose((2,1,0))[:,::-1,:]
         else:
-            nc_out = F_ncread_selective(fn,np.concatenate(
-                    (interp_fields,['time'])))
+            nc_out = F_met_read(fn,np.concatenate(
+                    (interp_fields,['time'])),source='era5',met_cache=met_cache)
             # era5 time is defined as 'hours since 1900-01-01 00:00:00.0'
             era5_data['datenum'][iday*nhour:((iday+1)*nhour)] = nc_out['time']/24.+693962.
             for field in interp_fields:
@@ -920,7 +1097,7 @@ def F_interp_era5(sounding_lon,sounding_lat,sounding_datenum,\
 
 def F_interp_hrrr_mat(sounding_lon,sounding_lat,sounding_datenum,
                       file_pattern='/projects/academic/kangsun/data/hrrr/%Y%m%d/hrrr_sfc_uv.mat',
-                      interp_fields=None):
+                      interp_fields=None,met_cache=None):
     '''interpolate fields from hrrr data, concatenated as daily mat files
     sounding_lon:
         longitude for interpolation
@@ -932,6 +1109,8 @@ def F_interp_hrrr_mat(sounding_lon,sounding_lat,sounding_datenum,
         pattern of daily met files, similar to l2_path_pattern
     interp_fields:
         variables to interpolate from hrrr, only 2d fields are supported
+    met_cache:
+        a MetCache instance to share decoded fields across calls
     created on 2022/06/13
     '''
     from scipy.io import loadmat
@@ -940,6 +1119,7 @@ def F_interp_hrrr_mat(sounding_lon,sounding_lat,sounding_datenum,
     import glob
 
     interp_fields = interp_fields or ['u80','v80']
+    hrrr_reader = lambda fn,varnames:loadmat(fn,squeeze_me=True,variable_names=varnames)
     p2 = Proj(proj='lcc',R=6371.229, lat_1=38.5, lat_2=38.5,lon_0=262.5,lat_0=38.5)
     sounding_x,sounding_y = p2(sounding_lon,sounding_lat)
     start_datenum = np.amin(sounding_datenum)
@@ -961,7 +1141,8 @@ def F_interp_hrrr_mat(sounding_lon,sounding_lat,sounding_datenum,
         fn = flist[0]
         
         if not hrrr_data:
-            d = loadmat(fn,squeeze_me=True)
+            d = F_met_read(fn,np.concatenate((['x','y','datenum'],interp_fields)),
+                           source='hrrr',reader=hrrr_reader,met_cache=met_cache)
             hrrr_data['x'] = d['x']
             hrrr_data['y'] = d['y']
             
@@ -971,7 +1152,8 @@ def F_interp_hrrr_mat(sounding_lon,sounding_lat,sounding_datenum,
                 hrrr_data[field] = d[field].transpose((2,1,0))
                 
         else:
-            d = loadmat(fn,squeeze_me=True)
+            d = F_met_read(fn,np.concatenate((['datenum'],interp_fields)),
+                           source='hrrr',reader=hrrr_reader,met_cache=met_cache)
             hrrr_data['datenum'] = np.append(hrrr_data['datenum'],d['datenum'])
             for field in interp_fields:
                 # was read in as 3-d array in time, y, x; transpose to x, y, time
@@ -995,7 +1177,7 @@ def F_interp_geos_mat(sounding_lon,sounding_lat,sounding_datenum,\
                   geos_dir='/mnt/Data2/GEOS/s5p_interp/',\
                   interp_fields=None,\
                   time_collection='inst3',\
-                  fn_header='subset'):
+                  fn_header='subset',met_cache=None):
     """
     sample a field from subset geos fp data in .mat format. 
     see geos.py for geos downloading/subsetting
@@ -1011,6 +1193,8 @@ def F_interp_geos_mat(sounding_lon,sounding_lat,sounding_datenum,\
         variables to interpolate from geos fp, only 2d fields are supported
     time_collection:
             choose from inst3, tavg1, tavg3
+    met_cache:
+        a MetCache instance to share decoded fields across calls
     created on 2019/05/26
     updated on 2019/07/01 to be compatible with different file collections and non continues time steps
     """
@@ -1018,6 +1202,7 @@ def F_interp_geos_mat(sounding_lon,sounding_lat,sounding_datenum,\
     from scipy.interpolate import RegularGridInterpolator
     
     interp_fields = interp_fields or ['TROPPT']
+    mat_reader = lambda fn,varnames:loadmat(fn,variable_names=varnames)
     
     if time_collection == 'inst3' or time_collection == '':
         step_hour = 3
@@ -1068,17 +1253,18 @@ def F_interp_geos_mat(sounding_lon,sounding_lat,sounding_datenum,\
         if not os.path.exists(file_path):
             continue
         if not geos_data:
-            mat_data = loadmat(file_path,variable_names=np.concatenate((['lat','lon'],interp_fields)))
+            mat_data = F_met_read(file_path,np.concatenate((['lat','lon'],interp_fields)),
+                                  source='geos_fp',reader=mat_reader,met_cache=met_cache)
             geos_data['lon'] = mat_data['lon'].flatten()
             geos_data['lat'] = mat_data['lat'].flatten()
             geos_data['datenum'] = np.zeros((nstep),dtype=np.float64)
             for fn in interp_fields:
                 geos_data[fn] = np.zeros((len(geos_data['lon']),len(geos_data['lat']),nstep))
                 # geos fp uses 9.9999999E14 as missing value
-                mat_data[fn][mat_data[fn]>9e14] = np.nan
-                geos_data[fn][...,istep] = mat_data[fn]
+                geos_data[fn][...,istep] = np.where(mat_data[fn]>9e14,np.nan,mat_data[fn])
         else:
-            mat_data = loadmat(file_path,variable_names=interp_fields)
+            mat_data = F_met_read(file_path,interp_fields,
+                                  source='geos_fp',reader=mat_reader,met_cache=met_cache)
             for fn in interp_fields:
                 geos_data[fn][...,istep] = mat_data[fn]
         
@@ -1112,7 +1298,7 @@ def F_interp_geos_mat(sounding_lon,sounding_lat,sounding_datenum,\
 def F_interp_narr_mat(sounding_lon,sounding_lat,sounding_datenum,\
                   narr_dir='/mnt/Data2/NARR/acmap_narr/',\
                   interp_fields=None,
-                  fn_header='subset'):
+                  fn_header='subset',met_cache=None):
     """
     sample a field from presaved narr data
     sounding_lon:
@@ -1125,6 +1311,8 @@ def F_interp_narr_mat(sounding_lon,sounding_lat,sounding_datenum,\
         directory where narr is saved
     interp_fields:
         variables to interpolate, only 2d fields are supported
+    met_cache:
+        a MetCache instance to share decoded fields across calls
     created on 2019/05/25
     updated on 2019/09/19 to enable linear interpolation in a projection
     """
@@ -1135,6 +1323,7 @@ def F_interp_narr_mat(sounding_lon,sounding_lat,sounding_datenum,\
     interp_fields = interp_fields or ['GPH_tropopause','P_tropopause',
                                  'PBLH','P_surf','T_surf',
                                  'U_10m','V_10m','U_30m','V_30m']
+    mat_reader = lambda fn,varnames:loadmat(fn,variable_names=varnames)
     #p1 = Proj(proj='latlong',datum='WGS84')
     # really don't know why y_0=-6245.456824468616 has to be here
     p2 = Proj(proj='lcc',R=6367.470, lat_1=50, lat_2=50,lon_0=360-107,lat_0=50)#, ellps='clrk66')#the ellps option doesn't matter
@@ -1173,14 +1362,16 @@ def F_interp_narr_mat(sounding_lon,sounding_lat,sounding_datenum,\
                                  file_datetime.strftime('M%m'),\
                                  file_datetime.strftime('D%d'),file_name)
         if not narr_data:
-            mat_data = loadmat(file_path,variable_names=np.concatenate((['x','y'],interp_fields)))
+            mat_data = F_met_read(file_path,np.concatenate((['x','y'],interp_fields)),
+                                  source='narr',reader=mat_reader,met_cache=met_cache)
             narr_data['x'] = mat_data['x'].squeeze()
             narr_data['y'] = mat_data['y'].squeeze()
             for fn in interp_fields:
                 narr_data[fn] = np.zeros((len(narr_data['x']),len(narr_data['y']),nstep))
                 narr_data[fn][...,istep] = mat_data[fn].T
         else:
-            mat_data = loadmat(file_path,variable_names=interp_fields)
+            mat_data = F_met_read(file_path,interp_fields,
+                                  source='narr',reader=mat_reader,met_cache=met_cache)
             for fn in interp_fields:
                 narr_data[fn][...,istep] = mat_data[fn].T
     # construct time axis
@@ -1200,6 +1391,311 @@ def F_interp_narr_mat(sounding_lon,sounding_lat,sounding_datenum,\
         sounding_interp[fn] = my_interpolating_function((sounding_x,sounding_y,sounding_datenum))
     return sounding_interp
 
+def F_perspective_transforms(src,dst):
+    """
+    batched equivalent of cv2.getPerspectiveTransform
+    src/dst:
+        (n, 4, 2) arrays of source/destination quadrilateral vertices
+    return:
+        (n, 3, 3) homographies with the last element fixed at 1, solved as one
+        (n, 8, 8) stack by np.linalg.solve
+    """
+    src = np.asarray(src,dtype=np.float64)
+    dst = np.asarray(dst,dtype=np.float64)
+    n = src.shape[0]
+    x = src[...,0] ; y = src[...,1]
+    u = dst[...,0] ; v = dst[...,1]
+    zero = np.zeros_like(x) ; one = np.ones_like(x)
+    A = np.zeros((n,8,8))
+    A[:,0:4,:] = np.stack((x,y,one,zero,zero,zero,-x*u,-y*u),axis=-1)
+    A[:,4:8,:] = np.stack((zero,zero,zero,x,y,one,-x*v,-y*v),axis=-1)
+    b = np.concatenate((u,v),axis=1)
+    T = np.ones((n,9))
+    T[:,0:8] = np.linalg.solve(A,b[...,np.newaxis])[...,0]
+    return T.reshape(n,3,3)
+
+def F_polygon_area(x,y):
+    """
+    vectorized shoelace formula
+    x/y:
+        (n, nvertex) arrays of polygon vertices, in order
+    return:
+        (n,) polygon areas
+    """
+    return 0.5*np.abs(np.sum(x*np.roll(y,-1,axis=1)-np.roll(x,-1,axis=1)*y,axis=1))
+
+def F_polygon_rings(polygons):
+    """
+    normalize polygons to a list of polygons, each a list of (x, y) vertex arrays (rings)
+    polygons:
+        a matplotlib path.Path (its subpaths become rings), a (x, y) tuple of vertex arrays,
+        or a list of them, e.g., the xys of Level3_Data.sum_by_mask
+    """
+    if hasattr(polygons,'to_polygons') or (isinstance(polygons,tuple) and len(polygons) == 2
+                                           and np.ndim(polygons[0]) == 1 and np.size(polygons[0]) > 2):
+        polygons = [polygons]
+    rings_list = []
+    for polygon in polygons:
+        if hasattr(polygon,'to_polygons'):
+            # split at MOVETO and drop CLOSEPOLY vertices, without the simplification of to_polygons
+            vertices = np.asarray(polygon.vertices,dtype=np.float64)
+            if polygon.codes is None:
+                rings = [(vertices[:,0],vertices[:,1])]
+            else:
+                codes = np.asarray(polygon.codes)
+                starts = np.nonzero(codes == polygon.MOVETO)[0]
+                rings = []
+                for vertex in np.split(np.arange(len(codes)),starts[starts > 0]):
+                    vertex = vertex[codes[vertex] != polygon.CLOSEPOLY]
+                    if len(vertex) > 2:
+                        rings.append((vertices[vertex,0],vertices[vertex,1]))
+        else:
+            rings = [(np.asarray(polygon[0],dtype=np.float64).ravel(),
+                      np.asarray(polygon[1],dtype=np.float64).ravel())]
+        rings_list.append(rings)
+    return rings_list
+
+def F_ring_crossings(x,y,xs,ys):
+    """
+    crossings of a closed ring with the horizontal scanlines at ys. an edge crosses a scanline
+    if it lies in [min(y0,y1), max(y0,y1)), so that shared vertices count once
+    xs/ys:
+        ascending scanline centers
+    return:
+        row (index into ys) and column (index of the first xs to the right of the crossing)
+    """
+    finite = np.isfinite(x) & np.isfinite(y)
+    x0 = x[finite] ; y0 = y[finite]
+    x1 = np.roll(x0,-1) ; y1 = np.roll(y0,-1)
+    r0 = np.searchsorted(ys,np.minimum(y0,y1),side='left')
+    r1 = np.searchsorted(ys,np.maximum(y0,y1),side='left')
+    nrow_edge = r1-r0
+    edge = np.repeat(np.arange(len(x0)),nrow_edge)
+    row = r0[edge]+np.arange(len(edge))-np.repeat(np.cumsum(nrow_edge)-nrow_edge,nrow_edge)
+    xc = x0[edge]+(ys[row]-y0[edge])/(y1[edge]-y0[edge])*(x1[edge]-x0[edge])
+    return row,np.searchsorted(xs,xc,side='right')
+
+def F_polygon_raster(xgrid,ygrid,polygons,subsample=None,evenodd=False):
+    """
+    rasterize polygons on a rectilinear grid by scanline fill. as path.Path.contains_points,
+    each ring is filled by the even-odd rule and all rings are unioned, so a ring nested in
+    another one is inside, not a hole. edge crossings of all scanlines are computed at once
+    in numpy, instead of testing every grid point
+    xgrid/ygrid:
+        cell centers, ascending or descending
+    polygons:
+        see F_polygon_rings
+    subsample:
+        None returns a boolean mask of cell centers inside, same as path.Path.contains_points
+        up to points on the boundary. an integer n returns the fractional coverage of each
+        cell estimated from n x n sub-cell points, assuming a uniform grid
+    evenodd:
+        if True, the even-odd rule applies across the rings of each polygon, so inner rings
+        of a compound path are holes. polygons are still unioned
+    return:
+        (len(ygrid), len(xgrid)) boolean mask or float coverage
+    created on 2026/10/17
+    """
+    xgrid = np.asarray(xgrid,dtype=np.float64)
+    ygrid = np.asarray(ygrid,dtype=np.float64)
+    xorder = np.argsort(xgrid) ; yorder = np.argsort(ygrid)
+    xs = xgrid[xorder] ; ys = ygrid[yorder]
+    n = subsample or 1
+    if n > 1:
+        dx = np.median(np.diff(xs)) if len(xs) > 1 else 0.
+        dy = np.median(np.diff(ys)) if len(ys) > 1 else 0.
+        offsets = (np.arange(n)+0.5)/n-0.5
+        xs = (xs[:,np.newaxis]+dx*offsets[np.newaxis,:]).ravel()
+        ys = (ys[:,np.newaxis]+dy*offsets[np.newaxis,:]).ravel()
+    inside = np.zeros((len(ys),len(xs)),dtype=bool)
+    for rings in F_polygon_rings(polygons):
+        # evenodd toggles the parity of all rings of the polygon together, otherwise each ring
+        # is filled by itself over the rows it crosses
+        ring_groups = [rings] if evenodd else [[ring] for ring in rings]
+        for ring_group in ring_groups:
+            crossings = [F_ring_crossings(x,y,xs,ys) for (x,y) in ring_group]
+            row = np.concatenate([c[0] for c in crossings])
+            col = np.concatenate([c[1] for c in crossings])
+            if len(row) == 0:
+                continue
+            row0 = row.min() ; row1 = row.max()+1
+            # crossing counts mod 256 keep the parity, so uint8 is enough
+            toggles = np.zeros((row1-row0,len(xs)+1),dtype=np.uint8)
+            np.add.at(toggles,(row-row0,col),1)
+            inside[row0:row1] |= (np.cumsum(toggles[:,:-1],axis=1,dtype=np.uint8) & 1).astype(bool)
+    if n > 1:
+        inside = inside.reshape(len(ygrid),n,len(xgrid),n).mean(axis=(1,3))
+    return inside[np.ix_(np.argsort(yorder),np.argsort(xorder))]
+
+class PolygonMaskCache(object):
+    '''
+    cache of F_polygon_raster results keyed by the polygon vertices and the grid, so that the
+    same basin/region masks are reused across files, months, and call sites
+    max_bytes:
+        capacity of the in-process lru
+    cache_dir:
+        if provided, masks are also saved as .npy under cache_dir and loaded on later runs
+    created on 2026/10/17
+    '''
+    def __init__(self,max_bytes=2**28,cache_dir=None):
+        from collections import OrderedDict
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.data = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        if cache_dir is not None and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+    
+    def F_key(self,xgrid,ygrid,polygons,subsample=None,evenodd=False):
+        '''
+        md5 of the polygon vertices, the grid, subsample, and the fill rule
+        '''
+        import hashlib
+        h = hashlib.md5(repr((subsample,'evenodd' if evenodd else 'union')).encode())
+        for rings in F_polygon_rings(polygons):
+            h.update(b'polygon')
+            for (x,y) in rings:
+                h.update(b'ring')
+                h.update(np.ascontiguousarray(x,dtype=np.float64).tobytes())
+                h.update(np.ascontiguousarray(y,dtype=np.float64).tobytes())
+        h.update(b'grid')
+        h.update(np.ascontiguousarray(xgrid,dtype=np.float64).tobytes())
+        h.update(np.ascontiguousarray(ygrid,dtype=np.float64).tobytes())
+        return h.hexdigest()
+    
+    def F_put(self,key,value):
+        '''
+        add a mask to the lru, evicting the least recently used ones
+        '''
+        if key in self.data:
+            self.nbytes -= self.data.pop(key).nbytes
+        self.data[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes and len(self.data) > 1:
+            _,old = self.data.popitem(last=False)
+            self.nbytes -= old.nbytes
+    
+    def F_mask(self,xgrid,ygrid,polygons,subsample=None,evenodd=False):
+        '''
+        cached F_polygon_raster. the returned array is read-only
+        '''
+        key = self.F_key(xgrid,ygrid,polygons,subsample,evenodd)
+        if key in self.data:
+            self.data.move_to_end(key)
+            self.hits += 1
+            return self.data[key]
+        npy_path = None
+        if self.cache_dir is not None:
+            npy_path = os.path.join(self.cache_dir,'polygon_mask_{}.npy'.format(key))
+        if npy_path is not None and os.path.exists(npy_path):
+            value = np.load(npy_path)
+            self.hits += 1
+        else:
+            value = F_polygon_raster(xgrid,ygrid,polygons,subsample,evenodd)
+            if subsample is not None:
+                value = value.astype(np.float32)
+            self.misses += 1
+            if npy_path is not None:
+                # write then rename, so that concurrent workers never see partial masks
+                tmp_path = npy_path[:-4]+'_{}.tmp.npy'.format(os.getpid())
+                np.save(tmp_path,value)
+                os.replace(tmp_path,npy_path)
+        value.flags.writeable = False
+        self.F_put(key,value)
+        return value
+
+# in-process cache used by F_polygon_mask unless another cache is given
+polygon_mask_cache = PolygonMaskCache()
+
+def F_polygon_mask(xgrid,ygrid,polygons,subsample=None,cache=None,evenodd=False):
+    '''
+    boolean mask (or fractional coverage if subsample is given) of polygons on a grid, see
+    F_polygon_raster, through cache (a PolygonMaskCache, by default the in-process
+    polygon_mask_cache). use PolygonMaskCache(cache_dir=...) to also keep masks on disk.
+    evenodd=True makes inner rings of a compound path holes, see F_polygon_raster
+    created on 2026/10/17
+    '''
+    cache = cache or polygon_mask_cache
+    return cache.F_mask(xgrid,ygrid,polygons,subsample,evenodd)
+
+def F_points_in_polygons(x,y,xr,yr):
+    '''
+    even-odd test of point i against polygon i for many small polygons at once, e.g., whether
+    a site falls in each l2 pixel
+    x/y:
+        scalars or (n,) point coordinates
+    xr/yr:
+        (n, nvertex) polygon vertices, in order
+    return:
+        (n,) boolean
+    created on 2026/10/17
+    '''
+    x = np.asarray(x,dtype=np.float64)[...,np.newaxis]
+    y = np.asarray(y,dtype=np.float64)[...,np.newaxis]
+    x0 = np.asarray(xr,dtype=np.float64) ; y0 = np.asarray(yr,dtype=np.float64)
+    x1 = np.roll(x0,-1,axis=-1) ; y1 = np.roll(y0,-1,axis=-1)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        crossing = ((y0 <= y) != (y1 <= y)) & (x < x0+(y-y0)/(y1-y0)*(x1-x0))
+    return np.sum(crossing,axis=-1) % 2 == 1
+
+def F_finer_mask_weights(xgrid,ygrid,tif_dicts,labels=None,grid_size=None):
+    '''
+    map masks finer than an l3 grid to coverage weights on the l3 grid. each fine pixel is
+    assigned to its parent l3 cell once by searchsorted on the cell edges, and pixel values are
+    summed per cell, instead of selecting fine pixels cell by cell
+    xgrid/ygrid:
+        ascending l3 cell centers
+    tif_dicts:
+        a dict (or Geo_Raster) with xgrid, ygrid (fine pixel centers, any order), and data
+        (ny, nx), or a list of them, one per region
+    labels:
+        if provided, tif_dicts is a single label raster, and region i is data == labels[i]
+    grid_size:
+        l3 grid size, default from xgrid
+    return:
+        scipy.sparse csr matrix (nregion, len(ygrid)*len(xgrid)), summed mask values (pixel
+        counts for boolean masks) in each l3 cell
+    created on 2026/10/17
+    '''
+    from scipy.sparse import coo_matrix
+    if grid_size is None:
+        grid_size = np.median(np.diff(xgrid))
+    xedges = np.append(xgrid-grid_size/2,xgrid[-1]+grid_size/2)
+    yedges = np.append(ygrid-grid_size/2,ygrid[-1]+grid_size/2)
+    ncol = len(xgrid);nrow = len(ygrid)
+    if isinstance(tif_dicts,dict):
+        tif_dicts = [tif_dicts]
+    regions,cells,weights = [],[],[]
+    for iregion,tif_dict in enumerate(tif_dicts):
+        col = np.searchsorted(xedges,tif_dict['xgrid'],side='right')-1
+        row = np.searchsorted(yedges,tif_dict['ygrid'],side='right')-1
+        col_ok = (col >= 0) & (col < ncol)
+        row_ok = (row >= 0) & (row < nrow)
+        data = np.asarray(tif_dict['data'])[np.ix_(row_ok,col_ok)]
+        row = row[row_ok];col = col[col_ok]
+        if labels is not None:
+            label_values = np.asarray(labels)
+            order = np.argsort(label_values)
+            idx = np.clip(np.searchsorted(label_values[order],data),0,len(label_values)-1)
+            hit = label_values[order][idx] == data
+            irow,icol = np.nonzero(hit)
+            regions.append(order[idx[irow,icol]])
+            weights.append(np.ones(len(irow)))
+        else:
+            data = np.nan_to_num(data.astype(np.float64))
+            irow,icol = np.nonzero(data)
+            regions.append(np.full(len(irow),iregion))
+            weights.append(data[irow,icol])
+        cells.append(row[irow]*ncol+col[icol])
+    nregion = len(labels) if labels is not None else len(tif_dicts)
+    w = coo_matrix((np.concatenate(weights),(np.concatenate(regions),np.concatenate(cells))),
+                   shape=(nregion,nrow*ncol)).tocsr()
+    w.sum_duplicates()
+    return w
+
 def pixel_adjust_func(lonr,latr,lonc,latc,threshold_m=3,inflatex=1,inflatey=1):
     '''
     function to manipulate pixel corners if you don't like them
@@ -1213,83 +1709,70 @@ def pixel_adjust_func(lonr,latr,lonc,latc,threshold_m=3,inflatex=1,inflatey=1):
         stretch the pixels across track (x) or along track (y)
     return:
         updated lonr and latr
+    updated on 2026/10/17 to process all pixels at once
     '''
-    import cv2
+    def F_edge_fwhm(xr,yr):
+        edgecenterx = (xr+xr[:,[1,2,3,0]])/2
+        edgecentery = (yr+yr[:,[1,2,3,0]])/2
+        fwhmy = np.hypot(edgecenterx[:,0]-edgecenterx[:,2],edgecentery[:,0]-edgecentery[:,2])
+        fwhmx = np.hypot(edgecenterx[:,1]-edgecenterx[:,3],edgecentery[:,1]-edgecentery[:,3])
+        return edgecenterx,edgecentery,fwhmx,fwhmy
+    
     lonr_new = lonr.copy()
     latr_new = latr.copy()
-    count = 0
-    for il2 in range(len(lonc)):
-        
-        xr = (lonr[il2,:]-lonc[il2])*111e3*np.cos(latc[il2]/180*np.pi)
-        yr = (latr[il2,:]-latc[il2])*111e3
-
-        edgecenterx = np.mean(np.column_stack((xr,xr[[1,2,3,0]])),axis=1)
-        edgecentery = np.mean(np.column_stack((yr,yr[[1,2,3,0]])),axis=1)
-
-        fwhmy = np.linalg.norm([edgecenterx[0]-edgecenterx[2],edgecentery[0]-edgecentery[2]])
-        fwhmx = np.linalg.norm([edgecenterx[1]-edgecenterx[3],edgecentery[1]-edgecentery[3]])
-        
-        if fwhmx >= threshold_m and fwhmy >= threshold_m and inflatex == 1 and inflatey == 1:
-            continue
-        
-        if fwhmx < threshold_m:
-            e0e2v = np.array([edgecenterx[2]-edgecenterx[0],edgecentery[2]-edgecentery[0]])
-            e0c0v = np.array([e0e2v[1],-e0e2v[0]])/np.linalg.norm(e0e2v)
-            e0 = np.array([edgecenterx[0],edgecentery[0]])
-            e2 = np.array([edgecenterx[2],edgecentery[2]])
-            c0 = e0+e0c0v
-            c1 = e0-e0c0v
-            c2 = e2-e0c0v
-            c3 = e2+e0c0v
-            xr = np.array([c0[0],c1[0],c2[0],c3[0]])
-            yr = np.array([c0[1],c1[1],c2[1],c3[1]])
-            edgecenterx = np.mean(np.column_stack((xr,xr[[1,2,3,0]])),axis=1)
-            edgecentery = np.mean(np.column_stack((yr,yr[[1,2,3,0]])),axis=1)
-
-            fwhmy = np.linalg.norm([edgecenterx[0]-edgecenterx[2],edgecentery[0]-edgecentery[2]])
-            fwhmx = np.linalg.norm([edgecenterx[1]-edgecenterx[3],edgecentery[1]-edgecentery[3]])
-        
-        if fwhmy < threshold_m:
-            e1e3v = np.array([edgecenterx[3]-edgecenterx[1],edgecentery[3]-edgecentery[1]])
-            e1c1v = np.array([e1e3v[1],-e1e3v[0]])/np.linalg.norm(e1e3v)
-            e1 = np.array([edgecenterx[1],edgecentery[1]])
-            e3 = np.array([edgecenterx[3],edgecentery[3]])
-            c1 = e1+e1c1v
-            c2 = e1-e1c1v
-            c0 = e3+e1c1v
-            c3 = e3-e1c1v
-            xr = np.array([c0[0],c1[0],c2[0],c3[0]])
-            yr = np.array([c0[1],c1[1],c2[1],c3[1]])
-            edgecenterx = np.mean(np.column_stack((xr,xr[[1,2,3,0]])),axis=1)
-            edgecentery = np.mean(np.column_stack((yr,yr[[1,2,3,0]])),axis=1)
-
-            fwhmy = np.linalg.norm([edgecenterx[0]-edgecenterx[2],edgecentery[0]-edgecentery[2]])
-            fwhmx = np.linalg.norm([edgecenterx[1]-edgecenterx[3],edgecentery[1]-edgecentery[3]])
-            
-        if inflatex != 1 or inflatey != 1:
-            xrr = np.array([-fwhmx,fwhmx,fwhmx,-fwhmx])/2
-            yrr = np.array([fwhmy,fwhmy,-fwhmy,-fwhmy])/2
-
-            fwhmx_new = inflatex*fwhmx
-            fwhmy_new = inflatey*fwhmy
-
-            xrr_new = np.array([-fwhmx_new,fwhmx_new,fwhmx_new,-fwhmx_new])/2
-            yrr_new = np.array([fwhmy_new,fwhmy_new,-fwhmy_new,-fwhmy_new])/2
-            
-            tform = cv2.getPerspectiveTransform(np.float32(np.column_stack((xrr,yrr))),
-                                               np.float32(np.column_stack((xr,yr))))
-            tmp = np.float32(np.column_stack((xrr_new,yrr_new,np.ones_like(yrr_new)))).dot(tform.T)
-            xr = tmp[:,0]
-            yr = tmp[:,1]
-           
-        lonr_new[il2,:] = xr/(111e3*np.cos(latc[il2]/180*np.pi))+lonc[il2]
-        latr_new[il2,:] = yr/111e3+latc[il2]
+    xr = (lonr-lonc[:,np.newaxis])*111e3*np.cos(latc[:,np.newaxis]/180*np.pi)
+    yr = (latr-latc[:,np.newaxis])*111e3
+    edgecenterx,edgecentery,fwhmx,fwhmy = F_edge_fwhm(xr,yr)
+    if inflatex == 1 and inflatey == 1:
+        adjust = (fwhmx < threshold_m) | (fwhmy < threshold_m)
+    else:
+        adjust = np.ones(len(lonc),dtype=bool)
+    xr = xr[adjust] ; yr = yr[adjust]
+    edgecenterx = edgecenterx[adjust] ; edgecentery = edgecentery[adjust]
+    fwhmx = fwhmx[adjust] ; fwhmy = fwhmy[adjust]
+    
+    f = fwhmx < threshold_m
+    if np.any(f):
+        e0 = np.column_stack((edgecenterx[f,0],edgecentery[f,0]))
+        e2 = np.column_stack((edgecenterx[f,2],edgecentery[f,2]))
+        e0e2v = e2-e0
+        e0c0v = np.column_stack((e0e2v[:,1],-e0e2v[:,0]))/np.linalg.norm(e0e2v,axis=1)[:,np.newaxis]
+        corners = np.stack((e0+e0c0v,e0-e0c0v,e2-e0c0v,e2+e0c0v),axis=1)
+        xr[f] = corners[...,0] ; yr[f] = corners[...,1]
+        edgecenterx,edgecentery,fwhmx,fwhmy = F_edge_fwhm(xr,yr)
+    
+    f = fwhmy < threshold_m
+    if np.any(f):
+        e1 = np.column_stack((edgecenterx[f,1],edgecentery[f,1]))
+        e3 = np.column_stack((edgecenterx[f,3],edgecentery[f,3]))
+        e1e3v = e3-e1
+        e1c1v = np.column_stack((e1e3v[:,1],-e1e3v[:,0]))/np.linalg.norm(e1e3v,axis=1)[:,np.newaxis]
+        corners = np.stack((e3+e1c1v,e1+e1c1v,e1-e1c1v,e3-e1c1v),axis=1)
+        xr[f] = corners[...,0] ; yr[f] = corners[...,1]
+        edgecenterx,edgecentery,fwhmx,fwhmy = F_edge_fwhm(xr,yr)
+    
+    if inflatex != 1 or inflatey != 1:
+        sign_x = np.array([-1,1,1,-1])/2
+        sign_y = np.array([1,1,-1,-1])/2
+        src = np.float32(np.stack((fwhmx[:,np.newaxis]*sign_x,fwhmy[:,np.newaxis]*sign_y),axis=-1))
+        dst = np.float32(np.stack((xr,yr),axis=-1))
+        tform = F_perspective_transforms(src,dst)
+        new = np.float32(np.stack((inflatex*fwhmx[:,np.newaxis]*sign_x,
+                                   inflatey*fwhmy[:,np.newaxis]*sign_y,
+                                   np.ones_like(xr)),axis=-1))
+        tmp = np.einsum('nij,nkj->nki',tform,new)
+        xr = tmp[...,0]
+        yr = tmp[...,1]
     
+    lonr_new[adjust] = xr/(111e3*np.cos(latc[adjust,np.newaxis]/180*np.pi))+lonc[adjust,np.newaxis]
+    latr_new[adjust] = yr/111e3+latc[adjust,np.newaxis]
     return lonr_new, latr_new
 
-def F_ncread_selective(fn,varnames,varnames_short=None):
+def F_ncread_selective(fn,varnames,varnames_short=None,window=None):
     """
     very basic netcdf reader, similar to F_ncread_selective.m
+    window:
+        tuple of slices, applied to variables with as many dimensions
     created on 2019/08/13
     """
     from netCDF4 import Dataset
@@ -1298,14 +1781,51 @@ def F_ncread_selective(fn,varnames,varnames_short=None):
     if varnames_short is None:
         varnames_short = varnames
     for (i,varname) in enumerate(varnames):
+        if window is not None and ncid[varname].ndim == len(window):
+            idx = window
+        else:
+            idx = slice(None)
         try:
-            outp[varnames_short[i]] = ncid[varname][:].filled(np.nan)
+            outp[varnames_short[i]] = ncid[varname][idx].filled(np.nan)
         except:
             logging.debug('{} cannot be filled by nan or is not a masked array'.format(varname))
-            outp[varnames_short[i]] = ncid[varname][:]
+            outp[varnames_short[i]] = ncid[varname][idx]
     ncid.close()
     return outp
 
+def F_scanline_window(latc,lonc,west,east,south,north):
+    '''
+    along-track (first axis) range of a granule whose pixel centers fall in the box,
+    following the lat/lon part of the validmask in F_subset_* functions
+    latc/lonc:
+        (nscanline, nground_pixel) arrays
+    return:
+        a slice of scanlines, or None if no pixel center is in the box
+    '''
+    latc = np.ma.filled(np.ma.asarray(latc,dtype=np.float64),np.nan)
+    lonc = np.ma.filled(np.ma.asarray(lonc,dtype=np.float64),np.nan)
+    tmplon = lonc-west
+    tmplon[tmplon < 0] = tmplon[tmplon < 0]+360
+    inbox = (latc >= south) & (latc <= north) & (tmplon >= 0) & (tmplon <= east-west)
+    inbox = inbox.reshape(inbox.shape[0],-1).any(axis=1)
+    if not inbox.any():
+        return None
+    rows = np.nonzero(inbox)[0]
+    return slice(rows[0],rows[-1]+1)
+
+def F_read_granule_wrapper(args):
+    '''
+    read one level 2 granule in a worker process, see popy.F_read_granules
+    '''
+    attrs,reader,fn,reader_args,bbox_prune = args
+    p = popy.__new__(popy)
+    p.__dict__.update(attrs)
+    p.logger = logging.getLogger(__name__)
+    try:
+        return fn,getattr(p,reader)(fn,*reader_args,bbox_prune=bbox_prune),None
+    except Exception as e:
+        return fn,None,e
+
 def F_find_files(root_dir,start_date,end_date,
                  fn_date_identifier='hms_smoke%Y%m%d*.shp'):
     '''
@@ -1359,65 +1879,25 @@ def F_ellipse(a,b,alpha,npoint,xcenter=0,ycenter=0):
     minlat_e = X[1,].min()
     return X, minlon_e, minlat_e
 
-def F_block_regrid_wrapper(args):
-    '''
-    repackage F_block_regrid_ccm following example of pysplat.hitran_absco
-    '''
-    return F_block_regrid_ccm(*args)
-
-def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
-                       oversampling_list,pixel_shape,error_model,
-                       k1,k2,k3,xmargin,ymargin,
-                       iblock=1,verbose=False,inflatex=None,inflatey=None,sg_scaling=1):
-    '''
-    a more compact version of F_regrid_ccm designed for parallel regridding
+def F_block_kernel_geometry(l2g_data,xmesh,ymesh,pixel_shape,
+                            k1,k2,k3,xmargin,ymargin,inflatex=None,inflatey=None):
+    """
+    pixel geometry shared by all F_block_regrid_ccm engines
     l2g_data:
         a l2g_data dictionary compatible with popy
-    xmesh:
-        lon mesh grid
-    ymesh:
-        lat mesh grid
-    grid_size:
-        in degree
-    oversampling_list:
-        a list of l2(g) variables to be oversampled
+    xmesh/ymesh:
+        lon/lat (or x/y if proj) mesh grid of the block
     pixel_shape:
         'quadrilateral' or 'elliptical'
-    error_model:
-        error model in popy
-    k1, k2, k3:
-        2d super gaussian shape parameter
-    xmargin, ymargin:
-        factors extending beyond pixel boundary
-    iblock:
-        indicate block in parallel regridding
-    verbose:
-        if print diagnostics
-    inflatex/y:
-        inflate pixels across (x) and along (y) track
-    sg_scaling:
-        scale SG so num_samples is not biased as layers
-    created on 2020/07/19
-    '''
-    if len(l2g_data['latc']) == 0:
-        l3_data = {}
-        l3_data['xmesh'] = xmesh
-        l3_data['ymesh'] = ymesh
-        l3_data['total_sample_weight'] = xmesh*0.
-        l3_data['num_samples'] = xmesh*0.
-        for ikey in range(len(oversampling_list)):
-            l3_data[oversampling_list[ikey]] = xmesh*np.nan
-        if 'cloud_fraction' in oversampling_list:
-            l3_data['pres_total_sample_weight'] = xmesh*0.
-            l3_data['pres_num_samples'] = xmesh*0.
-        return l3_data
-    import cv2
-    from shapely.geometry import Polygon
+    return:
+        a dict with per-pixel lat/lon_index (lists of grid indices of each pixel's patch),
+        patch_west, patch_lonc, latc, area_weight, sg_wx, sg_wy and tform (quadrilateral)
+        or t (elliptical). None if pixel_shape is not supported
+    """
     sg_kfacx = 2*(np.log(2)**(1/k1/k3))
     sg_kfacy = 2*(np.log(2)**(1/k2/k3))
     inflatex = inflatex or 1
     inflatey = inflatey or 1
-    nvar_oversampling = len(oversampling_list)
     nl2 = len(l2g_data['latc'])
     xgrid = xmesh[0,:]
     ygrid = ymesh[:,0]
@@ -1429,17 +1909,8 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
         use_proj = False
     grid_size = np.median(np.abs(np.diff(xgrid)))
     max_ncol = np.array(np.round(360/grid_size),dtype=int)
-    # Allocate memory for regrid fields
-    total_sample_weight = np.zeros(xmesh.shape)
-    num_samples = np.zeros(xmesh.shape)
-    sum_aboves = []
-    for n in range(nvar_oversampling):
-        sum_aboves.append(np.zeros(xmesh.shape))
-    # To only average cloud pressure using pixels where cloud fraction > 0.0
-    pres_total_sample_weight = np.zeros(xmesh.shape)
-    pres_num_samples = np.zeros(xmesh.shape)
-    pres_sum_aboves = np.zeros(xmesh.shape)
-    
+    tform = None
+    t = None
     # Move as much as possible outside loop
     if pixel_shape == 'quadrilateral' and use_proj:
         # Set 
@@ -1465,7 +1936,7 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
         # This might be faster
         patch_lonr = np.array([lonr[i,:] - patch_west[i] for i in range(nl2)]) ; #patch_lonr[patch_lonr<0.0] += 360.0
         patch_lonc = lonc - patch_west ; #patch_lonc[patch_lonc<0.0] += 360.0
-        area_weight = [Polygon(np.column_stack([patch_lonr[i,:],latr[i,:].squeeze()])).area for i in range(nl2)]
+        area_weight = F_polygon_area(patch_lonr,latr)
         # Compute transforms for SG outside loop
         vlist = np.zeros((nl2,4,2),dtype=np.float32)
         for n in range(4):
@@ -1476,7 +1947,7 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
         fwhmx = np.linalg.norm(xvector,axis=1)
         fwhmy = np.linalg.norm(yvector,axis=1)
         fixedPoints = np.array([[-fwhmx,-fwhmy],[-fwhmx,fwhmy],[fwhmx,fwhmy],[fwhmx,-fwhmy]],dtype=np.float32).transpose((2,0,1))/2.0
-        tform = [cv2.getPerspectiveTransform(vlist[i,:,:].squeeze(),fixedPoints[i,:,:].squeeze()) for i in range(nl2)]
+        tform = F_perspective_transforms(vlist,fixedPoints)
         
     elif pixel_shape == 'quadrilateral' and not use_proj:
         # Set 
@@ -1502,7 +1973,7 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
         # This might be faster
         patch_lonr = np.array([lonr[i,:] - patch_west[i] for i in range(nl2)]) ; #patch_lonr[patch_lonr<0.0] += 360.0
         patch_lonc = lonc - patch_west ; #patch_lonc[patch_lonc<0.0] += 360.0
-        area_weight = [Polygon(np.column_stack([patch_lonr[i,:],latr[i,:].squeeze()])).area for i in range(nl2)]
+        area_weight = F_polygon_area(patch_lonr,latr)
         # Compute transforms for SG outside loop
         vlist = np.zeros((nl2,4,2),dtype=np.float32)
         for n in range(4):
@@ -1513,7 +1984,7 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
         fwhmx = np.linalg.norm(xvector,axis=1)
         fwhmy = np.linalg.norm(yvector,axis=1)
         fixedPoints = np.array([[-fwhmx,-fwhmy],[-fwhmx,fwhmy],[fwhmx,fwhmy],[fwhmx,-fwhmy]],dtype=np.float32).transpose((2,0,1))/2.0
-        tform = [cv2.getPerspectiveTransform(vlist[i,:,:].squeeze(),fixedPoints[i,:,:].squeeze()) for i in range(nl2)]
+        tform = F_perspective_transforms(vlist,fixedPoints)
         
     elif pixel_shape == 'elliptical'  and not use_proj:
         # Set 
@@ -1550,7 +2021,178 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
         logging.warning('Pixel shape has to be quadrilateral or elliptical!')
         logging.warning('use_proj not available yet for elliptical!')
         return
-    # Compute uncertainty weights
+    sg_wx = inflatex*fwhmx/sg_kfacx
+    sg_wy = inflatey*fwhmy/sg_kfacy
+    return dict(lat_index=lat_index,lon_index=lon_index,patch_west=patch_west,
+                patch_lonc=patch_lonc,latc=latc,area_weight=area_weight,
+                sg_wx=sg_wx,sg_wy=sg_wy,tform=tform,t=t)
+
+def F_block_sg_support(geometry,xgrid,ygrid,pixel_shape,k1,k2,k3,sg_tol):
+    """
+    truncate each pixel's patch to the cells where its super gaussian may exceed sg_tol times
+    the peak. in the transformed coordinates (x2,y2) of F_block_sg_chunks, SG > sg_tol*peak only
+    if |x2/ax|**k1+|y2/ay|**k2 < 1, where ax = sg_wx*s**(1/k1), ay = sg_wy*s**(1/k2) and
+    s = (-ln(sg_tol))**(1/k3). the extent of that region in patch coordinates follows from
+    inverting the linear part of tform (quadrilateral) or the rotation (elliptical), using the
+    dual norm (q = k/(k-1)) of the super ellipse when k1 == k2 > 1, or its bounding box otherwise.
+    cells outside are only dropped, so each kernel value lost is below sg_tol*peak
+    geometry:
+        output of F_block_kernel_geometry, not modified
+    sg_tol:
+        tolerance relative to the kernel peak, e.g., 1e-6
+    return:
+        a copy of geometry with truncated lat_index/lon_index, and the fraction of kernel
+        evaluations kept
+    created on 2026/10/17
+    """
+    lat_index = geometry['lat_index']
+    lon_index = geometry['lon_index']
+    nl2 = len(lat_index)
+    patch_west = np.asarray(geometry['patch_west'],dtype=np.float64)
+    patch_lonc = np.asarray(geometry['patch_lonc'],dtype=np.float64)
+    latc = np.asarray(geometry['latc'],dtype=np.float64)
+    # (x2,y2) = A(x,y)+b, with (x,y) patch coordinates relative to pixel centers
+    if pixel_shape == 'quadrilateral':
+        tform = np.array(geometry['tform'],dtype=np.float64).reshape(nl2,3,3)
+        A = tform[:,0:2,0:2]
+        b = tform[:,0:2,2]
+    elif pixel_shape == 'elliptical':
+        cost = np.cos(-geometry['t'])
+        sint = np.sin(-geometry['t'])
+        A = np.stack([np.stack([cost,-sint],axis=-1),np.stack([sint,cost],axis=-1)],axis=1)
+        b = np.zeros((nl2,2))
+    det = A[:,0,0]*A[:,1,1]-A[:,0,1]*A[:,1,0]
+    invertible = np.abs(det) > 0
+    det[~invertible] = 1.
+    Ainv = np.stack([np.stack([A[:,1,1],-A[:,0,1]],axis=-1),
+                     np.stack([-A[:,1,0],A[:,0,0]],axis=-1)],axis=1)/det[:,np.newaxis,np.newaxis]
+    center = -np.einsum('nij,nj->ni',Ainv,b)
+    s = (-np.log(sg_tol))**(1/k3)
+    ax = geometry['sg_wx']*s**(1/k1)
+    ay = geometry['sg_wy']*s**(1/k2)
+    if k1 == k2 and k1 > 1:
+        q = k1/(k1-1)
+    else:
+        q = 1
+    half_width = (np.abs(Ainv[:,0,0]*ax)**q+np.abs(Ainv[:,0,1]*ay)**q)**(1/q)
+    half_height = (np.abs(Ainv[:,1,0]*ax)**q+np.abs(Ainv[:,1,1]*ay)**q)**(1/q)
+    def F_truncate(index_list,grid,offset,center,half_extent):
+        # all patches flattened at once, then split back into per-pixel index arrays
+        npatch = np.array([len(i) for i in index_list],dtype=int)
+        owner = np.repeat(np.arange(nl2),npatch)
+        flat_index = np.concatenate(index_list).astype(int)
+        keep = (np.abs(grid[flat_index]-offset[owner]-center[owner]) <= half_extent[owner])\
+            | ~invertible[owner]
+        nkeep = np.bincount(owner[keep],minlength=nl2)
+        return npatch,nkeep,np.split(flat_index[keep],np.cumsum(nkeep)[:-1])
+    nlon,nlon_kept,new_lon_index = F_truncate(lon_index,xgrid,patch_west+patch_lonc,center[:,0],half_width)
+    nlat,nlat_kept,new_lat_index = F_truncate(lat_index,ygrid,latc,center[:,1],half_height)
+    nfull = np.sum(nlon*nlat)
+    nkept = np.sum(nlon_kept*nlat_kept)
+    support = dict(geometry)
+    support['lat_index'] = new_lat_index
+    support['lon_index'] = new_lon_index
+    return support,nkept/np.max([nfull,1])
+
+def F_block_sg_chunks(geometry,xgrid,ygrid,pixel_shape,k1,k2,k3,
+                      sg_scaling=1,chunk_size=2**20,pixel_group=None):
+    """
+    evaluate the super gaussian kernels of many pixels at once, grouped by patch size
+    geometry:
+        output of F_block_kernel_geometry
+    xgrid/ygrid:
+        grid centers of the block
+    chunk_size:
+        maximum number of kernel evaluations (pixels x patch cells) held in memory at once
+    pixel_group:
+        optional (nl2,) integer labels, e.g., bin indices. a chunk never mixes labels
+    yield:
+        (il2, cell, SG), where il2 is (npix,) pixel indices, cell is (npix, ny*nx) flattened
+        row-major grid indices (irow*ncols+icol), and SG is (npix, ny*nx) kernel values,
+        identical to what the per-pixel loop in F_block_regrid_ccm evaluates
+    """
+    lat_index = geometry['lat_index']
+    lon_index = geometry['lon_index']
+    nl2 = len(lat_index)
+    ncols = len(xgrid)
+    patch_west = np.asarray(geometry['patch_west'],dtype=np.float64)
+    patch_lonc = np.asarray(geometry['patch_lonc'],dtype=np.float64)
+    latc = np.asarray(geometry['latc'],dtype=np.float64)
+    sg_wx = geometry['sg_wx']
+    sg_wy = geometry['sg_wy']
+    if pixel_shape == 'quadrilateral':
+        tform = np.array(geometry['tform'],dtype=np.float64).reshape(nl2,3,3)
+    elif pixel_shape == 'elliptical':
+        cost = np.cos(-geometry['t'])
+        sint = np.sin(-geometry['t'])
+    nys = np.array([len(i) for i in lat_index],dtype=int)
+    nxs = np.array([len(i) for i in lon_index],dtype=int)
+    # sort by patch shape first, then by the patch corner so that a chunk covers a compact area
+    corner = np.array([i[0] if len(i) > 0 else 0 for i in lat_index])*ncols\
+        +np.array([i[0] if len(i) > 0 else 0 for i in lon_index])
+    if pixel_group is None:
+        pixel_group = np.zeros(nl2,dtype=int)
+    order = np.lexsort((corner,nxs,nys,pixel_group))
+    shape_key = nys[order]*(nxs.max()+1)+nxs[order]
+    group_starts = np.flatnonzero(np.r_[True,(np.diff(shape_key) != 0)|(np.diff(pixel_group[order]) != 0)])
+    group_ends = np.r_[group_starts[1:],nl2]
+    for (g0,g1) in zip(group_starts,group_ends):
+        ny = nys[order[g0]]
+        nx = nxs[order[g0]]
+        if ny == 0 or nx == 0:
+            continue
+        npix_chunk = int(np.max([chunk_size//(ny*nx),1]))
+        for c0 in range(g0,g1,npix_chunk):
+            il2 = order[c0:np.min([c0+npix_chunk,g1])]
+            lat_idx = np.array([lat_index[i] for i in il2],dtype=int)
+            lon_idx = np.array([lon_index[i] for i in il2],dtype=int)
+            # (npix, ny, nx) patch coordinates relative to pixel centers
+            patch_x = np.broadcast_to((xgrid[lon_idx]-patch_west[il2,np.newaxis]\
+                                       -patch_lonc[il2,np.newaxis])[:,np.newaxis,:],(len(il2),ny,nx))
+            patch_y = np.broadcast_to((ygrid[lat_idx]-latc[il2,np.newaxis])[:,:,np.newaxis],(len(il2),ny,nx))
+            if pixel_shape == 'quadrilateral':
+                T = tform[il2]
+                # same as the loop, the homogeneous coordinate is not divided
+                x2 = T[:,0,0,np.newaxis,np.newaxis]*patch_x+T[:,0,1,np.newaxis,np.newaxis]*patch_y\
+                    +T[:,0,2,np.newaxis,np.newaxis]
+                y2 = T[:,1,0,np.newaxis,np.newaxis]*patch_x+T[:,1,1,np.newaxis,np.newaxis]*patch_y\
+                    +T[:,1,2,np.newaxis,np.newaxis]
+            elif pixel_shape == 'elliptical':
+                c = cost[il2,np.newaxis,np.newaxis]
+                s = sint[il2,np.newaxis,np.newaxis]
+                x2 = c*patch_x-s*patch_y
+                y2 = s*patch_x+c*patch_y
+            SG = np.exp(-(np.power( np.power(np.abs(x2/sg_wx[il2,np.newaxis,np.newaxis]),k1)\
+                                   +np.power(np.abs(y2/sg_wy[il2,np.newaxis,np.newaxis]),k2),k3)) )/sg_scaling
+            cell = lat_idx[:,:,np.newaxis]*ncols+lon_idx[:,np.newaxis,:]
+            yield il2, cell.reshape(len(il2),-1), SG.reshape(len(il2),-1)
+
+def F_accumulate_cells(accumulator,cell,values):
+    """
+    accumulator[cell] += values with repeated cells summed, using np.bincount
+    over the range of cell only so that small chunks stay cheap on large grids.
+    chunks scattered over a range much wider than their size use np.add.at instead
+    accumulator:
+        1d (raveled) array, modified in place
+    updated on 2026/10/17 to add the np.add.at path for sparse chunks
+    """
+    cell = cell.ravel()
+    values = values.ravel()
+    if cell.size == 0:
+        return
+    c0 = cell.min()
+    c1 = cell.max()+1
+    if c1-c0 > 16*cell.size:
+        np.add.at(accumulator,cell,values)
+        return
+    accumulator[c0:c1] += np.bincount(cell-c0,weights=values,minlength=c1-c0)
+
+def F_uncertainty_weight(l2g_data,error_model):
+    """
+    per-pixel uncertainty weight (the denominator of pixel weights) following error_model
+    error_model:
+        'linear', 'square', 'log', or 'ones'. returns None otherwise
+    """
     if error_model == "square":
         uncertainty_weight = l2g_data['column_uncertainty']**2
     elif error_model == "log":
@@ -1562,10 +2204,16 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
     else:
         logging.error('error_model has to be linear, square, log, or ones')
         return
-    # Cloud Fraction
-    if 'cloud_fraction' in oversampling_list:
-        cloud_fraction = l2g_data['cloud_fraction']
-    # Pull out grid variables from dictionary as it is slow to access
+    return uncertainty_weight
+
+def F_block_grid_fields(l2g_data,oversampling_list,error_model):
+    """
+    stack l2g fields to be oversampled into a (nl2, nvar) array
+    return:
+        grid_flds and the column index of cloud_pressure (-1 if absent)
+    """
+    nvar_oversampling = len(oversampling_list)
+    nl2 = len(l2g_data['latc'])
     grid_flds = np.zeros((nl2,nvar_oversampling)) ; pcld_idx = -1
     for n in range(nvar_oversampling):
         grid_flds[:,n] = l2g_data[oversampling_list[n]]
@@ -1574,53 +2222,35 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
         # Apply log to variable if error model is log
         if(error_model == 'log') and (oversampling_list[n] == 'column_amount'):
             grid_flds[:,n] = np.log10(grid_flds[:,n])
-        #t1 = time.time()
-    sg_wx = inflatex*fwhmx/sg_kfacx
-    sg_wy = inflatey*fwhmy/sg_kfacy
-    # Init point counter for logger
-    count = 0
-    for il2 in range(nl2):
-        ijmsh = np.ix_(lat_index[il2],lon_index[il2])
-        patch_xmesh = xmesh[ijmsh] - patch_west[il2]
-        #patch_xmesh[patch_xmesh<0.0] += 360.0
-        patch_ymesh = ymesh[ijmsh] - latc[il2]
-        if pixel_shape == 'quadrilateral':
-            xym1 = np.column_stack((patch_xmesh.flatten()-patch_lonc[il2],patch_ymesh.flatten()))
-            xym2 = np.hstack((xym1,np.ones((patch_xmesh.size,1)))).dot(tform[il2].T)[:,0:2]
-        elif pixel_shape == 'elliptical':
-            rotation_matrix = np.array([[np.cos(-t[il2]), -np.sin(-t[il2])],[np.sin(-t[il2]),  np.cos(-t[il2])]])
-            xym1 = np.array([patch_xmesh.flatten()-patch_lonc[il2],patch_ymesh.flatten()])#np.column_stack((patch_xmesh.flatten()-patch_lonc[il2],patch_ymesh.flatten())).T
-            xym2 = rotation_matrix.dot(xym1).T
-            
-        SG = np.exp(-(np.power( np.power(np.abs(xym2[:,0]/sg_wx[il2]),k1)           \
-                                  +np.power(np.abs(xym2[:,1]/sg_wy[il2]),k2),k3)) )/sg_scaling
-        SG = SG.reshape(patch_xmesh.shape)
-        # Update Number of samples
-        num_samples[ijmsh] += SG
-        # Only bother doing this if regridding cloud pressure
-        if 'cloud_fraction' in oversampling_list:
-            if(pcld_idx > 0 and cloud_fraction[il2] > 0.0):
-                pres_num_samples[ijmsh] += SG
-        # The weights
-        tmp_wt = SG/area_weight[il2]/uncertainty_weight[il2]
-        # Update total weights
-        total_sample_weight[ijmsh] += tmp_wt
-        # This only needs to be done if we are gridding pressure
-        if 'cloud_fraction' in oversampling_list:
-            if(pcld_idx > 0 and cloud_fraction[il2] > 0.0):
-                pres_total_sample_weight[ijmsh] += tmp_wt
-        # Update the desired grid variables
-        for ivar in range(nvar_oversampling):
-            sum_aboves[ivar][ijmsh] += tmp_wt[:,:]*grid_flds[il2,ivar]
-        if 'cloud_fraction' in oversampling_list:
-            if(pcld_idx > 0 and cloud_fraction[il2] > 0.0):
-                pres_sum_aboves[ijmsh] += tmp_wt[:,:]*grid_flds[il2,pcld_idx]
-        if il2 == count*np.round(nl2/10.):
-            logging.debug('block %d'%iblock+' %d%% finished\n' %(count*10))
-            count = count + 1
-        
-    logging.info('block %d'%iblock+' completed at '+datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'))
+    return grid_flds,pcld_idx
+
+def F_pixel_area(l2g_data,pixel_shape):
+    """
+    pixel areas as used in the pixel weights of F_block_regrid_ccm, in squared degree
+    (or squared projection unit if xr/yr exist)
+    pixel_shape:
+        'quadrilateral' (shoelace formula on corners) or 'elliptical' (u*v)
+    """
+    if pixel_shape == 'elliptical':
+        return l2g_data['u']*l2g_data['v']
+    if 'xr' in l2g_data.keys():
+        xr = l2g_data['xr']-l2g_data['xc'][:,np.newaxis]
+        yr = l2g_data['yr']-l2g_data['yc'][:,np.newaxis]
+    else:
+        xr = l2g_data['lonr']-l2g_data['lonc'][:,np.newaxis]
+        yr = l2g_data['latr']-l2g_data['latc'][:,np.newaxis]
+    return F_polygon_area(xr,yr)
+
+def F_block_l3_from_sums(xmesh,ymesh,oversampling_list,
+                         total_sample_weight,num_samples,sum_aboves,
+                         pres_total_sample_weight,pres_num_samples,pres_sum_aboves):
+    """
+    turn accumulated sums into the l3_data dict returned by F_block_regrid_ccm
+    sum_aboves:
+        list of weighted sums, one for each field in oversampling_list
+    """
     l3_data = {}
+    nrows,ncols = xmesh.shape
     #np.seterr(divide='ignore', invalid='ignore')
     for ikey in range(len(oversampling_list)):
         l3_data[oversampling_list[ikey]] = sum_aboves[ikey][:,:].squeeze()\
@@ -1651,6 +2281,480 @@ def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
         l3_data['pres_num_samples'] = pres_num_samples
     return l3_data
 
+def F_block_sums_from_l3(l3_data,oversampling_list):
+    """
+    inverse of F_block_l3_from_sums. recover the accumulated sums from a l3_data dict
+    returned by F_block_regrid_ccm, with zeros where there is no sample
+    return:
+        total_sample_weight, num_samples, sum_aboves (list following oversampling_list),
+        pres_total_sample_weight, pres_num_samples, pres_sum_aboves
+    """
+    total_sample_weight = l3_data['total_sample_weight']
+    num_samples = l3_data['num_samples']
+    sum_aboves = [np.nan_to_num(l3_data[key]*total_sample_weight) for key in oversampling_list]
+    if 'pres_total_sample_weight' in l3_data.keys():
+        pres_total_sample_weight = l3_data['pres_total_sample_weight']
+        pres_num_samples = l3_data['pres_num_samples']
+    elif 'cloud_pressure' in oversampling_list:
+        # cloud_pressure without its own weights was averaged like other fields
+        pres_total_sample_weight = total_sample_weight
+        pres_num_samples = num_samples
+    else:
+        pres_total_sample_weight = np.zeros_like(total_sample_weight)
+        pres_num_samples = np.zeros_like(total_sample_weight)
+    if 'cloud_pressure' in oversampling_list:
+        pres_sum_aboves = np.nan_to_num(l3_data['cloud_pressure']*pres_total_sample_weight)
+        sum_aboves[oversampling_list.index('cloud_pressure')] = pres_sum_aboves
+    else:
+        pres_sum_aboves = np.zeros_like(total_sample_weight)
+    return (total_sample_weight,num_samples,sum_aboves,
+            pres_total_sample_weight,pres_num_samples,pres_sum_aboves)
+
+def F_block_regrid_operator(l2g_data,xmesh,ymesh,pixel_shape,error_model,
+                            k1,k2,k3,xmargin,ymargin,
+                            inflatex=None,inflatey=None,sg_scaling=1,sg_tol=None):
+    """
+    sparse pixel-to-grid weight operator, W, of shape (nrows*ncols, nl2). W[icell,il2] is the
+    weight, SG/area_weight/uncertainty_weight, that F_block_regrid_ccm adds to total_sample_weight.
+    cells are raveled row-major from xmesh/ymesh. with W built once:
+        total_sample_weight = W @ ones
+        sum_above = W @ field
+        num_samples = W @ (F_pixel_area*F_uncertainty_weight)
+    see popy.F_build_regrid_operator and popy.F_parallel_regrid(operator=W)
+    arguments follow F_block_regrid_ccm. sg_tol also keeps W sparser
+    return:
+        a scipy.sparse.csr_matrix. memory scales with the total number of kernel evaluations
+    """
+    from scipy.sparse import csr_matrix
+    nl2 = len(l2g_data['latc'])
+    ncell = xmesh.size
+    if nl2 == 0:
+        return csr_matrix((ncell,nl2))
+    geometry = F_block_kernel_geometry(l2g_data,xmesh,ymesh,pixel_shape,
+                                       k1,k2,k3,xmargin,ymargin,inflatex,inflatey)
+    if geometry is None:
+        return
+    if sg_tol is not None:
+        geometry,kept_fraction = F_block_sg_support(geometry,xmesh[0,:],ymesh[:,0],pixel_shape,
+                                                    k1,k2,k3,sg_tol)
+    uncertainty_weight = F_uncertainty_weight(l2g_data,error_model)
+    if uncertainty_weight is None:
+        return
+    pixel_weight = 1/np.asarray(geometry['area_weight'],dtype=np.float64)/uncertainty_weight
+    rows = [] ; cols = [] ; vals = []
+    for (il2,cell,SG) in F_block_sg_chunks(geometry,xmesh[0,:],ymesh[:,0],pixel_shape,
+                                           k1,k2,k3,sg_scaling):
+        rows.append(cell.ravel())
+        cols.append(np.repeat(il2,cell.shape[1]))
+        vals.append((SG*pixel_weight[il2,np.newaxis]).ravel())
+    if len(rows) == 0:
+        return csr_matrix((ncell,nl2))
+    # duplicated (cell, pixel) pairs are summed, as += does in the loop
+    return csr_matrix((np.concatenate(vals),(np.concatenate(rows),np.concatenate(cols))),
+                      shape=(ncell,nl2))
+
+def F_bin_index(values,bin_edges):
+    """
+    index of the bin each value falls in, -1 if outside or nan. bins are [edge_i, edge_i+1),
+    except that the last bin also includes its right edge, as np.histogram does
+    """
+    values = np.asarray(values)
+    bin_edges = np.asarray(bin_edges)
+    nbin = len(bin_edges)-1
+    index = np.searchsorted(bin_edges,values,side='right')-1
+    index[values == bin_edges[-1]] = nbin-1
+    index[(index < 0) | (index >= nbin) | np.isnan(values)] = -1
+    return index
+
+def F_block_regrid_wrapper(args):
+    '''
+    repackage F_block_regrid_ccm following example of pysplat.hitran_absco
+    '''
+    return F_block_regrid_ccm(*args)
+
+def F_block_regrid_timed_wrapper(args):
+    '''
+    F_block_regrid_wrapper for popy.F_cost_scheduled_regrid, which dispatches blocks out
+    of order. the first argument is the task index, returned with the l3 block and timing
+    '''
+    import time
+    itask = args[0]
+    t0 = time.time()
+    l3_data = F_block_regrid_ccm(*args[1:])
+    return itask,l3_data,time.time()-t0
+
+def F_regrid_executor_warmup(i):
+    '''
+    regrid a single synthetic pixel with both engines, so that lazily imported modules and
+    numpy code paths are loaded in a RegridExecutor worker before real blocks arrive
+    '''
+    xmesh,ymesh = np.meshgrid(np.arange(-0.5,0.51,0.1),np.arange(-0.5,0.51,0.1))
+    l2g_data = {'lonc':np.array([0.]),'latc':np.array([0.]),
+                'lonr':np.array([[-0.2,-0.2,0.2,0.2]]),'latr':np.array([[-0.2,0.2,0.2,-0.2]]),
+                'column_amount':np.array([1.]),'column_uncertainty':np.array([1.])}
+    for engine in ['loop','vectorized']:
+        F_block_regrid_ccm(l2g_data,xmesh,ymesh,['column_amount'],'quadrilateral','ones',
+                           4,4,1,1.5,1.5,engine=engine)
+    return os.getpid()
+
+class RegridExecutor(object):
+    '''
+    a persistent multiprocessing pool for the regrid functions, so that processes are forked
+    once and reused across F_wrapper_l3 periods, orbit layers and daily regrids. e.g.,
+    with RegridExecutor(ncores=8) as executor:
+        for ...:
+            l3 = F_wrapper_l3(...,executor=executor)
+    created on 2026/10/17
+    '''
+    def __init__(self,ncores=None,maxtasksperchild=None,warmup=True):
+        '''
+        ncores:
+            number of processes. None uses half, > max cpu uses max cpu, as in F_parallel_regrid
+        maxtasksperchild:
+            replace a worker after this many blocks to release its memory. None keeps workers
+        warmup:
+            if True, run a tiny regrid in each worker when the pool starts
+        '''
+        import multiprocessing
+        self.logger = logging.getLogger(__name__)
+        ncores_max = multiprocessing.cpu_count()
+        if ncores is None:
+            ncores = int(np.ceil(ncores_max/2))
+        elif ncores > ncores_max:
+            self.logger.warning('You asked for more cores than you have! Use max number %d'%ncores_max)
+            ncores = ncores_max
+        self.ncores = max(ncores,1)
+        self.maxtasksperchild = maxtasksperchild
+        self.warmup = warmup
+        self.pool = None
+    
+    def start(self):
+        if self.pool is not None:
+            return self
+        import multiprocessing
+        from multiprocessing import resource_tracker
+        # forked workers must share the parent's tracker of the shared memory blocks published
+        # by F_shared_memory_regrid, otherwise each starts its own and reports them as leaked
+        resource_tracker.ensure_running()
+        self.logger.info('starting a pool of {} regrid workers'.format(self.ncores))
+        self.pool = multiprocessing.Pool(self.ncores,maxtasksperchild=self.maxtasksperchild)
+        if self.warmup:
+            pids = self.pool.map(F_regrid_executor_warmup,range(self.ncores),chunksize=1)
+            self.logger.info('{} workers warmed up'.format(len(set(pids))))
+        return self
+    
+    def shutdown(self,wait=True):
+        '''
+        close the pool. wait=True lets running tasks finish, otherwise workers are terminated
+        '''
+        if self.pool is None:
+            return
+        if wait:
+            self.pool.close()
+        else:
+            self.pool.terminate()
+        self.pool.join()
+        self.pool = None
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self,exc_type,exc_value,traceback):
+        # terminate instead of waiting for queued blocks if the with block failed
+        self.shutdown(wait=exc_type is None)
+        return False
+    
+    def __del__(self):
+        if getattr(self,'pool',None) is not None:
+            self.pool.terminate()
+
+def F_regrid_pool(ncores,executor=None):
+    '''
+    pool to use in a with statement by the regrid functions: the started pool of a
+    RegridExecutor, which is left open, or a new multiprocessing.Pool(ncores)
+    '''
+    import contextlib
+    import multiprocessing
+    if executor is None:
+        return multiprocessing.Pool(ncores)
+    return contextlib.nullcontext(executor.start().pool)
+
+def F_shared_memory_publish(arrays):
+    """
+    copy a dict of numpy arrays into new multiprocessing.shared_memory blocks
+    return:
+        dict of SharedMemory objects (caller closes and unlinks them) and a picklable
+        spec, {key:(name,shape,dtype)}, for F_shared_memory_attach
+    """
+    from multiprocessing import shared_memory
+    shms = {}
+    spec = {}
+    for (key,value) in arrays.items():
+        value = np.ascontiguousarray(value)
+        shm = shared_memory.SharedMemory(create=True,size=max(value.nbytes,1))
+        np.ndarray(value.shape,dtype=value.dtype,buffer=shm.buf)[...] = value
+        shms[key] = shm
+        spec[key] = (shm.name,value.shape,value.dtype.str)
+    return shms,spec
+
+def F_shared_memory_attach(spec):
+    """
+    zero-copy numpy views of arrays published by F_shared_memory_publish
+    return:
+        dict of SharedMemory objects (to be closed, not unlinked) and dict of arrays
+    """
+    from multiprocessing import shared_memory
+    shms = {}
+    arrays = {}
+    for (key,(name,shape,dtype)) in spec.items():
+        shms[key] = shared_memory.SharedMemory(name=name)
+        arrays[key] = np.ndarray(shape,dtype=dtype,buffer=shms[key].buf)
+    return shms,arrays
+
+def F_block_regrid_shared_wrapper(args):
+    '''
+    shared memory version of F_block_regrid_wrapper, see popy.F_shared_memory_regrid.
+    regrid a l3 block using sorted pixels i0:i1 and write the result into shared outputs
+    '''
+    (l2g_spec,out_spec,i0,i1,row0,row1,col0,col1,xgrid,ygrid,oversampling_list,
+     pixel_shape,error_model,k1,k2,k3,xmargin,ymargin,
+     iblock,verbose,inflatex,inflatey,sg_scaling,engine,bin_by,bin_edges,sg_tol) = args
+    l2g_shm,columns = F_shared_memory_attach(l2g_spec)
+    out_shm,outputs = F_shared_memory_attach(out_spec)
+    try:
+        xmesh,ymesh = np.meshgrid(xgrid[col0:col1],ygrid[row0:row1])
+        mask = (columns['pixel_west'][i0:i1] <= xmesh[0,-1]) &\
+        (columns['pixel_east'][i0:i1] >= xmesh[0,0]) &\
+        (columns['pixel_south'][i0:i1] <= ymesh[-1,0]) &\
+        (columns['pixel_north'][i0:i1] >= ymesh[0,0])
+        block_l2g_data = {k:v[i0:i1][mask,] for (k,v) in columns.items()
+                          if k not in ['pixel_west','pixel_east','pixel_south','pixel_north']}
+        l3_data = F_block_regrid_ccm(block_l2g_data,xmesh,ymesh,oversampling_list,
+                                     pixel_shape,error_model,k1,k2,k3,xmargin,ymargin,
+                                     iblock,verbose,inflatex,inflatey,sg_scaling,engine,
+                                     bin_by,bin_edges,sg_tol)
+        for key in outputs.keys():
+            outputs[key][...,row0:row1,col0:col1] = l3_data[key]
+        npix = np.sum(mask)
+        del columns,outputs,block_l2g_data,mask
+    finally:
+        for shm in list(l2g_shm.values())+list(out_shm.values()):
+            shm.close()
+    return npix
+
+def F_block_regrid_ccm(l2g_data,xmesh,ymesh,
+                       oversampling_list,pixel_shape,error_model,
+                       k1,k2,k3,xmargin,ymargin,
+                       iblock=1,verbose=False,inflatex=None,inflatey=None,sg_scaling=1,
+                       engine='loop',bin_by=None,bin_edges=None,sg_tol=None,return_sums=False):
+    '''
+    a more compact version of F_regrid_ccm designed for parallel regridding
+    l2g_data:
+        a l2g_data dictionary compatible with popy
+    xmesh:
+        lon mesh grid
+    ymesh:
+        lat mesh grid
+    grid_size:
+        in degree
+    oversampling_list:
+        a list of l2(g) variables to be oversampled
+    pixel_shape:
+        'quadrilateral' or 'elliptical'
+    error_model:
+        error model in popy
+    k1, k2, k3:
+        2d super gaussian shape parameter
+    xmargin, ymargin:
+        factors extending beyond pixel boundary
+    iblock:
+        indicate block in parallel regridding
+    verbose:
+        if print diagnostics
+    inflatex/y:
+        inflate pixels across (x) and along (y) track
+    sg_scaling:
+        scale SG so num_samples is not biased as layers
+    engine:
+        'loop' evaluates and accumulates pixel by pixel. 'vectorized' evaluates kernels of
+        pixels with the same patch size in stacked arrays (F_block_sg_chunks) and accumulates
+        them with np.bincount. both give the same outputs up to floating point summation
+        order (relative difference < 1e-6, typically ~1e-13)
+    bin_by:
+        if provided, name of a l2g field. pixels are binned by bin_edges of this field (see
+        F_bin_index) and accumulated along a leading bin axis in one pass, so that each kernel
+        is evaluated once. output fields become (nbin, nrows, ncols). forces engine='vectorized'
+    bin_edges:
+        monotonically increasing bin edges of l2g_data[bin_by]
+    sg_tol:
+        if provided, e.g., 1e-6, patches are truncated to the analytic support where SG exceeds
+        sg_tol times its peak (F_block_sg_support), so the near-zero tails inside the
+        xmargin/ymargin rectangle are not evaluated. each dropped kernel value is < sg_tol*peak
+    return_sums:
+        if True, return the accumulated sums before division, in the order of F_block_sums_from_l3:
+        total_sample_weight, num_samples, sum_aboves (list following oversampling_list),
+        pres_total_sample_weight, pres_num_samples, pres_sum_aboves
+    created on 2020/07/19
+    '''
+    if bin_by is not None:
+        if engine != 'vectorized':
+            logging.info('binning by {} uses the vectorized engine'.format(bin_by))
+            engine = 'vectorized'
+        nbin = len(bin_edges)-1
+        pixel_bin = F_bin_index(l2g_data[bin_by],bin_edges)
+        inbin = pixel_bin >= 0
+        l2g_data = {k:v[inbin,] for (k,v) in l2g_data.items()}
+        pixel_bin = pixel_bin[inbin]
+        acc_shape = (nbin,)+xmesh.shape
+    else:
+        acc_shape = xmesh.shape
+    if len(l2g_data['latc']) == 0:
+        if return_sums:
+            return (np.zeros(acc_shape),np.zeros(acc_shape),
+                    [np.zeros(acc_shape) for key in oversampling_list],
+                    np.zeros(acc_shape),np.zeros(acc_shape),np.zeros(acc_shape))
+        l3_data = {}
+        l3_data['xmesh'] = xmesh
+        l3_data['ymesh'] = ymesh
+        l3_data['total_sample_weight'] = np.zeros(acc_shape)
+        l3_data['num_samples'] = np.zeros(acc_shape)
+        for ikey in range(len(oversampling_list)):
+            l3_data[oversampling_list[ikey]] = np.full(acc_shape,np.nan)
+        if 'cloud_fraction' in oversampling_list:
+            l3_data['pres_total_sample_weight'] = np.zeros(acc_shape)
+            l3_data['pres_num_samples'] = np.zeros(acc_shape)
+        return l3_data
+    nvar_oversampling = len(oversampling_list)
+    nl2 = len(l2g_data['latc'])
+    xgrid = xmesh[0,:]
+    ygrid = ymesh[:,0]
+    nrows = len(ygrid)
+    ncols = len(xgrid)
+    # Allocate memory for regrid fields
+    total_sample_weight = np.zeros(acc_shape)
+    num_samples = np.zeros(acc_shape)
+    sum_aboves = []
+    for n in range(nvar_oversampling):
+        sum_aboves.append(np.zeros(acc_shape))
+    # To only average cloud pressure using pixels where cloud fraction > 0.0
+    pres_total_sample_weight = np.zeros(acc_shape)
+    pres_num_samples = np.zeros(acc_shape)
+    pres_sum_aboves = np.zeros(acc_shape)
+    
+    geometry = F_block_kernel_geometry(l2g_data,xmesh,ymesh,pixel_shape,
+                                       k1,k2,k3,xmargin,ymargin,inflatex,inflatey)
+    if geometry is None:
+        return
+    if sg_tol is not None:
+        geometry,kept_fraction = F_block_sg_support(geometry,xgrid,ygrid,pixel_shape,k1,k2,k3,sg_tol)
+        logging.debug('block %d'%iblock+' evaluates %.1f%% of the kernel patch cells'%(kept_fraction*100))
+    lat_index = geometry['lat_index'] ; lon_index = geometry['lon_index']
+    patch_west = geometry['patch_west'] ; patch_lonc = geometry['patch_lonc']
+    latc = geometry['latc'] ; area_weight = geometry['area_weight']
+    tform = geometry['tform'] ; t = geometry['t']
+    sg_wx = geometry['sg_wx'] ; sg_wy = geometry['sg_wy']
+    # Compute uncertainty weights
+    uncertainty_weight = F_uncertainty_weight(l2g_data,error_model)
+    if uncertainty_weight is None:
+        return
+    # Cloud Fraction
+    if 'cloud_fraction' in oversampling_list:
+        cloud_fraction = l2g_data['cloud_fraction']
+    # Pull out grid variables from dictionary as it is slow to access
+    grid_flds,pcld_idx = F_block_grid_fields(l2g_data,oversampling_list,error_model)
+    if engine == 'vectorized':
+        pixel_weight = 1/np.asarray(area_weight,dtype=np.float64)/uncertainty_weight
+        if 'cloud_fraction' in oversampling_list and pcld_idx > 0:
+            pres_mask = cloud_fraction > 0.0
+        else:
+            pres_mask = np.zeros(nl2,dtype=bool)
+        # ravel() of freshly allocated arrays returns views, so accumulation is in place
+        flat_num_samples = num_samples.ravel()
+        flat_total_sample_weight = total_sample_weight.ravel()
+        flat_sum_aboves = [s.ravel() for s in sum_aboves]
+        flat_pres_num_samples = pres_num_samples.ravel()
+        flat_pres_total_sample_weight = pres_total_sample_weight.ravel()
+        flat_pres_sum_aboves = pres_sum_aboves.ravel()
+        if bin_by is None:
+            pixel_bin = None
+        for (il2,cell,SG) in F_block_sg_chunks(geometry,xgrid,ygrid,pixel_shape,
+                                               k1,k2,k3,sg_scaling,pixel_group=pixel_bin):
+            if bin_by is not None:
+                # bins are stacked along the leading axis of the raveled accumulators
+                cell = cell+pixel_bin[il2[0]]*nrows*ncols
+            tmp_wt = SG*pixel_weight[il2,np.newaxis]
+            F_accumulate_cells(flat_num_samples,cell,SG)
+            F_accumulate_cells(flat_total_sample_weight,cell,tmp_wt)
+            for ivar in range(nvar_oversampling):
+                F_accumulate_cells(flat_sum_aboves[ivar],cell,tmp_wt*grid_flds[il2,ivar,np.newaxis])
+            pmask = pres_mask[il2]
+            if np.any(pmask):
+                F_accumulate_cells(flat_pres_num_samples,cell[pmask],SG[pmask])
+                F_accumulate_cells(flat_pres_total_sample_weight,cell[pmask],tmp_wt[pmask])
+                F_accumulate_cells(flat_pres_sum_aboves,cell[pmask],
+                                   tmp_wt[pmask]*grid_flds[il2[pmask],pcld_idx,np.newaxis])
+    elif engine == 'loop':
+        # Init point counter for logger
+        count = 0
+        for il2 in range(nl2):
+            ijmsh = np.ix_(lat_index[il2],lon_index[il2])
+            patch_xmesh = xmesh[ijmsh] - patch_west[il2]
+            #patch_xmesh[patch_xmesh<0.0] += 360.0
+            patch_ymesh = ymesh[ijmsh] - latc[il2]
+            if pixel_shape == 'quadrilateral':
+                xym1 = np.column_stack((patch_xmesh.flatten()-patch_lonc[il2],patch_ymesh.flatten()))
+                xym2 = np.hstack((xym1,np.ones((patch_xmesh.size,1)))).dot(tform[il2].T)[:,0:2]
+            elif pixel_shape == 'elliptical':
+                rotation_matrix = np.array([[np.cos(-t[il2]), -np.sin(-t[il2])],[np.sin(-t[il2]),  np.cos(-t[il2])]])
+                xym1 = np.array([patch_xmesh.flatten()-patch_lonc[il2],patch_ymesh.flatten()])#np.column_stack((patch_xmesh.flatten()-patch_lonc[il2],patch_ymesh.flatten())).T
+                xym2 = rotation_matrix.dot(xym1).T
+                
+            SG = np.exp(-(np.power( np.power(np.abs(xym2[:,0]/sg_wx[il2]),k1)           \
+                                      +np.power(np.abs(xym2[:,1]/sg_wy[il2]),k2),k3)) )/sg_scaling
+            SG = SG.reshape(patch_xmesh.shape)
+            # Update Number of samples
+            num_samples[ijmsh] += SG
+            # Only bother doing this if regridding cloud pressure
+            if 'cloud_fraction' in oversampling_list:
+                if(pcld_idx > 0 and cloud_fraction[il2] > 0.0):
+                    pres_num_samples[ijmsh] += SG
+            # The weights
+            tmp_wt = SG/area_weight[il2]/uncertainty_weight[il2]
+            # Update total weights
+            total_sample_weight[ijmsh] += tmp_wt
+            # This only needs to be done if we are gridding pressure
+            if 'cloud_fraction' in oversampling_list:
+                if(pcld_idx > 0 and cloud_fraction[il2] > 0.0):
+                    pres_total_sample_weight[ijmsh] += tmp_wt
+            # Update the desired grid variables
+            for ivar in range(nvar_oversampling):
+                sum_aboves[ivar][ijmsh] += tmp_wt[:,:]*grid_flds[il2,ivar]
+            if 'cloud_fraction' in oversampling_list:
+                if(pcld_idx > 0 and cloud_fraction[il2] > 0.0):
+                    pres_sum_aboves[ijmsh] += tmp_wt[:,:]*grid_flds[il2,pcld_idx]
+            if il2 == count*np.round(nl2/10.):
+                logging.debug('block %d'%iblock+' %d%% finished\n' %(count*10))
+                count = count + 1
+    else:
+        logging.error('engine has to be loop or vectorized')
+        return
+        
+    logging.info('block %d'%iblock+' completed at '+datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S'))
+    if return_sums:
+        return (total_sample_weight,num_samples,sum_aboves,
+                pres_total_sample_weight,pres_num_samples,pres_sum_aboves)
+    if bin_by is not None:
+        l3_bins = [F_block_l3_from_sums(xmesh,ymesh,oversampling_list,
+                                        total_sample_weight[ibin],num_samples[ibin],
+                                        [sum_above[ibin] for sum_above in sum_aboves],
+                                        pres_total_sample_weight[ibin],pres_num_samples[ibin],
+                                        pres_sum_aboves[ibin]) for ibin in range(nbin)]
+        return {k:(v if k in ['xmesh','ymesh'] else np.stack([l3_bin[k] for l3_bin in l3_bins]))
+                for (k,v) in l3_bins[0].items()}
+    return F_block_l3_from_sums(xmesh,ymesh,oversampling_list,
+                                total_sample_weight,num_samples,sum_aboves,
+                                pres_total_sample_weight,pres_num_samples,pres_sum_aboves)
+
 # In this "robust" version of arange the grid doesn't suffer 
 # from the shift of the nodes due to error accumulation.
 # This effect is pronounced only if the step is sufficiently small.
@@ -1674,6 +2778,296 @@ def F_center2edge(lon,lat):
     latr = np.append(lat-res/2,lat[-1]+res/2)
     return lonr,latr
 
+def F_box_slice(grid,lower,upper):
+    '''
+    contiguous slice of a monotonic grid within [lower, upper], same rule as Level3_Data.trim
+    '''
+    inbox = np.nonzero((grid >= lower) & (grid <= upper))[0]
+    if len(inbox) == 0:
+        return slice(0,0)
+    return slice(inbox[0],inbox[-1]+1)
+
+class OLS_Result(object):
+    '''
+    the parts of a statsmodels ols result used by the Level3_Data fit_* methods: params and bse
+    (pandas Series indexed like smf.ols), resid, fittedvalues, mse_resid, rsquared, nobs, df_resid
+    created on 2026/10/17
+    '''
+    def __init__(self,params,bse,resid,fittedvalues,mse_resid,rsquared,nobs,df_resid):
+        self.params = params
+        self.bse = bse
+        self.resid = resid
+        self.fittedvalues = fittedvalues
+        self.mse_resid = mse_resid
+        self.rsquared = rsquared
+        self.nobs = nobs
+        self.df_resid = df_resid
+
+def F_ols_design(X):
+    '''
+    prepend the intercept column to X (n, k) and scale columns to unit norm, which keeps the
+    normal equations well conditioned for regressors like wind_topo ~ 1e-9
+    return:
+        scaled design (n, k+1) and the column scales
+    '''
+    X = np.column_stack([np.ones(X.shape[0]),X])
+    scale = np.sqrt(np.einsum('ni,ni->i',X,X))
+    scale[scale == 0] = 1.
+    return X/scale,scale
+
+def F_ols(y,X,names):
+    '''
+    closed-form ols of y on X plus an intercept, same outputs as smf.ols('y ~ '+' + '.join(names))
+    y:
+        (n,) array
+    X:
+        (n, k) array of regressors
+    names:
+        k regressor names
+    created on 2026/10/17
+    '''
+    import pandas as pd
+    Xs,scale = F_ols_design(np.asarray(X,dtype=np.float64).reshape(len(y),-1))
+    y = np.asarray(y,dtype=np.float64)
+    coef,_,rank,_ = np.linalg.lstsq(Xs,y,rcond=None)
+    fittedvalues = Xs@coef
+    resid = y-fittedvalues
+    nobs = len(y)
+    df_resid = nobs-rank
+    mse_resid = resid@resid/df_resid
+    centered = y-y.mean()
+    rsquared = 1-resid@resid/(centered@centered)
+    cov = np.linalg.pinv(np.einsum('ni,nj->ij',Xs,Xs))*mse_resid
+    index = ['Intercept']+list(names)
+    return OLS_Result(params=pd.Series(coef/scale,index=index),
+                      bse=pd.Series(np.sqrt(np.diag(cov))/scale,index=index),
+                      resid=resid,fittedvalues=fittedvalues,mse_resid=mse_resid,
+                      rsquared=rsquared,nobs=nobs,df_resid=df_resid)
+
+def F_ols_bootstrap(y,X,names,nbootstrap,valid=None,max_chunk_size=2**24):
+    '''
+    all bootstrap replicates of F_ols in one batched solve. resampling n rows with replacement
+    is a multinomial weight vector, so each replicate's normal equations are weighted sums of
+    per-row outer products, without materializing the resampled rows
+    y:
+        (n,) array, or (nbootstrap, n) if y differs by replicate
+    X:
+        (n, k) array of regressors
+    valid:
+        (n,) boolean, rows dropped after resampling (e.g., by dropna), default finite rows
+    max_chunk_size:
+        max replicates*rows held at once
+    return:
+        a list of nbootstrap pandas Series, like the params of bootstrap fits
+    created on 2026/10/17
+    '''
+    import pandas as pd
+    y = np.asarray(y,dtype=np.float64)
+    X = np.asarray(X,dtype=np.float64).reshape(y.shape[-1],-1)
+    nrow = X.shape[0]
+    if valid is None:
+        valid = np.isfinite(X).all(axis=1) & np.isfinite(y.reshape(-1,nrow)).all(axis=0)
+    Xs,scale = F_ols_design(X[valid])
+    nparam = Xs.shape[1]
+    Y = y[...,valid]
+    # per-row outer products, so that X'WX of all replicates is one matrix product
+    XX = np.einsum('ni,nj->nij',Xs,Xs).reshape(-1,nparam*nparam)
+    coefs = np.empty((nbootstrap,nparam))
+    chunk = int(max(1,max_chunk_size//max(nrow,1)))
+    for b0 in range(0,nbootstrap,chunk):
+        b1 = min(b0+chunk,nbootstrap)
+        # multinomial counts of nrow draws with replacement, via bincount (faster than np.random.multinomial)
+        draws = np.random.randint(0,nrow,size=(b1-b0,nrow))+nrow*np.arange(b1-b0)[:,np.newaxis]
+        W = np.bincount(draws.ravel(),minlength=(b1-b0)*nrow).reshape(b1-b0,nrow)[:,valid].astype(np.float64)
+        XtWX = (W@XX).reshape(-1,nparam,nparam)
+        if Y.ndim == 1:
+            XtWy = W@(Xs*Y[:,np.newaxis])
+        else:
+            XtWy = (W*Y[b0:b1])@Xs
+        try:
+            coefs[b0:b1] = np.linalg.solve(XtWX,XtWy[...,np.newaxis])[...,0]
+        except np.linalg.LinAlgError:
+            coefs[b0:b1] = [np.linalg.lstsq(a,b,rcond=None)[0] for a,b in zip(XtWX,XtWy)]
+    index = ['Intercept']+list(names)
+    return [pd.Series(coef/scale,index=index) for coef in coefs]
+
+def F_ols_fit(df,names,solver='statsmodels'):
+    '''
+    ols of df['y'] on df[names] plus an intercept
+    solver:
+        'statsmodels' for smf.ols, 'numpy' for F_ols
+    created on 2026/10/17
+    '''
+    if solver == 'numpy':
+        return F_ols(df['y'].values,df[list(names)].values,names)
+    import statsmodels.formula.api as smf
+    return smf.ols('y ~ '+(' + '.join(names) if len(names) > 0 else '1'),data=df).fit()
+
+class Remesher(object):
+    '''
+    index maps from a source l3 grid to a target grid, computed once and applied to all fields
+    of every l3 on the source grid (e.g., a whole Level3_List). same results as the former
+    RegularGridInterpolator-based Level3_Data.remesh and remesh_align
+    src_xgrid/src_ygrid/src_grid_size:
+        source l3 grid
+    xgrid/ygrid:
+        target grid
+    xmesh/ymesh:
+        optional target mesh, as in Level3_Data.remesh
+    align:
+        map each source row/column to the target one within grid_size_rtol, as in remesh_align.
+        falls back to nearest neighbor if the grids do not fully align
+    created on 2026/10/17
+    '''
+    weight_keys = ['total_sample_weight','pres_total_sample_weight','num_samples','pres_num_samples']
+    skip_keys = ['xgrid','ygrid','nrows','nrow','ncols','ncol','xmesh','ymesh','lonmesh','latmesh']
+    
+    def __init__(self,src_xgrid,src_ygrid,src_grid_size,xgrid,ygrid,xmesh=None,ymesh=None,
+                 align=False,grid_size_rtol=1e-2):
+        self.logger = logging.getLogger(__name__)
+        self.xgrid = xgrid
+        self.ygrid = ygrid
+        grid_sizex = np.median(np.diff(xgrid))
+        grid_sizey = np.median(np.diff(ygrid))
+        if not np.isclose(grid_sizex,grid_sizey,rtol=1e-3):
+            self.logger.warning('x grid size {} and y grid size {} are inconsistent!'.format(grid_sizex,grid_sizey))
+        new_grid_size = np.mean([grid_sizex,grid_sizey])
+        self.reduce_factor = 1
+        self.align = False
+        if align:
+            if not np.isclose(new_grid_size,src_grid_size,rtol=1e-3):
+                self.logger.warning('input grid size {} inconsistent with l3 grid size {}. using remesh instead'.format(new_grid_size,src_grid_size))
+            else:
+                col_index = self.F_aligned_index(src_xgrid,xgrid,src_grid_size*grid_size_rtol)
+                row_index = self.F_aligned_index(src_ygrid,ygrid,src_grid_size*grid_size_rtol)
+                if np.sum(col_index >= 0) != len(src_xgrid) or np.sum(row_index >= 0) != len(src_ygrid):
+                    self.logger.warning('original and target grids are not fully aligned. using remesh instead')
+                else:
+                    self.align = True
+                    self.row_index,self.col_index = row_index,col_index
+                    return
+        self.logger.info('input grid_size is {}'.format(src_grid_size))
+        self.logger.info('remeshing to grid_size of {}'.format(new_grid_size))
+        if new_grid_size >= 2*src_grid_size:
+            # same blocks as Level3_Data.block_reduce
+            self.reduce_factor = int(np.rint(new_grid_size/src_grid_size))
+            ncols_trim = len(src_xgrid)-len(src_xgrid)%self.reduce_factor
+            nrows_trim = len(src_ygrid)-len(src_ygrid)%self.reduce_factor
+            src_xgrid = np.nanmean(src_xgrid[:ncols_trim].reshape(-1,self.reduce_factor),axis=1)
+            src_ygrid = np.nanmean(src_ygrid[:nrows_trim].reshape(-1,self.reduce_factor),axis=1)
+            self.trim_shape = (nrows_trim,ncols_trim)
+        self.xmesh = xmesh
+        self.ymesh = ymesh
+        if xmesh is None:
+            self.row_index = self.F_nearest_index(src_ygrid,ygrid)
+            self.col_index = self.F_nearest_index(src_xgrid,xgrid)
+        else:
+            self.row_index = self.F_nearest_index(src_ygrid,ymesh)
+            self.col_index = self.F_nearest_index(src_xgrid,xmesh)
+    
+    @staticmethod
+    def F_nearest_index(src_grid,x):
+        '''
+        index of the nearest point in ascending src_grid, -1 outside [src_grid[0], src_grid[-1]].
+        ties go to the lower index, as in RegularGridInterpolator(method='nearest')
+        '''
+        x = np.asarray(x,dtype=np.float64)
+        if len(src_grid) == 1:
+            return np.where(x == src_grid[0],0,-1)
+        i = np.clip(np.searchsorted(src_grid,x)-1,0,len(src_grid)-2)
+        index = np.where(x-src_grid[i] <= 0.5*(src_grid[i+1]-src_grid[i]),i,i+1)
+        index[(x < src_grid[0]) | (x > src_grid[-1]) | np.isnan(x)] = -1
+        return index
+    
+    @staticmethod
+    def F_aligned_index(src_grid,x,tol):
+        '''
+        for each x, index of the point in src_grid within tol, -1 if none, as in remesh_align
+        '''
+        index = Remesher.F_nearest_index(src_grid,np.clip(x,src_grid[0],src_grid[-1]))
+        index[np.abs(src_grid[index]-x) > tol] = -1
+        return index
+    
+    def F_block_reduce(self,l3):
+        '''
+        coarsen the 2d fields of l3 by reduce_factor, same as Level3_Data.block_reduce
+        '''
+        r = self.reduce_factor
+        nrows_trim,ncols_trim = self.trim_shape
+        def block(v,func):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore',category=RuntimeWarning)
+                return func(v[:nrows_trim,:ncols_trim].reshape(nrows_trim//r,r,ncols_trim//r,r),axis=(1,3))
+        reduced = {}
+        shape = (len(l3['ygrid']),len(l3['xgrid']))
+        for (k,v) in l3.items():
+            if k in ['total_sample_weight','pres_total_sample_weight']:
+                reduced[k] = block(v,np.nansum)
+            elif k in ['num_samples','pres_num_samples']:
+                reduced[k] = block(v,np.nanmean)
+        with np.errstate(invalid='ignore',divide='ignore'):
+            for (k,v) in l3.items():
+                if k in self.skip_keys+self.weight_keys or np.shape(v) != shape:
+                    continue
+                if k == 'cloud_pressure':
+                    reduced[k] = block(v*l3['pres_total_sample_weight'],np.nansum)/reduced['pres_total_sample_weight']
+                else:
+                    total_sample_weight = np.where(np.isnan(v),np.nan,l3['total_sample_weight'])
+                    reduced[k] = block(v*l3['total_sample_weight'],np.nansum)/block(total_sample_weight,np.nansum)
+        return reduced
+    
+    def F_gather(self,v,fill_value):
+        '''
+        one fancy-indexing gather of a 2d source field onto the target grid
+        '''
+        if v.ndim != 2:
+            return None
+        if self.align:
+            out = np.full((len(self.ygrid),len(self.xgrid)),fill_value,dtype=v.dtype)
+            out[np.ix_(self.row_index >= 0,self.col_index >= 0)] = v
+            return out
+        row = np.maximum(self.row_index,0);col = np.maximum(self.col_index,0)
+        if self.xmesh is None:
+            out = v[np.ix_(row,col)].astype(np.float64)
+            out[(self.row_index < 0)[:,np.newaxis] | (self.col_index < 0)[np.newaxis,:]] = fill_value
+        else:
+            out = v[row,col].astype(np.float64)
+            out[(self.row_index < 0) | (self.col_index < 0)] = fill_value
+        return out
+    
+    def F_remesh(self,l3):
+        '''
+        a new Level3_Data of l3 on the target grid
+        '''
+        l3_new = Level3_Data(instrum=l3.instrum,product=l3.product,
+                             start_python_datetime=l3.start_python_datetime,
+                             end_python_datetime=l3.end_python_datetime,
+                             proj=l3.proj,oversampling_list=l3.oversampling_list)
+        if self.align:
+            l3_new.assimilate({'xgrid':self.xgrid,'ygrid':self.ygrid})
+            fields = l3
+        else:
+            if self.xmesh is None:
+                xmesh,ymesh = np.meshgrid(self.xgrid,self.ygrid)
+            else:
+                xmesh,ymesh = self.xmesh,self.ymesh
+            l3_new.assimilate({'xgrid':self.xgrid,'ygrid':self.ygrid,'xmesh':xmesh,'ymesh':ymesh})
+            fields = self.F_block_reduce(l3) if self.reduce_factor > 1 else l3
+        for key in fields.keys():
+            if key in self.skip_keys:
+                continue
+            elif key in self.weight_keys:
+                interpolated_fields = self.F_gather(fields[key],0.)
+                if interpolated_fields is not None and not self.align:
+                    interpolated_fields[np.isnan(interpolated_fields)] = 0.
+            else:
+                interpolated_fields = self.F_gather(fields[key],np.nan)
+            if interpolated_fields is None:
+                continue
+            l3_new.add(key,interpolated_fields)
+        l3_new.check()
+        return l3_new
+
 class Level3_Data(dict):
     '''
     rewrite l3_data into a class based on python dict. include functions
@@ -2022,98 +3416,20 @@ class Level3_Data(dict):
             self['wind_topo_xy'] = wind_topo_xy
             self['wind_topo_rs'] = wind_topo_rs
         
-    def remesh(self,xgrid,ygrid,xmesh=None,ymesh=None):
-        from scipy.interpolate import RegularGridInterpolator
-        grid_sizex = np.median(np.diff(xgrid))
-        grid_sizey = np.median(np.diff(ygrid))
-        if not np.isclose(grid_sizex,grid_sizey,rtol=1e-3):
-            self.logger.warning('x grid size {} and y grid size {} are inconsistent!'.format(grid_sizex,grid_sizey))
-        new_grid_size = np.mean([grid_sizex,grid_sizey])
-        
-        self.logger.info('input grid_size is {}'.format(self.grid_size))
-        self.logger.info('remeshing to grid_size of {}'.format(new_grid_size))
-        if new_grid_size >= 2*self.grid_size:
-            l3_data = self.block_reduce(new_grid_size)
-        else:
-            l3_data = self
-        if xmesh is None:
-            xmesh,ymesh = np.meshgrid(xgrid,ygrid)
-        l3_new = Level3_Data(instrum=l3_data.instrum,product=l3_data.product,
-                             start_python_datetime=l3_data.start_python_datetime,
-                             end_python_datetime=l3_data.end_python_datetime,
-                             proj=l3_data.proj,oversampling_list=l3_data.oversampling_list)
-        l3_new.assimilate({'xgrid':xgrid,'ygrid':ygrid,'xmesh':xmesh,'ymesh':ymesh})
-        for key in l3_data.keys():
-            if key in ['xgrid','ygrid','nrows','nrow','ncols','ncol','xmesh','ymesh','lonmesh','latmesh']:
-                continue
-            elif key in ['total_sample_weight','pres_total_sample_weight','num_samples','pres_num_samples']:
-                f = RegularGridInterpolator((l3_data['ygrid'],l3_data['xgrid']),
-                                            l3_data[key],bounds_error=False,fill_value=0.,method='nearest')
-                interpolated_fields = f((ymesh,xmesh))
-                interpolated_fields[np.isnan(interpolated_fields)] = 0.
-            else:
-                f = RegularGridInterpolator((l3_data['ygrid'],l3_data['xgrid']),
-                                            l3_data[key],bounds_error=False,fill_value=np.nan,method='nearest')
-                interpolated_fields = f((ymesh,xmesh))
-            l3_new.add(key,interpolated_fields)
-        l3_new.check()
-        return l3_new
+    def remesh(self,xgrid,ygrid,xmesh=None,ymesh=None,remesher=None):
+        '''nearest-neighbor remesh to x/ygrid, block-reducing first if the new grid is at least twice
+        coarser. remesher: a Remesher from this grid, reused across l3 on the same grid
+        '''
+        if remesher is None:
+            remesher = Remesher(self['xgrid'],self['ygrid'],self.grid_size,xgrid,ygrid,xmesh,ymesh)
+        return remesher.F_remesh(self)
     
-    def remesh_align(self,xgrid,ygrid,grid_size_rtol=1e-2):
+    def remesh_align(self,xgrid,ygrid,grid_size_rtol=1e-2,remesher=None):
         '''return a new Level3_Data instance on x/ygrid, to which the original grid can fully map with a tolerance relative to grid_size'''
-        # similar to np.isin but with tolerance
-        def isin_tolerance(A, B, tol):
-            A = np.asarray(A)
-            B = np.asarray(B)
-
-            Bs = np.sort(B) # skip if already sorted
-            idx = np.searchsorted(Bs, A)
-
-            linvalid_mask = idx==len(B)
-            idx[linvalid_mask] = len(B)-1
-            lval = Bs[idx] - A
-            lval[linvalid_mask] *=-1
-
-            rinvalid_mask = idx==0
-            idx1 = idx-1
-            idx1[rinvalid_mask] = 0
-            rval = A - Bs[idx1]
-            rval[rinvalid_mask] *=-1
-            return np.minimum(lval, rval) <= tol
-        
-        grid_sizex = np.median(np.diff(xgrid))
-        grid_sizey = np.median(np.diff(ygrid))
-        if not np.isclose(grid_sizex,grid_sizey,rtol=1e-3):
-            self.logger.warning('x grid size {} and y grid size {} are inconsistent!'.format(grid_sizex,grid_sizey))
-        new_grid_size = np.mean([grid_sizex,grid_sizey])
-        
-        if not np.isclose(new_grid_size,self.grid_size,rtol=1e-3):
-            self.logger.warning('input grid size {} inconsistent with l3 grid size {}. using remesh instead'.format(new_grid_size,self.grid_size))
-            return self.remesh(xgrid,ygrid)
-        
-        xgrid_mask = isin_tolerance(xgrid,self['xgrid'],tol=self.grid_size*grid_size_rtol)
-        ygrid_mask = isin_tolerance(ygrid,self['ygrid'],tol=self.grid_size*grid_size_rtol)
-        if np.sum(xgrid_mask) != len(self['xgrid']) or np.sum(ygrid_mask) != len(self['ygrid']):
-            self.logger.warning('original and target grids are not fully aligned. using remesh instead')
-            return self.remesh(xgrid,ygrid)
-        
-        l3_new = Level3_Data(instrum=self.instrum,product=self.product,
-                             start_python_datetime=self.start_python_datetime,
-                             end_python_datetime=self.end_python_datetime,
-                             proj=self.proj,oversampling_list=self.oversampling_list)
-        l3_new.assimilate({'xgrid':xgrid,'ygrid':ygrid})
-        for key in self.keys():
-            if key in ['xgrid','ygrid','nrows','nrow','ncols','ncol','xmesh','ymesh','lonmesh','latmesh']:
-                continue
-            elif key in ['total_sample_weight','pres_total_sample_weight','num_samples','pres_num_samples']:
-                interpolated_fields = np.zeros((len(ygrid),len(xgrid)),dtype=self[key].dtype)
-                interpolated_fields[np.ix_(ygrid_mask,xgrid_mask)] = self[key]
-            else:
-                interpolated_fields = np.full((len(ygrid),len(xgrid)),np.nan,dtype=self[key].dtype)
-                interpolated_fields[np.ix_(ygrid_mask,xgrid_mask)] = self[key]
-            l3_new.add(key,interpolated_fields)
-        l3_new.check()
-        return l3_new
+        if remesher is None:
+            remesher = Remesher(self['xgrid'],self['ygrid'],self.grid_size,xgrid,ygrid,
+                                align=True,grid_size_rtol=grid_size_rtol)
+        return remesher.F_remesh(self)
         
     def trim(self,west,east,south,north,inherit_attributes=['topo_fit','topo_fit_xy','topo_fit_rs','chem_fit','alb_fit','bc_fit','bc_fields']):
         l3_new = Level3_Data(instrum=self.instrum,product=self.product,
@@ -2154,10 +3470,15 @@ class Level3_Data(dict):
         
     def fit_topography(self,mask=None,min_windtopo=None,max_windtopo=None,
                        max_iter=None,outlier_std=None,fit_chem=None,remove_intercept=False,
-                       if_bootstrap=False,if_xyrs=False):
+                       if_bootstrap=False,if_xyrs=False,solver='statsmodels',nbootstrap=None):
         '''infer scale height for the wind-topography term
+        solver:
+            'statsmodels' (smf.ols) or 'numpy' (F_ols, same params and bse)
+        nbootstrap:
+            with solver='numpy', bootstrap the fit and save the params to topo_fit.bootstrap_params.
+            with max_iter = 1, all replicates are one batched solve. otherwise each replicate runs
+            its own outlier loop, as if_bootstrap fits do
         '''
-        import statsmodels.formula.api as smf
         import pandas as pd
         if self.instrum == 'TROPOMI' and self.product == 'NO2':
             min_windtopo = min_windtopo or 0.001
@@ -2191,6 +3512,14 @@ class Level3_Data(dict):
         else:
             vcd = self['vcd']
         
+        if nbootstrap is not None and solver == 'numpy' and max_iter > 1:
+            # outlier masks differ by replicate, so replicates cannot share one batched solve
+            bootstrap_params = []
+            for i in range(nbootstrap):
+                self.fit_topography(mask=mask,min_windtopo=min_windtopo,max_windtopo=max_windtopo,
+                                    max_iter=max_iter,outlier_std=outlier_std,fit_chem=fit_chem,
+                                    remove_intercept=remove_intercept,if_bootstrap=True,solver=solver)
+                bootstrap_params.append(self.topo_fit.params)
         wt = np.abs(self['wind_topo']/vcd)
         topo_mask = (wt >= min_windtopo) & (wt <= max_windtopo)
         if mask is not None:
@@ -2220,16 +3549,11 @@ class Level3_Data(dict):
                                   'chem':vcd[topo_mask]}).dropna()
                     df_rs = pd.DataFrame({'y':self['wind_column_rs'][topo_mask],'wt':self['wind_topo'][topo_mask],
                                   'chem':vcd[topo_mask]}).dropna()
-            if fit_chem:
-                topo_fit = smf.ols('y ~ wt + chem', data=df).fit()
-                if if_xyrs:
-                    topo_fit_xy = smf.ols('y ~ wt + chem', data=df_xy).fit()
-                    topo_fit_rs = smf.ols('y ~ wt + chem', data=df_rs).fit()
-            else:
-                topo_fit = smf.ols('y ~ wt', data=df).fit()
-                if if_xyrs:
-                    topo_fit_xy = smf.ols('y ~ wt', data=df_xy).fit()
-                    topo_fit_rs = smf.ols('y ~ wt', data=df_rs).fit()
+            topo_names = ['wt','chem'] if fit_chem else ['wt']
+            topo_fit = F_ols_fit(df,topo_names,solver)
+            if if_xyrs:
+                topo_fit_xy = F_ols_fit(df_xy,topo_names,solver)
+                topo_fit_rs = F_ols_fit(df_rs,topo_names,solver)
             self.logger.info('iter {}, r2 {:.3f}'.format(count,topo_fit.rsquared))
             self.logger.info('iter {}, rmse {:.3e}'.format(count,np.sqrt(topo_fit.mse_resid)))
             if fit_chem:
@@ -2247,6 +3571,15 @@ class Level3_Data(dict):
                     wc_topo_xy -= topo_fit_xy.params['Intercept']
                     wc_topo_rs -= topo_fit_rs.params['Intercept']
             count += 1
+        if nbootstrap is not None and solver == 'numpy':
+            if max_iter > 1:
+                topo_fit.bootstrap_params = bootstrap_params
+            else:
+                topo_fit.bootstrap_params = F_ols_bootstrap(
+                    self['wind_column'][topo_mask],
+                    np.column_stack([self['wind_topo'][topo_mask],vcd[topo_mask]][:len(topo_names)]),
+                    topo_names,nbootstrap)
+            topo_fit.nbootstrap = nbootstrap
         self.topo_fit = topo_fit
         self['topo_residual'] = topo_residual
         self['wind_column_topo'] = wc_topo
@@ -2257,10 +3590,11 @@ class Level3_Data(dict):
             self['wind_column_topo_rs'] = wc_topo_rs
     
     def fit_chemistry(self,mask=None,min_windtopo=None,max_windtopo=None,
-                      max_wind_column=None,max_iter=None,outlier_std=None):
+                      max_wind_column=None,max_iter=None,outlier_std=None,solver='statsmodels'):
         '''infer lifetime for the chemical loss term
+        solver:
+            'statsmodels' (smf.ols) or 'numpy' (F_ols, same params and bse)
         '''
-        import statsmodels.formula.api as smf
         import pandas as pd
         if self.instrum == 'TROPOMI' and self.product == 'NO2':
             min_windtopo = min_windtopo or 0.
@@ -2290,7 +3624,7 @@ class Level3_Data(dict):
                 np.sum(chem_mask)/(len(self['xgrid'])*len(self['ygrid']))))
             df = pd.DataFrame({'y':wc[chem_mask],'wt':self['wind_topo'][chem_mask],
                                   'chem':self['column_amount'][chem_mask]}).dropna()
-            chem_fit = smf.ols('y ~ chem', data=df).fit()
+            chem_fit = F_ols_fit(df,['chem'],solver)
             self.logger.info('iter {}, r2 {:.3f}'.format(count,chem_fit.rsquared))
             self.logger.info('iter {}, rmse {:.3e}'.format(count,np.sqrt(chem_fit.mse_resid)))
             self.logger.info('iter {}, lifetime {:.3f}h'.format(count,-1/(chem_fit.params['chem'])/3600))
@@ -2304,7 +3638,8 @@ class Level3_Data(dict):
     
     def fit_bc(self,keys=['albedo'],orders=[[0,1]],min_windtopo=None,max_windtopo=None,
                mask=None,fit_topo=True,remove_intercept=False,
-               if_bootstrap=False,if_xyrs=False):
+               if_bootstrap=False,if_xyrs=False,solver='statsmodels',nbootstrap=None,
+               topo_bootstrap_params=None):
         '''infer level2 parameter (e.g., albedo, aerosol_size)-related bias, incorporating lessons learned in fit_albedo
         and fit_topography
         keys:
@@ -2312,8 +3647,15 @@ class Level3_Data(dict):
             'albedo_aerosol_size']
         orders:
             polynominal terms corresponding to keys, e.g., [[0,1,2],[1,2],[1]]
+        solver:
+            'statsmodels' (smf.ols) or 'numpy' (F_ols, same params and bse)
+        nbootstrap:
+            with solver='numpy', bootstrap the fit in one batched solve and save the params to
+            bc_fit.bootstrap_params
+        topo_bootstrap_params:
+            topo_fit.bootstrap_params to propagate, replicate i fits wind_column_topo of topo
+            replicate i
         '''
-        import statsmodels.formula.api as smf
         import pandas as pd
         
         bc_fields = []
@@ -2355,12 +3697,6 @@ class Level3_Data(dict):
             df_dict = {'y':wc[bc_mask][new_idx],'wt':self['wind_topo'][bc_mask][new_idx]}
             df_dict.update({k:self[k][bc_mask][new_idx] for k in bc_fields})
             df = pd.DataFrame(df_dict).dropna()
-            if fit_topo:
-                reg_formula = 'y ~ wt'
-            else:
-                reg_formula = 'y ~'
-            for k in bc_fields:
-                reg_formula += ' + '+k
             if if_xyrs:
                 df_xy = df.copy()
                 df_xy['y'] = wc_xy[bc_mask][new_idx]
@@ -2370,22 +3706,30 @@ class Level3_Data(dict):
             df_dict = {'y':wc[bc_mask],'wt':self['wind_topo'][bc_mask]}
             df_dict.update({k:self[k][bc_mask] for k in bc_fields})
             df = pd.DataFrame(df_dict).dropna()
-            if fit_topo:
-                reg_formula = 'y ~ wt'
-            else:
-                reg_formula = 'y ~'
-            for k in bc_fields:
-                reg_formula += ' + '+k
             if if_xyrs:
                 df_xy = df.copy()
                 df_xy['y'] = wc_xy[bc_mask]
                 df_rs = df.copy()
                 df_rs['y'] = wc_rs[bc_mask]
         
-        bc_fit = smf.ols(reg_formula, data=df).fit()
+        bc_names = (['wt'] if fit_topo else [])+list(bc_fields)
+        bc_fit = F_ols_fit(df,bc_names,solver)
         if if_xyrs:
-            bc_fit_xy = smf.ols(reg_formula, data=df_xy).fit()
-            bc_fit_rs = smf.ols(reg_formula, data=df_rs).fit()
+            bc_fit_xy = F_ols_fit(df_xy,bc_names,solver)
+            bc_fit_rs = F_ols_fit(df_rs,bc_names,solver)
+        if nbootstrap is not None and solver == 'numpy':
+            if topo_bootstrap_params is None:
+                bootstrap_y = wc[bc_mask]
+            else:
+                bootstrap_y = np.array([(self['wind_column']-bparam['wt']*self['wind_topo']
+                                         -bparam['Intercept'])[bc_mask]
+                                        for bparam in topo_bootstrap_params[:nbootstrap]])
+            bc_X = [self['wind_topo'][bc_mask]] if fit_topo else []
+            bc_X += [self[k][bc_mask] for k in bc_fields]
+            valid = np.isfinite(wc[bc_mask]) & np.isfinite(self['wind_topo'][bc_mask])
+            bc_fit.bootstrap_params = F_ols_bootstrap(bootstrap_y,np.column_stack(bc_X),bc_names,nbootstrap,
+                                                      valid=valid)
+            bc_fit.nbootstrap = nbootstrap
         
         wc_bc = wc.copy()
         for bc_field in bc_fields:
@@ -2414,10 +3758,12 @@ class Level3_Data(dict):
         
     def fit_albedo(self,albedo_fields=None,albedo_orders=None,
                    mask=None,min_windtopo=None,max_windtopo=None,
-                   max_iter=None,outlier_std=None,fit_topo=True,remove_intercept=False):
+                   max_iter=None,outlier_std=None,fit_topo=True,remove_intercept=False,
+                   solver='statsmodels'):
         '''infer albedo-related bias
+        solver:
+            'statsmodels' (smf.ols) or 'numpy' (F_ols, same params and bse)
         '''
-        import statsmodels.formula.api as smf
         import pandas as pd
         min_windtopo = min_windtopo or 0.
         max_windtopo = max_windtopo or 0.001
@@ -2457,14 +3803,7 @@ class Level3_Data(dict):
             df_dict.update({km:self[k][alb_mask] for k,km in zip(albedo_fields,albedo_fields_minus2m)})
             df = pd.DataFrame(df_dict).dropna()
             
-            if fit_topo:
-                reg_formula = 'y ~ wt'
-            else:
-                reg_formula = 'y ~'
-            for f in albedo_fields_minus2m:
-                reg_formula += ' + '+f
-            
-            alb_fit = smf.ols(reg_formula, data=df).fit()
+            alb_fit = F_ols_fit(df,(['wt'] if fit_topo else [])+list(albedo_fields_minus2m),solver)
             self.logger.info('iter {}, r2 {:.3f}'.format(count,alb_fit.rsquared))
             self.logger.info('iter {}, rmse {:.3e}'.format(count,np.sqrt(alb_fit.mse_resid)))
             if fit_topo:
@@ -2520,22 +3859,44 @@ class Level3_Data(dict):
                 tif_dict['xres'] = xres
                 tif_dict['yres'] = yres
         
-        gwest = tif_dict['xgrid'].min()-np.abs(tif_dict['xres'])
-        geast = tif_dict['xgrid'].max()+np.abs(tif_dict['xres'])
-        gsouth = tif_dict['ygrid'].min()-np.abs(tif_dict['yres'])
-        gnorth = tif_dict['ygrid'].max()+np.abs(tif_dict['yres'])
-        l3 = self.trim(west=gwest,east=geast,south=gsouth,north=gnorth)
-        xmask = (self['xgrid'] >= gwest) & (self['xgrid'] <= geast)
-        ymask = (self['ygrid'] >= gsouth) & (self['ygrid'] <= gnorth)
-        self.tif_mask = np.zeros(self['num_samples'].shape)
-        mask = np.zeros(l3['num_samples'].shape)
-        for ix,x in enumerate(l3['xgrid']):
-            for iy,y in enumerate(l3['ygrid']):
-                l3xmask = (tif_dict['xgrid']>=x-l3.grid_size/2) & (tif_dict['xgrid']<=x+l3.grid_size/2)
-                l3ymask = (tif_dict['ygrid']>=y-l3.grid_size/2) & (tif_dict['ygrid']<=y+l3.grid_size/2)
-                mask[iy,ix] = np.nansum(tif_dict['data'][np.ix_(l3ymask,l3xmask)])
-        self.tif_mask[np.ix_(ymask,xmask)] = mask
-        return l3.average_by_nonBinaryMask(mask,fields_to_average)
+        weights = F_finer_mask_weights(self['xgrid'],self['ygrid'],tif_dict,grid_size=self.grid_size)
+        self.tif_mask = weights.toarray().reshape(self['num_samples'].shape)
+        return self.average_by_nonBinaryMask(self.tif_mask,fields_to_average)
+    
+    def average_by_sparseMask(self,weights,fields_to_average=None):
+        '''average_by_nonBinaryMask for many regions in one pass. weights is a scipy.sparse
+        (nregion, ncell) matrix, e.g., from F_finer_mask_weights, and each field in the result
+        becomes an (nregion,) array
+        '''
+        weights = weights.tocsr()
+        with np.errstate(invalid='ignore',divide='ignore'):
+            scale = 1/weights.max(axis=1).toarray()
+        weights = weights.multiply(scale).tocsr()# otherwise num_samples do not make sense
+        positive = weights.multiply(weights > 0).tocsr()
+        indicator = (weights > 0).astype(np.float64)
+        result = {}
+        for key in set(['total_sample_weight','pres_total_sample_weight']).intersection(self.keys()):
+            result[key] = weights@np.nan_to_num(self[key].ravel())
+        
+        with np.errstate(invalid='ignore',divide='ignore'):
+            for key in set(['num_samples','pres_num_samples']).intersection(self.keys()):
+                v = self[key].ravel()
+                result['sum_'+key] = positive@np.nan_to_num(v)
+                result[key] = result['sum_'+key]/(indicator@np.isfinite(v))
+            
+            if fields_to_average is None:
+                all_keys = self.keys()
+            else:
+                all_keys = set(fields_to_average).intersection(self.keys())
+            for key in all_keys:
+                if key in ['xgrid','ygrid','nrows','nrow','ncols','ncol','xmesh','ymesh','lonmesh','latmesh',
+                          'total_sample_weight','pres_total_sample_weight','num_samples','pres_num_samples',
+                          'sum_num_samples','sum_pres_num_samples'] \
+                or np.shape(self[key]) != self['num_samples'].shape:
+                    continue
+                result[key] = weights@np.nan_to_num((self[key]*self['total_sample_weight']).ravel())\
+                /result['total_sample_weight']
+        return result
     
     def average_by_nonBinaryMask(self,mask,fields_to_average=None):
         '''similar to average_by_mask but add the values in the mask matrix as part of the weight
@@ -2610,7 +3971,9 @@ class Level3_Data(dict):
             lonmesh,latmesh = np.meshgrid(self['xgrid'],self['ygrid'])
         grid_size = self.grid_size
         grid_m2 = np.square(grid_size*111e3)*np.cos(latmesh/180*np.pi)
-        if xys is not None:
+        if xys is not None and 'lonmesh' not in self.keys():
+            mask = mask | F_polygon_mask(self['xgrid'],self['ygrid'],xys)
+        elif xys is not None:
             from matplotlib import path
             for xy in xys:
                 boundary_polygon = path.Path([(x,y) for x,y in zip(*xy)])
@@ -2630,6 +3993,15 @@ class Level3_Data(dict):
             /np.nansum(grid_m2[mask])
         return result
     
+    def __radd__(self,other):
+        '''
+        0+self is the Level3_Accumulator of self, so sum() works over a list starting with a
+        Level3_Data. the result of sum() is a Level3_Accumulator, see its to_level3
+        '''
+        if isinstance(other,(int,float)) and other == 0:
+            return Level3_Accumulator(self)
+        return NotImplemented
+    
     def merge(self,l3_data1):
         if len(self.keys()) == 0:
             self.logger.info('orignial level 3 is empty. adopting attributes of the added level 3.')
@@ -2721,10 +4093,7 @@ class Level3_Data(dict):
         self.assimilate(d)
         if boundary_polygon is not None:
             self.logger.info('boundary polygon provided, masking out-of-boundary grid cells...')
-            [xmesh,ymesh] = np.meshgrid(self['xgrid'],self['ygrid'])
-            xlin = xmesh.reshape(-1)
-            ylin = ymesh.reshape(-1)
-            mask=~boundary_polygon.contains_points(np.hstack((xlin[:,np.newaxis],ylin[:,np.newaxis]))).reshape(xmesh.shape)
+            mask = ~F_polygon_mask(self['xgrid'],self['ygrid'],boundary_polygon)
             for (k,v) in self.items():
                 if len(v.shape) == 2:
                     self[k][mask] = np.nan
@@ -2732,10 +4101,27 @@ class Level3_Data(dict):
         return self
     
     def read_nc(self,l3_filename,
-                fields_name=None):
+                fields_name=None,west=None,east=None,south=None,north=None,read_sums=False):
+        '''
+        l3_filename:
+            nc file saved by save_nc or cf-compatible
+        fields_name:
+            fields to read. xgrid, ygrid, num_samples, total_sample_weight are always read.
+            if None and read_sums is True, all fields with a saved sum_<field> are read
+        west,east,south,north:
+            if provided, only the hyperslab within the box (same rule as trim) is read
+        read_sums:
+            if True, sum_<field> variables saved by save_nc(save_sums=True) are read to the
+            dict self.sums, keyed by field, including the float64 sample weights
+        updated on 2026/10/17 to add read_sums
+        '''
         from netCDF4 import Dataset
-
-        fields_name = fields_name or []
+        nc = Dataset(l3_filename,'r')
+        fields_name = list(fields_name or [])
+        if len(fields_name) == 0 and read_sums:
+            # every saved accumulator, so that files roll up without dropping fields
+            fields_name = [varname[4:] for varname in nc.variables.keys()
+                           if varname.startswith('sum_') and varname[4:] not in Level3_Accumulator.weight_keys]
         if len(fields_name) == 0:
             if len(self.oversampling_list) == 0 and self.product == 'CH4':
                 guess = 'XCH4'
@@ -2751,7 +4137,6 @@ class Level3_Data(dict):
             fields_name.append('num_samples')
         if 'total_sample_weight' not in fields_name:
             fields_name.append('total_sample_weight')
-        nc = Dataset(l3_filename,'r')
         self.grid_size = float(nc.getncattr('grid_size'))
         self.instrum = nc.getncattr('instrument')
         self.product = nc.getncattr('product')
@@ -2766,6 +4151,10 @@ class Level3_Data(dict):
             self.proj = None
         self.logger.info('Loading level 3 data for instrument {}, product {}, and grid size {:02f}'\
                          .format(self.instrum,self.product,self.grid_size))
+        # read grids first to locate the hyperslab
+        fields_name.insert(0,fields_name.pop(fields_name.index('ygrid')))
+        fields_name.insert(0,fields_name.pop(fields_name.index('xgrid')))
+        window = {}
         for (i,varname) in enumerate(fields_name):
             # the variable names are inconsistent with Level3_Data in CF-compatible nc files
             nc_varname = varname
@@ -2789,11 +4178,33 @@ class Level3_Data(dict):
                 if varname == 'latmesh':
                     if 'latitude' in nc.variables.keys():
                         nc_varname = 'latitude'
+            idx = tuple(window.get(dim,slice(None)) for dim in nc[nc_varname].dimensions)
             try:
-                self[varname] = nc[nc_varname][:].filled(np.nan)
+                self[varname] = nc[nc_varname][idx].filled(np.nan)
             except:
                 self.logger.debug('{} cannot be filled by nan or is not a masked array'.format(nc_varname))
-                self[varname] = np.array(nc[nc_varname][:])
+                self[varname] = np.array(nc[nc_varname][idx])
+            if varname in ['xgrid','ygrid']:
+                if varname == 'xgrid':
+                    lower,upper = west,east
+                else:
+                    lower,upper = south,north
+                lower = -np.inf if lower is None else lower
+                upper = np.inf if upper is None else upper
+                # grids are monotonic, so the box is a contiguous slice
+                window[nc[nc_varname].dimensions[0]] = F_box_slice(self[varname],lower,upper)
+                self[varname] = self[varname][window[nc[nc_varname].dimensions[0]]]
+        if read_sums:
+            self.sums = {}
+            sum_fields = [f for f in fields_name if f not in Level3_Accumulator.non_field_keys]
+            for varname in sum_fields+Level3_Accumulator.weight_keys:
+                if 'sum_'+varname not in nc.variables.keys():
+                    continue
+                idx = tuple(window.get(dim,slice(None)) for dim in nc['sum_'+varname].dimensions)
+                self.sums[varname] = np.ma.filled(nc['sum_'+varname][idx],0.)
+            missing = [f for f in sum_fields if f not in self.sums.keys()]
+            if len(missing) > 0:
+                self.logger.warning('no saved sums for {} in {}'.format(missing,l3_filename))
         self.check()
         nc.close()
         return self
@@ -3038,7 +4449,31 @@ class Level3_Data(dict):
                 fields_comment=None,
                 fields_unit=None,
                 ncattr_dict=None,
-                proj_unit='km'):
+                proj_unit='km',
+                zlib=True,complevel=4,chunksizes=(256,256),
+                least_significant_digit=None,fields_policy=None,save_sums=False):
+        '''
+        l3_filename:
+            output nc file
+        fields_name/rename/comment/unit:
+            lists of fields to save and their names, comments, and units in the nc
+        zlib,complevel:
+            deflate compression of variables
+        chunksizes:
+            (cy,cx) chunk shape of 2d fields, clipped to the grid dimensions
+        least_significant_digit:
+            if not None, quantize 2d fields to this decimal digit (lossy)
+        fields_policy:
+            dict of per-field overrides, e.g., {'num_samples':{'least_significant_digit':2},
+            'column_amount':{'complevel':9}}, keys are zlib, complevel, chunksizes, 
+            least_significant_digit
+        save_sums:
+            if True, also save the weighted sum (numerator) of each field as sum_<field>, and
+            save sums and sample weights in float64 without quantization, so that files can be
+            merged exactly by Level3_Accumulator. sums are taken from self.sums (see read_nc)
+            if available, otherwise from field*total_sample_weight
+        updated on 2026/10/17 to add save_sums
+        '''
         self.check()
         from netCDF4 import Dataset
         fields_name = fields_name or []
@@ -3118,13 +4553,23 @@ class Level3_Data(dict):
                 fields_rename.append('latmesh')
                 fields_comment.append('latitude mesh')
                 fields_unit.append('degree_north')
+        fields_policy = fields_policy or {}
         for (i,fn) in enumerate(fields_name):
             if fn in ['xgrid']:
-                vid = nc.createVariable(fields_rename[i],np.float32,dimensions=('xgrid'))
+                dimensions = ('xgrid',)
+                policy = dict(zlib=zlib,complevel=complevel,chunksizes=(min(chunksizes[1],self.ncols),))
             elif fn in ['ygrid']:
-                vid = nc.createVariable(fields_rename[i],np.float32,dimensions=('ygrid'))
+                dimensions = ('ygrid',)
+                policy = dict(zlib=zlib,complevel=complevel,chunksizes=(min(chunksizes[0],self.nrows),))
             else:
-                vid = nc.createVariable(fields_rename[i],np.float32,dimensions=('ygrid','xgrid'))
+                dimensions = ('ygrid','xgrid')
+                policy = dict(zlib=zlib,complevel=complevel,
+                              chunksizes=(min(chunksizes[0],self.nrows),min(chunksizes[1],self.ncols)),
+                              least_significant_digit=least_significant_digit)
+            policy.update(fields_policy.get(fn,{}))
+            if min(policy['chunksizes']) < 1:
+                policy.pop('chunksizes')
+            vid = nc.createVariable(fields_rename[i],np.float32,dimensions=dimensions,**policy)
             # use standard_name to inform lat/lon vs x/y
             if self.proj is not None:
                 if fn == 'xgrid':
@@ -3143,6 +4588,32 @@ class Level3_Data(dict):
             vid.comment = fields_comment[i]
             vid.units = fields_unit[i]
             vid[:] = np.ma.masked_invalid(np.float32(self[fn]))
+        if save_sums:
+            sum_policy = dict(zlib=zlib,complevel=complevel,
+                              chunksizes=(min(chunksizes[0],self.nrows),min(chunksizes[1],self.ncols)))
+            if min(sum_policy['chunksizes']) < 1:
+                sum_policy.pop('chunksizes')
+            sums = getattr(self,'sums',{})
+            for (i,fn) in enumerate(fields_name):
+                if fn in Level3_Accumulator.non_field_keys:
+                    continue
+                if fn in sums.keys():
+                    value = sums[fn]
+                elif fn == 'cloud_pressure' and 'pres_total_sample_weight' in self:
+                    value = np.nan_to_num(self[fn]*self['pres_total_sample_weight'])
+                else:
+                    value = np.nan_to_num(self[fn]*self['total_sample_weight'])
+                vid = nc.createVariable('sum_'+fields_rename[i],np.float64,dimensions=('ygrid','xgrid'),**sum_policy)
+                vid.comment = 'weighted sum of {} for exact merging'.format(fields_rename[i])
+                vid.units = 'vary'
+                vid[:] = value
+            for fn in Level3_Accumulator.weight_keys:
+                if fn not in self.keys():
+                    continue
+                vid = nc.createVariable('sum_'+fn,np.float64,dimensions=('ygrid','xgrid'),**sum_policy)
+                vid.comment = '{} in float64 for exact merging'.format(fn)
+                vid.units = 'vary'
+                vid[:] = np.nan_to_num(self[fn])
         nc.close()
     
     def block_reduce(self,new_grid_size):
@@ -3375,6 +4846,144 @@ class Level3_Data(dict):
         fig_output['pc'] = pc
         return fig_output
 
+class Level3_Accumulator(dict):
+    '''
+    raw accumulators of a level 3 grid in float64: total_sample_weight, num_samples,
+    pres_total_sample_weight, pres_num_samples, and the weighted sum (numerator) of each
+    oversampled field keyed by the field name. += adds them cell by cell, so daily files can
+    be rolled into monthly, seasonal or multi-year products exactly, and to_level3 divides once
+    created on 2026/10/17
+    '''
+    weight_keys = ['total_sample_weight','num_samples','pres_total_sample_weight','pres_num_samples']
+    non_field_keys = weight_keys+['xgrid','ygrid','nrows','nrow','ncols','ncol',
+                                  'xmesh','ymesh','lonmesh','latmesh']
+    
+    def __init__(self,l3_data=None):
+        '''
+        l3_data:
+            optional Level3_Data to start from, see from_level3
+        '''
+        self.logger = logging.getLogger(__name__)
+        self.xgrid = None
+        self.ygrid = None
+        self.grid_size = None
+        self.start_python_datetime = None
+        self.end_python_datetime = None
+        self.instrum = 'unknown'
+        self.product = 'unknown'
+        self.proj = None
+        if l3_data is not None:
+            self.from_level3(l3_data)
+    
+    def from_level3(self,l3_data):
+        '''
+        take the accumulators from a Level3_Data, using l3_data.sums (read_nc(read_sums=True))
+        when available, otherwise rebuilding numerators from fields and sample weights
+        '''
+        l3_data.check()
+        for attr in ['grid_size','start_python_datetime','end_python_datetime','instrum','product','proj']:
+            setattr(self,attr,getattr(l3_data,attr))
+        self.xgrid = l3_data['xgrid']
+        self.ygrid = l3_data['ygrid']
+        sums = getattr(l3_data,'sums',{})
+        self.clear()
+        for key in self.weight_keys:
+            if key in sums.keys():
+                self[key] = np.asarray(sums[key],dtype=np.float64)
+            elif key in l3_data.keys():
+                self[key] = np.nan_to_num(np.asarray(l3_data[key],dtype=np.float64))
+        for (key,value) in l3_data.items():
+            if key in self.non_field_keys:
+                continue
+            if key in sums.keys():
+                self[key] = np.asarray(sums[key],dtype=np.float64)
+            elif key == 'cloud_pressure' and 'pres_total_sample_weight' in self:
+                self[key] = np.nan_to_num(value*self['pres_total_sample_weight'])
+            else:
+                self[key] = np.nan_to_num(value*self['total_sample_weight'])
+        return self
+    
+    def __iadd__(self,other):
+        if isinstance(other,Level3_Data):
+            other = Level3_Accumulator(other)
+        if len(other.keys()) == 0:
+            return self
+        if len(self.keys()) == 0:
+            self.__dict__.update({k:v for (k,v) in other.__dict__.items() if k != 'logger'})
+            for (key,value) in other.items():
+                self[key] = value.copy()
+            return self
+        if len(self.xgrid) != len(other.xgrid) or len(self.ygrid) != len(other.ygrid) \
+        or not np.allclose(self.xgrid,other.xgrid) or not np.allclose(self.ygrid,other.ygrid):
+            self.logger.error('the two accumulators are on different grids!')
+            return self
+        for key in list(self.keys()):
+            if key not in other.keys():
+                self.logger.warning(key+' is not in the added accumulator and dropped')
+                self.pop(key)
+                continue
+            self[key] += other[key]
+        self.start_python_datetime = min(self.start_python_datetime,other.start_python_datetime)
+        self.end_python_datetime = max(self.end_python_datetime,other.end_python_datetime)
+        return self
+    
+    def __add__(self,other):
+        out = Level3_Accumulator()
+        out += self
+        out += other
+        return out
+    
+    def __radd__(self,other):
+        # allows sum() over a list of Level3_Accumulator/Level3_Data, e.g., daily bins to a month.
+        # a list starting with a Level3_Data goes through Level3_Data.__radd__
+        if isinstance(other,(int,float)) and other == 0:
+            return self.__add__(Level3_Accumulator())
+        return Level3_Accumulator(other).__add__(self) if isinstance(other,Level3_Data) else NotImplemented
+    
+    def to_level3(self):
+        '''
+        divide the sums once and return a Level3_Data, with the sums attached as .sums
+        '''
+        fields = [k for k in self.keys() if k not in self.weight_keys]
+        zeros = np.zeros((len(self.ygrid),len(self.xgrid)))
+        xmesh,ymesh = np.meshgrid(self.xgrid,self.ygrid)
+        with np.errstate(invalid='ignore',divide='ignore'):
+            l3_data = F_block_l3_from_sums(xmesh,ymesh,fields,
+                                           self['total_sample_weight'],self['num_samples'],
+                                           [self[k] for k in fields],
+                                           self.get('pres_total_sample_weight',self['total_sample_weight']),
+                                           self.get('pres_num_samples',zeros),
+                                           self.get('cloud_pressure',zeros))
+        l3_data.pop('xmesh');l3_data.pop('ymesh')
+        l3_data['xgrid'] = self.xgrid
+        l3_data['ygrid'] = self.ygrid
+        l3 = Level3_Data(grid_size=self.grid_size,
+                         start_python_datetime=self.start_python_datetime,
+                         end_python_datetime=self.end_python_datetime,
+                         instrum=self.instrum,product=self.product,
+                         oversampling_list=fields,proj=self.proj)
+        l3.assimilate(l3_data)
+        l3.check()
+        l3.sums = dict(self)
+        return l3
+    
+    def save_nc(self,l3_filename,**kwargs):
+        '''
+        Level3_Data.save_nc with save_sums=True of all fields
+        '''
+        l3 = self.to_level3()
+        kwargs.setdefault('fields_name',l3.oversampling_list.copy())
+        l3.save_nc(l3_filename,save_sums=True,**kwargs)
+    
+    def read_nc(self,l3_filename,fields_name=None,west=None,east=None,south=None,north=None):
+        '''
+        read accumulators saved by save_nc(save_sums=True), see Level3_Data.read_nc. by default,
+        all fields with a saved sum_<field> are read
+        '''
+        l3 = Level3_Data().read_nc(l3_filename,fields_name=fields_name,
+                                   west=west,east=east,south=south,north=north,read_sums=True)
+        return self.from_level3(l3)
+    
 class Level3_List(list):
     '''a list of Level3_Data objects
     started on 2022/10/12
@@ -3413,7 +5022,8 @@ class Level3_List(list):
             
         for l3_fn in l3_list:
             self.logger.info('loading {}'.format(l3_fn))
-            l3 = Level3_Data().read_nc(l3_filename=l3_fn,fields_name=fields_name)
+            l3 = Level3_Data().read_nc(l3_filename=l3_fn,fields_name=fields_name.copy(),
+                                       west=self.west,east=self.east,south=self.south,north=self.north)
             self.add(l3)
     
     def trim(self,west,east,south,north):
@@ -3425,6 +5035,20 @@ class Level3_List(list):
     def add(self,l3):
         self.append(l3.trim(west=self.west,east=self.east,south=self.south,north=self.north))
     
+    def remesh(self,xgrid,ygrid,align=False,grid_size_rtol=1e-2):
+        '''remesh (or remesh_align if align) all l3 to x/ygrid. the index maps are computed once
+        and reused for every l3 on the same grid as the previous one'''
+        l3s_new = Level3_List(dt_array=self.dt_array,west=self.west,east=self.east,south=self.south,north=self.north)
+        remesher = None
+        for l3 in self:
+            if remesher is None or len(l3['xgrid']) != len(src_xgrid) or len(l3['ygrid']) != len(src_ygrid) \
+            or not np.array_equal(l3['xgrid'],src_xgrid) or not np.array_equal(l3['ygrid'],src_ygrid):
+                src_xgrid,src_ygrid = l3['xgrid'],l3['ygrid']
+                remesher = Remesher(src_xgrid,src_ygrid,l3.grid_size,xgrid,ygrid,
+                                    align=align,grid_size_rtol=grid_size_rtol)
+            l3s_new.append(remesher.F_remesh(l3))
+        return l3s_new
+    
     def resample(self,rule='month_of_year',half_running_window=0):
         if rule == 'month_of_year':
             resampler = self.df.groupby(by=self.df.index.month)
@@ -3502,6 +5126,10 @@ class Level3_List(list):
         bkwargs = kwargs.copy()
         bkwargs['if_bootstrap'] = True
         bkwargs['if_xyrs'] = False
+        # with the numpy solver, Level3_Data.fit_topography bootstraps, batched if max_iter is 1
+        if kwargs.get('solver') == 'numpy':
+            kwargs['nbootstrap'] = nbootstrap
+            nbootstrap = None
         if resample_rule is None:
             for l3 in self:
                 if nbootstrap is not None:
@@ -3593,9 +5221,15 @@ class Level3_List(list):
         bkwargs = kwargs.copy()
         bkwargs['if_bootstrap'] = True
         bkwargs['if_xyrs'] = False
+        # the numpy solver runs all bootstrap replicates in one batched solve
+        if kwargs.get('solver') == 'numpy' and nbootstrap is not None:
+            kwargs['nbootstrap'] = nbootstrap
+            nbootstrap = None
         
         if resample_rule is None:
             for l3 in self:
+                if 'nbootstrap' in kwargs.keys() and if_propagate_bootstrap:
+                    kwargs['topo_bootstrap_params'] = l3.topo_fit.bootstrap_params
                 if nbootstrap is not None:
                     bootstrap_params = []
                     if if_propagate_bootstrap:
@@ -3616,6 +5250,8 @@ class Level3_List(list):
         else:
             l3s_resampled,resampler = self.resample(rule=resample_rule,half_running_window=half_running_window)
             for l3,(ind,sub_df) in zip(l3s_resampled,resampler.__iter__()):
+                if 'nbootstrap' in kwargs.keys() and if_propagate_bootstrap:
+                    kwargs['topo_bootstrap_params'] = l3.topo_fit.bootstrap_params
                 if nbootstrap is not None:
                     bootstrap_params = []
                     if if_propagate_bootstrap:
@@ -3751,7 +5387,8 @@ class Level3_List(list):
         if fields_to_average is None:
             fields_to_average = ['wind_column','wind_column_topo','wind_column_topo_chem','column_amount','num_samples','wind_topo']
         if 'num_samples' in fields_to_average and 'sum_num_samples' not in fields_to_average:
-            fields_to_average.append('sum_num_samples')
+            # a copy, so the caller's list does not grow across calls
+            fields_to_average = list(fields_to_average)+['sum_num_samples']
         averaged = []
         averaged.append(self[0].average_by_finerMask(tif_dict=tif_dict))
         
@@ -3768,7 +5405,369 @@ class Level3_List(list):
         except Exception as e:
             self.logger.warning('cannot estimate emission error:')
             self.logger.warning(e)
+    
+    def average_by_finerMasks(self,tif_dicts,labels=None,mask_names=None,fields_to_average=None):
+        '''
+        average_by_finerMask for many masks, e.g., all cities in a region, in one pass per l3
+        tif_dicts:
+            a list of Geo_Raster objects, or a single label raster if labels is provided
+        labels:
+            label values in the label raster, one region per label
+        mask_names:
+            column prefixes in self.df, default the Geo_Raster names or the labels
+        '''
+        if mask_names is None:
+            if labels is not None:
+                mask_names = [str(label) for label in labels]
+            else:
+                mask_names = [getattr(tif_dict,'name','unknown_mask_{}'.format(i))
+                              for i,tif_dict in enumerate(tif_dicts)]
+        if fields_to_average is None:
+            fields_to_average = ['wind_column','wind_column_topo','wind_column_topo_chem','column_amount','num_samples','wind_topo']
+        if 'num_samples' in fields_to_average and 'sum_num_samples' not in fields_to_average:
+            # a copy, so the caller's list does not grow across calls
+            fields_to_average = list(fields_to_average)+['sum_num_samples']
+        weights = F_finer_mask_weights(self[0]['xgrid'],self[0]['ygrid'],tif_dicts,
+                                       labels=labels,grid_size=self[0].grid_size)
+        averaged = [l3.average_by_sparseMask(weights) for l3 in self]
+        columns = {}
+        for f in fields_to_average:
+            values = np.array([m[f] if f in m.keys() else np.full(len(mask_names),np.nan) for m in averaged])
+            for imask,mask_name in enumerate(mask_names):
+                columns['{}_{}'.format(mask_name,f)] = values[:,imask]
+        if 'wind_column_precision_singleLayer' in self.df.keys() and 'sum_num_samples' in averaged[0].keys():
+            for mask_name in mask_names:
+                columns['{}_wind_column_precision'.format(mask_name)] = \
+                self.df['wind_column_precision_singleLayer'].values/np.sqrt(columns['{}_sum_num_samples'.format(mask_name)])
+        # one concat instead of hundreds of column insertions
+        self.df = pd.concat([self.df.drop(columns=[k for k in columns.keys() if k in self.df.keys()]),
+                             pd.DataFrame(columns,index=self.df.index)],axis=1)
 
+class Level3_Cube(dict):
+    '''a stack of Level3_Data on the same grid. each field is one contiguous
+    (ntime, nrows, ncols) array, optionally np.memmap-backed, and is read from
+    the l3 files only on first access. xgrid/ygrid are shared by all periods
+    started on 2026/10/17
+    '''
+    def __init__(self,dt_array,west=-180,east=180,south=-90,north=90,memmap_dir=None):
+        '''
+        dt_array:
+            preferably a pandas PeriodIndex object
+        memmap_dir:
+            if provided, fields are stored as .npy memmaps in this directory
+        '''
+        self.logger = logging.getLogger(__name__)
+        self.dt_array = dt_array
+        self.df = pd.DataFrame({'count':range(len(dt_array))},index=dt_array)
+        self.west = west
+        self.east = east
+        self.south = south
+        self.north = north
+        self.memmap_dir = memmap_dir
+        if memmap_dir is not None and not os.path.exists(memmap_dir):
+            os.makedirs(memmap_dir)
+        self.l3_list = []
+        # (row, column) slices of the files' grid covered by the cube
+        self.window = (slice(None),slice(None))
+        self.fields_name = []
+        self.xgrid = None
+        self.ygrid = None
+        self.grid_size = None
+        self.instrum = 'unknown'
+        self.product = 'unknown'
+        self.proj = None
+        self.start_python_datetimes = []
+        self.end_python_datetimes = []
+    
+    def __len__(self):
+        return len(self.start_python_datetimes)
+    
+    def __getitem__(self,key):
+        if not dict.__contains__(self,key) and key in self.fields_name:
+            self.load_field(key)
+        return dict.__getitem__(self,key)
+    
+    def __contains__(self,key):
+        return dict.__contains__(self,key) or key in self.fields_name
+    
+    def keys(self):
+        return list(dict.keys(self))+[k for k in self.fields_name if not dict.__contains__(self,k)]
+    
+    def empty_field(self,key,dtype=np.float32):
+        '''allocate a (ntime, nrows, ncols) array, in memmap_dir if provided'''
+        shape = (len(self),len(self.ygrid),len(self.xgrid))
+        if self.memmap_dir is None:
+            return np.full(shape,np.nan,dtype=dtype)
+        field = np.lib.format.open_memmap(os.path.join(self.memmap_dir,key+'.npy'),
+                                          mode='w+',dtype=dtype,shape=shape)
+        field[:] = np.nan
+        return field
+    
+    def read_nc_pattern(self,l3_path_pattern=None,l3_list=None,fields_name=None):
+        '''register l3 files and read the grid. fields are read on first access
+        l3_path_pattern:
+            strftime pattern of l3 files for dt_array
+        l3_list:
+            list of l3 files, one per dt_array element
+        fields_name:
+            fields to expose. num_samples and total_sample_weight are always included
+        '''
+        from netCDF4 import Dataset
+        fields_name = fields_name or ['column_amount','surface_altitude','wind_topo','wind_column']
+        if l3_list is None and l3_path_pattern is None:
+            self.logger.error('either l3_list or l3_path_pattern has to be provided!')
+            return
+        if l3_list is not None and l3_path_pattern is not None:
+            self.logger.info('both l3_list and l3_path_pattern are provided. l3_path_pattern will be overwritten')
+            l3_path_pattern = None
+        if l3_path_pattern is not None:
+            if_exist = np.array([os.path.exists(d.strftime(l3_path_pattern)) for d in self.dt_array])
+            if not all(if_exist):
+                self.logger.warning('Not all l3 files exist for the pattern!')
+                dt_len = len(self.dt_array)
+                self.dt_array = self.dt_array.delete(np.arange(dt_len)[~if_exist])
+                self.df = pd.DataFrame({'count':range(len(self.dt_array))},index=self.dt_array)
+                self.logger.warning('self.dt_array length is reduced from {} to {}'.format(dt_len,len(self.dt_array)))
+            l3_list = [dt0.strftime(l3_path_pattern) for dt0 in self.dt_array]
+        self.l3_list = list(l3_list)
+        # the first file defines the grid
+        l3 = Level3_Data().read_nc(self.l3_list[0],fields_name=[fields_name[0]])
+        xs = F_box_slice(l3['xgrid'],self.west,self.east)
+        ys = F_box_slice(l3['ygrid'],self.south,self.north)
+        self.window = (ys,xs)
+        self.xgrid = l3['xgrid'][xs]
+        self.ygrid = l3['ygrid'][ys]
+        self.grid_size = l3.grid_size
+        self.instrum = l3.instrum
+        self.product = l3.product
+        self.proj = l3.proj
+        self.start_python_datetimes = []
+        self.end_python_datetimes = []
+        for l3_fn in self.l3_list:
+            nc = Dataset(l3_fn,'r')
+            self.start_python_datetimes.append(datetime.datetime.strptime(nc.getncattr('time_coverage_start'),'%Y-%m-%dT%H:%M:%SZ'))
+            self.end_python_datetimes.append(datetime.datetime.strptime(nc.getncattr('time_coverage_end'),'%Y-%m-%dT%H:%M:%SZ'))
+            nc.close()
+        self.fields_name = list(fields_name)
+        for key in ['num_samples','total_sample_weight']:
+            if key not in self.fields_name:
+                self.fields_name.append(key)
+        return self
+    
+    def load_field(self,key):
+        '''read one field from all l3 files into a (ntime, nrows, ncols) array'''
+        self.logger.info('loading {} from {} files'.format(key,len(self.l3_list)))
+        from netCDF4 import Dataset
+        field = self.empty_field(key)
+        for (i,l3_fn) in enumerate(self.l3_list):
+            nc = Dataset(l3_fn,'r')
+            if key in nc.variables.keys():
+                try:
+                    field[i] = nc[key][self.window].filled(np.nan)
+                except:
+                    field[i] = np.array(nc[key][self.window])
+            else:
+                self.logger.warning('{} not found in {}'.format(key,l3_fn))
+            nc.close()
+        dict.__setitem__(self,key,field)
+    
+    def from_list(self,l3s,fields_name=None):
+        '''stack a Level3_List (or list of Level3_Data on the same grid)'''
+        if fields_name is None:
+            fields_name = [k for k in l3s[0].keys() if np.ndim(l3s[0][k]) == 2 
+                           and k not in ['xmesh','ymesh','lonmesh','latmesh']]
+        l3 = l3s[0]
+        self.xgrid = l3['xgrid']
+        self.ygrid = l3['ygrid']
+        self.grid_size = l3.grid_size
+        self.instrum = l3.instrum
+        self.product = l3.product
+        self.proj = l3.proj
+        self.start_python_datetimes = [l.start_python_datetime for l in l3s]
+        self.end_python_datetimes = [l.end_python_datetime for l in l3s]
+        self.fields_name = []
+        for key in fields_name:
+            field = self.empty_field(key)
+            for (i,l) in enumerate(l3s):
+                if key in l.keys():
+                    field[i] = l[key]
+            dict.__setitem__(self,key,field)
+        return self
+    
+    def get_l3(self,itime):
+        '''a Level3_Data of one period, sharing memory with the cube'''
+        l3 = Level3_Data(grid_size=self.grid_size,
+                         start_python_datetime=self.start_python_datetimes[itime],
+                         end_python_datetime=self.end_python_datetimes[itime],
+                         instrum=self.instrum,product=self.product,proj=self.proj)
+        l3['xgrid'] = self.xgrid
+        l3['ygrid'] = self.ygrid
+        for key in self.keys():
+            l3[key] = self[key][itime]
+        l3.check()
+        return l3
+    
+    def to_list(self):
+        '''convert to Level3_List, e.g., for the per-period fit_* methods'''
+        l3s = Level3_List(dt_array=self.dt_array,west=self.west,east=self.east,south=self.south,north=self.north)
+        for itime in range(len(self)):
+            l3s.append(self.get_l3(itime))
+        return l3s
+    
+    def trim(self,west,east,south,north):
+        '''trim to a box. fields already in memory are sliced, others stay lazy'''
+        xs = F_box_slice(self.xgrid,west,east)
+        ys = F_box_slice(self.ygrid,south,north)
+        l3c = Level3_Cube(dt_array=self.dt_array,west=west,east=east,south=south,north=north)
+        l3c.__dict__.update({k:v for (k,v) in self.__dict__.items() if k not in ['west','east','south','north','df','memmap_dir']})
+        l3c.df = self.df.copy()
+        l3c.xgrid = self.xgrid[xs]
+        l3c.ygrid = self.ygrid[ys]
+        ys0,xs0 = self.window
+        l3c.window = (slice((ys0.start or 0)+ys.start,(ys0.start or 0)+ys.stop),
+                      slice((xs0.start or 0)+xs.start,(xs0.start or 0)+xs.stop))
+        for (k,v) in dict.items(self):
+            dict.__setitem__(l3c,k,v[:,ys,xs])
+        return l3c
+    
+    def merge_weights(self,itimes):
+        '''merge periods itimes (repeats count multiple times) into a Level3_Data,
+        identical to chaining Level3_Data.merge'''
+        itimes = np.asarray(itimes,dtype=int)
+        l3 = Level3_Data()
+        if len(itimes) == 0:
+            return l3
+        utimes,counts = np.unique(itimes,return_counts=True)
+        c = counts[:,np.newaxis,np.newaxis].astype(np.float64)
+        l3 = Level3_Data(grid_size=self.grid_size,
+                         start_python_datetime=np.min([self.start_python_datetimes[i] for i in utimes]),
+                         end_python_datetime=np.max([self.end_python_datetimes[i] for i in utimes]),
+                         instrum=self.instrum,product=self.product,proj=self.proj)
+        l3['xgrid'] = self.xgrid
+        l3['ygrid'] = self.ygrid
+        weights = {}
+        for key in ['total_sample_weight','pres_total_sample_weight','num_samples','pres_num_samples']:
+            if key in self:
+                weights[key] = np.nan_to_num(self[key][utimes])*c
+                l3[key] = weights[key].sum(axis=0)
+        with np.errstate(invalid='ignore',divide='ignore'):
+            for key in self.keys():
+                if key in l3.keys():
+                    continue
+                if key == 'cloud_pressure':
+                    w = weights['pres_total_sample_weight']
+                else:
+                    w = weights['total_sample_weight']
+                l3[key] = np.nansum(self[key][utimes]*w,axis=0,dtype=np.float64)/w.sum(axis=0)
+        l3.check()
+        return l3
+    
+    def aggregate(self,start_dt=None,end_dt=None):
+        '''weighted merge of all periods overlapping [start_dt, end_dt]'''
+        itimes = [i for i in range(len(self)) 
+                  if (start_dt is None or self.end_python_datetimes[i] > start_dt)
+                  and (end_dt is None or self.start_python_datetimes[i] < end_dt)]
+        return self.merge_weights(itimes)
+    
+    def resample(self,rule='month_of_year',half_running_window=0):
+        '''same as Level3_List.resample, but each group is merged in one vectorized step.
+        returns a Level3_Cube of the merged periods and the pandas resampler'''
+        if rule == 'month_of_year':
+            resampler = self.df.groupby(by=self.df.index.month)
+        else:
+            resampler = self.df.resample(rule,label='right')
+        l3s = []
+        for k,v in resampler.indices.items():
+            itimes = np.concatenate([np.arange(v0-half_running_window,v0+half_running_window+1) for v0 in v])
+            itimes = itimes[(itimes >= 0) & (itimes < len(self))]
+            l3s.append(self.merge_weights(itimes))
+        l3c_resampled = Level3_Cube(list(resampler.indices.keys()),west=self.west,east=self.east,
+                                    south=self.south,north=self.north)
+        l3c_resampled.from_list(l3s,fields_name=[k for k in self.keys()])
+        return l3c_resampled,resampler
+    
+    def sum_by_mask(self,mask=None,xys=None,fields_to_sum=None,fields_to_average=None):
+        '''vectorized Level3_List.sum_by_mask over the time axis, results in self.df'''
+        if self.proj is not None:
+            self.logger.error('proj is not implemented yet!');return
+        if fields_to_sum is None:
+            fields_to_sum = ['wind_column','wind_column_topo','wind_column_topo_chem','wind_column_topo_alb']
+        if fields_to_average is None:
+            fields_to_average = ['num_samples']
+        lonmesh,latmesh = np.meshgrid(self.xgrid,self.ygrid)
+        if mask is None:
+            mask = np.zeros(lonmesh.shape,dtype=bool)
+        grid_m2 = np.square(self.grid_size*111e3)*np.cos(latmesh/180*np.pi)
+        if xys is not None:
+            mask = mask | F_polygon_mask(self.xgrid,self.ygrid,xys)
+        gm = grid_m2[mask]
+        w = self['total_sample_weight'][:,mask]
+        with np.errstate(invalid='ignore',divide='ignore'):
+            for key in set(fields_to_sum).intersection(self.keys()):
+                self.df['summed_{}'.format(key)] = np.nansum(self[key][:,mask]*gm*w,axis=1)\
+                /np.nansum(w*gm,axis=1)*np.nansum(gm)
+            for key in set(fields_to_average).intersection(self.keys()):
+                self.df['averaged_{}'.format(key)] = np.nansum(self[key][:,mask]*gm,axis=1)/np.nansum(gm)
+    
+class L2GBuilder(object):
+    '''
+    accumulate level 2g granules (dicts of arrays sharing the first dimension) as chunk
+    lists and concatenate each field once in finalize, so that building l2g_data is linear
+    in the number of pixels instead of quadratic as with repeated F_merge_l2g_data
+    created on 2026/10/17
+    '''
+    def __init__(self,dtypes=None):
+        '''
+        dtypes:
+            optional dict of field name to dtype. chunks of these fields are cast on append
+        '''
+        self.logger = logging.getLogger(__name__)
+        self.dtypes = dtypes or {}
+        self.fields = None
+        self.chunks = {}
+        self.nl2 = 0
+    
+    def append(self,l2g_data0):
+        '''
+        add one granule. only fields present in all granules are kept, as in F_merge_l2g_data
+        '''
+        if not l2g_data0:
+            return self
+        if self.fields is None:
+            self.fields = list(l2g_data0.keys())
+        else:
+            missing = [k for k in self.fields if k not in l2g_data0]
+            if len(missing) > 0:
+                self.logger.warning('fields {} are missing in the new granule and dropped'.format(missing))
+                for k in missing:
+                    self.chunks.pop(k,None)
+                self.fields = [k for k in self.fields if k in l2g_data0]
+        for k in self.fields:
+            v = l2g_data0[k]
+            if k in self.dtypes:
+                v = v.astype(self.dtypes[k],copy=False)
+            self.chunks.setdefault(k,[]).append(v)
+        if len(self.fields) > 0:
+            self.nl2 += len(l2g_data0[self.fields[0]])
+        return self
+    
+    def finalize(self):
+        '''
+        return the usual l2g_data dict of arrays and release the chunks
+        '''
+        l2g_data = {}
+        if self.fields is None:
+            return l2g_data
+        for k in self.fields:
+            chunks = self.chunks.pop(k)
+            if len(chunks) == 1:
+                l2g_data[k] = chunks[0]
+            else:
+                l2g_data[k] = np.concatenate(chunks,0)
+        self.fields = None
+        self.nl2 = 0
+        return l2g_data
+    
 class popy(object):
     
     def __init__(self,instrum,product,\
@@ -3778,7 +5777,8 @@ class popy(object):
                  end_year=2100,end_month=12,end_day=31,\
                  end_hour=23,end_minute=59,end_second=59,verbose=False,
                  proj=None,k1=None,k2=None,k3=None,inflatex=None,inflatey=None,
-                 flux_grid_size=None,oversampling_list=None,error_model=None):
+                 flux_grid_size=None,oversampling_list=None,error_model=None,
+                 met_cache=None,sg_tol=None):
         
         self.instrum = instrum
         self.product = product
@@ -4051,6 +6051,8 @@ class popy(object):
             self.sg_scaling = 1.
         self.inflatex = inflatex
         self.inflatey = inflatey
+        # truncate kernels where SG < sg_tol*peak, see F_block_sg_support
+        self.sg_tol = sg_tol
         self.sg_kfacx = 2*(np.log(2)**(1/k1/k3))
         self.sg_kfacy = 2*(np.log(2)**(1/k2/k3))
         self.error_model = error_model
@@ -4081,6 +6083,8 @@ class popy(object):
         self.start_matlab_datenum = start_matlab_datenum
         self.end_matlab_datenum = end_matlab_datenum
         self.show_progress = True
+        # MetCache instance shared by met sampling functions
+        self.met_cache = met_cache
         self.proj = proj
         if east < west:
             east = east+360
@@ -4124,38 +6128,60 @@ class popy(object):
         self.nrows = len(ygrid)
         self.ncols = len(xgrid)
     
-    def F_mat_reader(self,mat_filename,boundary_polygon=None,if_conserve=False):
+    def F_mat_reader(self,mat_filename,boundary_polygon=None,if_conserve=False,usekeys=None):
         '''
         if_conserve = True, none filtering will be applied, so level 2 pixels are conserved
+        mat_filename can also be a l2g store directory saved by F_save_l2g_to_store,
+        which is then read by F_l2g_store_reader
+        usekeys:
+            l2g fields to load, default all. latc, lonc and UTC_matlab_datenum are always loaded.
+            the filter fields are extracted first and only the valid pixels of usekeys are kept
+        updated on 2026/10/17 to read l2g store directories
+        updated on 2026/10/17 to filter before extracting fields
         '''
+        if os.path.isdir(mat_filename):
+            self.F_l2g_store_reader(mat_filename,usekeys=usekeys,
+                                    boundary_polygon=boundary_polygon,if_conserve=if_conserve)
+            return
         import scipy.io
+        # scipy cannot read single fields of a struct, so output_subset is decoded as a whole
+        output_subset = scipy.io.loadmat(mat_filename,variable_names=['output_subset'])['output_subset']
         
-        mat_data = scipy.io.loadmat(mat_filename)
-        
-        l2g_data = {}
-        for key_name in mat_data['output_subset'].dtype.names:
+        # l2g field name: (mat field name, if flatten)
+        mat_fields = {}
+        for key_name in output_subset.dtype.names:
             if key_name == 'lat':
-                l2g_data['latc'] = mat_data['output_subset']['lat'][0][0].flatten()
+                mat_fields['latc'] = (key_name,True)
             elif key_name == 'lon':
-                l2g_data['lonc'] = mat_data['output_subset']['lon'][0][0].flatten()
-            elif key_name == 'lonr':
-                l2g_data['lonr'] = mat_data['output_subset']['lonr'][0][0]
-            elif key_name == 'latr':
-                l2g_data['latr'] = mat_data['output_subset']['latr'][0][0]
+                mat_fields['lonc'] = (key_name,True)
+            elif key_name in {'lonr','latr'}:
+                mat_fields[key_name] = (key_name,False)
             elif key_name in {'colnh3','colno2','colhcho','colchocho','colco'}:
-                l2g_data['column_amount'] = mat_data['output_subset'][key_name][0][0].flatten()
+                mat_fields['column_amount'] = (key_name,True)
             elif key_name in {'colnh3error','colno2error','colhchoerror','colchochoerror','colcoerror','xch4error'}:
-                l2g_data['column_uncertainty'] = mat_data['output_subset'][key_name][0][0].flatten()
+                mat_fields['column_uncertainty'] = (key_name,True)
             elif key_name in {'ift','ifov'}:
-                l2g_data['across_track_position'] = mat_data['output_subset'][key_name][0][0].flatten()
+                mat_fields['across_track_position'] = (key_name,True)
             elif key_name == 'cloudfrac':
-                l2g_data['cloud_fraction'] = mat_data['output_subset']['cloudfrac'][0][0].flatten()
+                mat_fields['cloud_fraction'] = (key_name,True)
             elif key_name == 'utc':
-                l2g_data['UTC_matlab_datenum'] = mat_data['output_subset']['utc'][0][0].flatten()
+                mat_fields['UTC_matlab_datenum'] = (key_name,True)
             else:
-                l2g_data[key_name] = mat_data['output_subset'][key_name][0][0].squeeze()
-#                #exec(key_name + " =  mat_data['output_subset'][key_name][0][0].flatten()")
-                #exec('l2g_data[key_name]=' + key_name)
+                mat_fields[key_name] = (key_name,None)
+        output_keys = list(mat_fields.keys())
+        if usekeys is not None:
+            output_keys = [k for k in output_keys if k in set(usekeys)|{'latc','lonc','UTC_matlab_datenum'}]
+        def F_extract(l2g_key):
+            key_name,if_flatten = mat_fields[l2g_key]
+            if if_flatten is None:
+                return output_subset[key_name][0][0].squeeze()
+            elif if_flatten:
+                return output_subset[key_name][0][0].flatten()
+            return output_subset[key_name][0][0]
+        
+        # phase 1, filter fields only
+        l2g_data = {k:F_extract(k) for k in ['latc','lonc','UTC_matlab_datenum','cloud_fraction',
+                                              'SolarZenithAngle','qa_value'] if k in mat_fields.keys()}
         nl20 = len(l2g_data['latc'])
         min_time = datedev_py(
                 l2g_data['UTC_matlab_datenum'].min()).strftime(
@@ -4169,27 +6195,39 @@ class popy(object):
             self.logger.info('min observation time at '+min_time)
             self.logger.info('max observation time at '+max_time)
             self.logger.info('if_conserve is on. No filter (boundary/time/space) will be applied, returning with full l2g')
-            del mat_data    
+            l2g_data = {k:(l2g_data[k] if k in l2g_data.keys() else F_extract(k)) for k in output_keys}
+            del output_subset
             self.l2g_data = l2g_data
             self.nl2 = nl20
             return
             
-        west = self.west
-        east = self.east
-        south = self.south
-        north = self.north
+        validmask = self.F_l2g_filter_mask(l2g_data)
         
-        start_matlab_datenum = self.start_matlab_datenum
-        end_matlab_datenum = self.end_matlab_datenum
-                
-        tmplon = l2g_data['lonc']-west
-        tmplon[tmplon < 0] = tmplon[tmplon < 0]+360
-        # filter data within the lat/lon box and time interval
-        validmask = (tmplon >= 0) & (tmplon <= east-west) &\
-        (l2g_data['latc'] >= south) & (l2g_data['latc'] <= north) &\
-        (l2g_data['UTC_matlab_datenum'] >= start_matlab_datenum) &\
-        (l2g_data['UTC_matlab_datenum'] <= end_matlab_datenum)
+        # phase 2, valid pixels of the remaining fields
+        l2g_data = {k:(l2g_data[k] if k in l2g_data.keys() else F_extract(k))[validmask,]
+                    for k in output_keys}
+        nl2 = len(l2g_data['latc'])
+        
+        self.logger.info('Loading and subsetting file '+mat_filename+'...')
+        self.logger.info('containing %d pixels...' %nl20)
+        self.logger.info('min observation time at '+min_time)
+        self.logger.info('max observation time at '+max_time)
+        self.logger.info('%d pixels fall in the spatiotemporal window...' %nl2)
         
+        del output_subset
+        self.l2g_data = l2g_data
+        self.nl2 = nl2
+        if boundary_polygon is not None:
+            self.logger.info('boundary polygon provided, further filtering l2g pixels...')
+            self.F_mask_l2g_with_boundary(boundary_polygon=boundary_polygon,center_only=False)
+    
+    def F_l2g_filter_mask(self,l2g_data):
+        '''
+        F_l2g_valid_mask (lat/lon box and time interval), also applying maxcf, maxsza and
+        min_qa_value if cloud_fraction, SolarZenithAngle and qa_value exist
+        created on 2026/10/17, moved from F_mat_reader
+        '''
+        validmask = self.F_l2g_valid_mask(l2g_data)
         if 'cloud_fraction' in l2g_data.keys():
             validmask = validmask & (l2g_data['cloud_fraction'] <=self.maxcf)
             self.logger.info('cloud fraction filter is applied')
@@ -4199,19 +6237,86 @@ class popy(object):
         if 'qa_value' in l2g_data.keys():
             validmask = validmask & (l2g_data['qa_value'] >=self.min_qa_value)
             self.logger.info('qa value filter is applied')
-        
-        
-        
-        l2g_data = {k:v[validmask,] for (k,v) in l2g_data.items()}
-        nl2 = len(l2g_data['latc'])
-        
-        self.logger.info('Loading and subsetting file '+mat_filename+'...')
+        return validmask
+    
+    def F_l2g_store_chunks(self,manifest):
+        '''
+        indices of chunks in a l2g store manifest that may overlap the lat/lon box
+        and time interval, based on the chunk min/max statistics
+        created on 2026/10/17
+        '''
+        keep = []
+        # lon overlap is only tested when the box does not cross the dateline
+        test_lon = (self.west >= -180) and (self.east <= 180) and (self.west <= self.east)
+        for ichunk,chunk in enumerate(manifest['chunks']):
+            stats = chunk['stats']
+            if 'latc' in stats and stats['latc'] is not None:
+                if stats['latc'][1] < self.south or stats['latc'][0] > self.north:
+                    continue
+            if test_lon and 'lonc' in stats and stats['lonc'] is not None:
+                if stats['lonc'][1] < self.west or stats['lonc'][0] > self.east:
+                    continue
+            if 'UTC_matlab_datenum' in stats and stats['UTC_matlab_datenum'] is not None:
+                if stats['UTC_matlab_datenum'][1] < self.start_matlab_datenum or \
+                stats['UTC_matlab_datenum'][0] > self.end_matlab_datenum:
+                    continue
+            keep.append(ichunk)
+        return keep
+    
+    def F_l2g_store_reader(self,store_dir,usekeys=None,boundary_polygon=None,if_conserve=False):
+        '''
+        read a l2g store directory saved by F_save_l2g_to_store to self.l2g_data. fields are
+        memory-mapped; chunks are skipped by the manifest statistics, the filter fields are read
+        for the remaining chunks, and only the valid pixels of the other fields are read
+        store_dir:
+            directory with one .npy per field and manifest.json
+        usekeys:
+            fields to load, default all. latc, lonc and UTC_matlab_datenum are always loaded
+        boundary_polygon, if_conserve:
+            see F_mat_reader
+        created on 2026/10/17
+        '''
+        import json
+        with open(os.path.join(store_dir,'manifest.json'),'r') as f:
+            manifest = json.load(f)
+        fields = list(manifest['fields'].keys())
+        if usekeys is not None:
+            fields = [k for k in fields if k in set(usekeys)|{'latc','lonc','UTC_matlab_datenum'}]
+        # copy-on-write maps, so that in-place changes to l2g_data never reach the files
+        mm = {k:np.load(os.path.join(store_dir,k+'.npy'),mmap_mode='c') for k in fields}
+        nl20 = manifest['nl2']
+        time_stats = manifest['fields']['UTC_matlab_datenum']
+        self.logger.info('Loading and subsetting l2g store '+store_dir+'...')
         self.logger.info('containing %d pixels...' %nl20)
-        self.logger.info('min observation time at '+min_time)
-        self.logger.info('max observation time at '+max_time)
+        if nl20 > 0:
+            self.logger.info('min observation time at '+datedev_py(time_stats['min']).strftime("%d-%b-%Y %H:%M:%S"))
+            self.logger.info('max observation time at '+datedev_py(time_stats['max']).strftime("%d-%b-%Y %H:%M:%S"))
+        if if_conserve:
+            self.logger.info('if_conserve is on. No filter (boundary/time/space) will be applied, returning with full l2g')
+            self.l2g_data = mm
+            self.nl2 = nl20
+            return
+        chunks = [manifest['chunks'][i] for i in self.F_l2g_store_chunks(manifest)]
+        self.logger.info('{} of {} chunks overlap the spatiotemporal window'.format(len(chunks),len(manifest['chunks'])))
+        filter_fields = [k for k in ['latc','lonc','UTC_matlab_datenum','cloud_fraction','SolarZenithAngle','qa_value']
+                         if k in manifest['fields'].keys()]
+        if len(chunks) == 0:
+            idx = np.zeros(0,dtype=np.int64)
+        else:
+            filter_data = {}
+            for k in filter_fields:
+                tmp = mm[k] if k in mm.keys() else np.load(os.path.join(store_dir,k+'.npy'),mmap_mode='r')
+                filter_data[k] = np.concatenate([tmp[c['start']:c['stop']] for c in chunks],0)
+            validmask = self.F_l2g_filter_mask(filter_data)
+            idx = np.concatenate([np.arange(c['start'],c['stop']) for c in chunks])[validmask]
+        l2g_data = {}
+        for k in fields:
+            if len(chunks) > 0 and k in filter_data.keys():
+                l2g_data[k] = filter_data[k][validmask,]
+            else:
+                l2g_data[k] = np.asarray(mm[k][idx,])
+        nl2 = len(idx)
         self.logger.info('%d pixels fall in the spatiotemporal window...' %nl2)
-        
-        del mat_data    
         self.l2g_data = l2g_data
         self.nl2 = nl2
         if boundary_polygon is not None:
@@ -4450,24 +6555,22 @@ class popy(object):
         l3_data = {k:v.squeeze() for (k,v) in d.items()}
         if boundary_polygon is not None:
             self.logger.info('boundary polygon provided, masking out-of-boundary grid cells...')
-            [xmesh,ymesh] = np.meshgrid(l3_data['xgrid'],l3_data['ygrid'])
-            xlin = xmesh.reshape(-1)
-            ylin = ymesh.reshape(-1)
-            mask=~boundary_polygon.contains_points(np.hstack((xlin[:,np.newaxis],ylin[:,np.newaxis]))).reshape(xmesh.shape)
+            mask = ~F_polygon_mask(l3_data['xgrid'],l3_data['ygrid'],boundary_polygon)
             for (k,v) in l3_data.items():
                 if len(v.shape) == 2:
                     l3_data[k][mask] = np.nan
         return l3_data    
         
     def F_merge_l2g_data(self,l2g_data0,l2g_data1):
+        '''
+        merge two l2g_data dicts. to merge many granules, use L2GBuilder instead
+        updated on 2026/10/17 to use L2GBuilder
+        '''
         if not l2g_data0:
             return l2g_data1
         if not l2g_data1:
             return l2g_data0
-        common_keys = set(l2g_data0).intersection(set(l2g_data1))
-        for key in common_keys:
-            l2g_data0[key] = np.concatenate((l2g_data0[key],l2g_data1[key]),0)
-        return l2g_data0
+        return L2GBuilder().append(l2g_data0).append(l2g_data1).finalize()
     
     def F_merge_l3_data(self,l3_data0,l3_data1):
         if not l3_data0:
@@ -4676,15 +6779,63 @@ class popy(object):
             l2g_omi['orbit'] = np.concatenate([l2g_omi['orbit'],ooorbit[omi_orbit_mask]])
             self.l2g_data = l2g_omi
     
-    def F_read_S5P_nc(self,fn,data_fields,data_fields_l2g=None):
+    def F_read_granules(self,l2_list,reader,reader_args,ncores=1,bbox_prune=True):
+        """
+        read level 2 granules with a reader method, in order
+        l2_list:
+            a list of level 2 file paths
+        reader:
+            name of the reader method, 'F_read_S5P_nc' or 'F_read_he5'
+        reader_args:
+            tuple of arguments after the file path of the reader
+        ncores:
+            if > 1, granules are read concurrently by a process pool of ncores workers
+        bbox_prune:
+            if True, only scanlines with pixel centers in self.west/east/south/north are
+            read and granules without such scanlines are skipped
+        yield:
+            (fn, outp) for each readable granule intersecting the domain
+        created on 2026/10/17
+        """
+        if ncores is None or ncores <= 1 or len(l2_list) <= 1:
+            for fn in l2_list:
+                self.logger.info('Loading '+os.path.split(fn)[-1])
+                try:
+                    outp = getattr(self,reader)(fn,*reader_args,bbox_prune=bbox_prune)
+                except Exception as e:
+                    self.logger.warning(fn+' gives error:')
+                    self.logger.warning(e)
+                    continue
+                if outp is not None:
+                    yield fn,outp
+            return
+        from multiprocessing import Pool
+        attrs = {k:getattr(self,k) for k in ['instrum','product','west','east','south','north']}
+        # each task gets its own copy of the field lists, which readers may modify
+        tasks = [(attrs,reader,fn,reader_args,bbox_prune) for fn in l2_list]
+        self.logger.info('reading {} granules with {} processes'.format(len(l2_list),ncores))
+        with Pool(ncores) as pp:
+            for fn,outp,e in pp.imap(F_read_granule_wrapper,tasks):
+                self.logger.info('Loaded '+os.path.split(fn)[-1])
+                if e is not None:
+                    self.logger.warning(fn+' gives error:')
+                    self.logger.warning(e)
+                    continue
+                if outp is not None:
+                    yield fn,outp
+    
+    def F_read_S5P_nc(self,fn,data_fields,data_fields_l2g=None,bbox_prune=False):
         """ 
         function to read tropomi's level 2 netcdf file to a dictionary
         fn: file name
         data_fields: a list of string containing absolution path of variables to extract
         data_fields_l2g: what do you want to call the variables in the output
+        bbox_prune: if True, read latc/lonc first and only the scanlines with pixel
+            centers in self.west/east/south/north. return None if there is none
         updated on 2019/04/22
         updated on 2019/11/20 to handle SUB.nc
         updated on 2022/06/19 to add orbit number
+        updated on 2026/10/17 to add bbox_prune
         additional packages:
             netCDF4, conda install -c anaconda netcdf4
         """
@@ -4707,6 +6858,15 @@ class popy(object):
                 self.logger.warning('old s5pco files, avk in m, not 1')
                 scale_s5pco_avk = True
         
+        window = slice(None)
+        if bbox_prune and data_fields_l2g and 'latc' in data_fields_l2g and 'lonc' in data_fields_l2g:
+            window = F_scanline_window(np.squeeze(ncid[data_fields[data_fields_l2g.index('latc')]][:],axis=0),
+                                       np.squeeze(ncid[data_fields[data_fields_l2g.index('lonc')]][:],axis=0),
+                                       self.west,self.east,self.south,self.north)
+            if window is None:
+                self.logger.info('no pixel of {} is in the domain'.format(os.path.split(fn)[-1]))
+                ncid.close()
+                return
         for i in range(len(data_fields)):
             tmp = ncid[data_fields[i]]
             tmpdtype = tmp.dtype
@@ -4714,10 +6874,11 @@ class popy(object):
                 varname = tmp.name
             else:
                 varname = data_fields_l2g[i]
+            idx = tuple(window if dim == 'scanline' else slice(None) for dim in tmp.dimensions)
             if tmpdtype == "str":
-                outp[varname] = tmp[:]
+                outp[varname] = tmp[idx]
             else:
-                outp[varname] = np.squeeze(tmp[:],axis=0)
+                outp[varname] = np.squeeze(tmp[idx],axis=0)
             if scale_s5pco_avk and data_fields[i] == '/PRODUCT/SUPPORT_DATA/DETAILED_RESULTS/column_averaging_kernel':
                 outp[varname] = outp[varname]/(ncid['PRODUCT/layer'][-2]-ncid['PRODUCT/layer'][-1])
             
@@ -4822,7 +6983,15 @@ class popy(object):
         f.close()
         return outp        
     
-    def F_read_he5(self,fn,swathname,data_fields,geo_fields,data_fields_l2g=None,geo_fields_l2g=None):
+    def F_read_he5(self,fn,swathname,data_fields,geo_fields,data_fields_l2g=None,geo_fields_l2g=None,
+                   bbox_prune=False):
+        '''
+        read hdf-eos5 swath fields to a dictionary
+        bbox_prune:
+            if True, read latc/lonc first and only the scanlines (nTimes) with pixel
+            centers in self.west/east/south/north. return None if there is none
+        updated on 2026/10/17 to add bbox_prune
+        '''
         import h5py
         outp_he5 = {}
         if not data_fields_l2g:
@@ -4830,6 +6999,24 @@ class popy(object):
         if not geo_fields_l2g:
             geo_fields_l2g = geo_fields
         with h5py.File(fn,mode='r') as f:
+            window = slice(None)
+            ntimes = None
+            if bbox_prune and 'latc' in geo_fields_l2g and 'lonc' in geo_fields_l2g:
+                geo_path = '/HDFEOS/SWATHS/'+swathname+'/Geolocation Fields/'
+                latc = f[geo_path+geo_fields[geo_fields_l2g.index('latc')]][:]
+                lonc = f[geo_path+geo_fields[geo_fields_l2g.index('lonc')]][:]
+                window = F_scanline_window(latc,lonc,self.west,self.east,self.south,self.north)
+                if window is None:
+                    self.logger.info('no pixel of {} is in the domain'.format(os.path.split(fn)[-1]))
+                    return
+                ntimes = latc.shape[0]
+            def F_idx(shape):
+                # the along-track (nTimes) axis is the first one of the scanline number
+                if ntimes is None or ntimes not in shape:
+                    return slice(None)
+                idx = [slice(None)]*len(shape)
+                idx[shape.index(ntimes)] = window
+                return tuple(idx)
             for i in range(len(data_fields)):
                 DATAFIELD_NAME = '/HDFEOS/SWATHS/'+swathname+'/Data Fields/'+data_fields[i]
                 data = f[DATAFIELD_NAME]
@@ -4839,7 +7026,7 @@ class popy(object):
                 except:
                     ScaleFactor = 1.
                     Offset = 0.
-                data = data[:]*ScaleFactor+Offset
+                data = data[F_idx(data.shape)]*ScaleFactor+Offset
                 outp_he5[data_fields_l2g[i]] = data
                     
             for i in range(len(geo_fields)):
@@ -4848,7 +7035,7 @@ class popy(object):
                     data = f[DATAFIELD_NAME]
                 except:
                     self.logger.warning(DATAFIELD_NAME+' does not exist');continue
-                data = data[:]
+                data = data[F_idx(data.shape)]
                 outp_he5[geo_fields_l2g[i]] = data
             
             
@@ -4926,7 +7113,7 @@ class popy(object):
                       'nTimes_idx','nXtrack_idx']
         swathname = 'OMI Total Column Amount HCHO'
                 
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             fn_dir = os.path.join(l2_dir,fn)
             self.logger.info('Loading'+fn_dir)
@@ -4968,7 +7155,8 @@ class popy(object):
                                'PixelCornerLongitudes','TimeUTC','XtrackQualityFlagsExpanded',\
                                'nTimes_idx','nXtrack_idx'}:
                     l2g_data0[key] = outp_he5[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -5065,7 +7253,7 @@ class popy(object):
                                'vza','albedo','latc','lonc','main_data_quality_flag','time',\
                                'column_amount','column_uncertainty','terrain_height','surface_pressure']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             self.logger.info('Loading '+os.path.split(fn)[-1])
             try:
@@ -5100,7 +7288,8 @@ class popy(object):
             for key in outp_nc.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time_utc','time','delta_time'}:
                     l2g_data0[key] = outp_nc[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -5182,7 +7371,7 @@ class popy(object):
                                'time','main_data_quality_flag',
                                'column_amount','column_uncertainty']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         if not hasattr(self,'polygon'):
             from shapely.geometry import Polygon
             polygon = Polygon(np.array([[self.west,self.west,self.east,self.east],\
@@ -5260,7 +7449,8 @@ class popy(object):
             for key in outp_nc.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time'}:
                     l2g_data0[key] = outp_nc[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -5326,7 +7516,7 @@ class popy(object):
                            'column_amount','column_uncertainty']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
         self.logger.info('Level 2 data are located at '+l2_dir)
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             fn_dir = os.path.join(l2_dir,fn)
             self.logger.info('Loading '+fn)
@@ -5365,7 +7555,8 @@ class popy(object):
             for key in outp_nc.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time_utc','time','delta_time'}:
                     l2g_data0[key] = outp_nc[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -5435,7 +7626,7 @@ class popy(object):
                                'AI','column_uncertainty']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
         self.logger.info('Level 2 data are located at '+l2_dir)
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             fn_dir = os.path.join(l2_dir,fn)
             self.logger.info('Loading '+fn)
@@ -5472,7 +7663,8 @@ class popy(object):
             for key in outp_nc.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time_utc','time','delta_time'}:
                     l2g_data0[key] = outp_nc[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -5482,9 +7674,14 @@ class popy(object):
     def F_subset_S5PSO2(self,l2_list=None,
                         l2_path_pattern=None,
                         data_fields=None,
-                        data_fields_l2g=None):
+                        data_fields_l2g=None,
+                        ncores=1,bbox_prune=True):
         '''
         function to subset tropomi so2 level 2 data
+        ncores:
+            number of processes reading granules concurrently, see F_read_granules
+        bbox_prune:
+            if True, only read scanlines intersecting west/east/south/north
         updated to match no2/co on 2022/09/09
         '''
         if l2_list is None and l2_path_pattern is None:
@@ -5534,16 +7731,9 @@ class popy(object):
                                'vza','albedo','surface_pressure','surface_altitude','latc','lonc','qa_value','time','delta_time',\
                                'column_amount','column_uncertainty']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
-        l2g_data = {}
-        for fn in l2_list:
-            self.logger.info('Loading '+os.path.split(fn)[-1])
-            try:
-                outp_nc = self.F_read_S5P_nc(fn,data_fields,data_fields_l2g)
-            except Exception as e:
-                self.logger.warning(fn+' gives error:')
-                self.logger.warning(e)
-                # input("Press Enter to continue...")
-                continue
+        l2g_builder = L2GBuilder()
+        for fn,outp_nc in self.F_read_granules(l2_list,'F_read_S5P_nc',(data_fields,data_fields_l2g),
+                                               ncores=ncores,bbox_prune=bbox_prune):
             f1 = outp_nc['SolarZenithAngle'] <= maxsza
             f2 = outp_nc['cloud_fraction'] <= maxcf
             f3 = outp_nc['qa_value'] >= min_qa_value              
@@ -5571,7 +7761,8 @@ class popy(object):
             for key in outp_nc.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time_utc','time','delta_time'}:
                     l2g_data0[key] = outp_nc[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -5581,7 +7772,8 @@ class popy(object):
     def F_subset_S5PNO2(self,l2_list=None,l2_path_pattern=None,
                         path=None,data_fields=None,data_fields_l2g=None,
                         s5p_product='*',
-                        geos_interp_variables=None,geos_time_collection=''):
+                        geos_interp_variables=None,geos_time_collection='',
+                        ncores=1,bbox_prune=True):
         """ 
         function to subset tropomi no2 level 2 data, calling self.F_read_S5P_nc
         l2_list:
@@ -5603,6 +7795,10 @@ class popy(object):
             the geos class for geos fp data handling
         geos_time_collection:
             choose from inst3, tavg1, tavg3
+        ncores:
+            number of processes reading granules concurrently, see F_read_granules
+        bbox_prune:
+            if True, only read scanlines intersecting west/east/south/north
         updated on 2019/04/24
         updated on 2019/06/20 to add s5p_product/geos_interp_variables option
         """      
@@ -5677,20 +7873,15 @@ class popy(object):
                                'vza','albedo','surface_pressure','surface_altitude','latc','lonc','qa_value','time_utc',\
                                'column_amount','column_uncertainty','avk','amf_trop','amf_total']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
-        l2g_data = {}
-        for fn in l2_list:
-            self.logger.info('Loading '+os.path.split(fn)[-1])
-            try:
-                outp_nc = self.F_read_S5P_nc(fn,data_fields,data_fields_l2g)
-            except Exception as e:
-                self.logger.warning(fn+' gives error:');
-                self.logger.warning(e)
-                continue
+        l2g_builder = L2GBuilder()
+        for fn,outp_nc in self.F_read_granules(l2_list,'F_read_S5P_nc',(data_fields,data_fields_l2g),
+                                               ncores=ncores,bbox_prune=bbox_prune):
             if geos_interp_variables != []:
                 sounding_interp = F_interp_geos_mat(outp_nc['lonc'],outp_nc['latc'],outp_nc['UTC_matlab_datenum'],\
                                                 geos_dir='/mnt/Data2/GEOS/s5p_interp/',\
                                                 interp_fields=geos_interp_variables,\
-                                                time_collection=geos_time_collection)
+                                                time_collection=geos_time_collection,\
+                                                met_cache=self.met_cache)
                 for var in geos_interp_variables:
                     outp_nc[var] = sounding_interp[var]
             f1 = outp_nc['SolarZenithAngle'] <= maxsza
@@ -5727,7 +7918,8 @@ class popy(object):
                 if key not in {'latitude_bounds','longitude_bounds','time_utc','time','delta_time',\
                                'avk'}:
                     l2g_data0[key] = outp_nc[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -5737,7 +7929,8 @@ class popy(object):
     def F_subset_S5PHCHO(self,l2_list=None,l2_path_pattern=None,
                          path=None,data_fields=None,data_fields_l2g=None,
                          s5p_product='*',geos_interp_variables=None,
-                         geos_time_collection=''):
+                         geos_time_collection='',
+                         ncores=1,bbox_prune=True):
         """ 
         function to subset tropomi no2 level 2 data, calling self.F_read_S5P_nc
         l2_list:
@@ -5759,6 +7952,10 @@ class popy(object):
             the geos class for geos fp data handling
         geos_time_collection:
             choose from inst3, tavg1, tavg3
+        ncores:
+            number of processes reading granules concurrently, see F_read_granules
+        bbox_prune:
+            if True, only read scanlines intersecting west/east/south/north
         updated on 2019/04/30
         updated on 2019/06/20 to add s5p_product/geos_interp_variables option
         updated on 2020/01/15 to simplify to l2_path_pattern
@@ -5837,15 +8034,9 @@ class popy(object):
                                'latc','lonc','qa_value','time','delta_time',\
                                'column_amount','column_uncertainty_doubt','column_uncertainty']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
-        l2g_data = {}
-        for fn in l2_list:
-            self.logger.info('Loading '+os.path.split(fn)[-1])
-            try:
-                outp_nc = self.F_read_S5P_nc(fn,data_fields,data_fields_l2g)
-            except Exception as e:
-                self.logger.warning(fn+' gives error:');
-                self.logger.warning(e)
-                continue
+        l2g_builder = L2GBuilder()
+        for fn,outp_nc in self.F_read_granules(l2_list,'F_read_S5P_nc',(data_fields,data_fields_l2g),
+                                               ncores=ncores,bbox_prune=bbox_prune):
             if outp_nc['column_uncertainty'].shape != outp_nc['column_amount'].shape:
                 self.logger.info('SCD uncertainty is used!')
                 outp_nc['column_uncertainty'] = outp_nc['column_uncertainty'][...,6]
@@ -5853,7 +8044,8 @@ class popy(object):
                 sounding_interp = F_interp_geos_mat(outp_nc['lonc'],outp_nc['latc'],outp_nc['UTC_matlab_datenum'],\
                                                 geos_dir='/mnt/Data2/GEOS/s5p_interp/',\
                                                 interp_fields=geos_interp_variables,
-                                                time_collection=geos_time_collection)
+                                                time_collection=geos_time_collection,\
+                                                met_cache=self.met_cache)
                 for var in geos_interp_variables:
                     outp_nc[var] = sounding_interp[var]
             f1 = outp_nc['SolarZenithAngle'] <= maxsza
@@ -5885,7 +8077,8 @@ class popy(object):
             for key in outp_nc.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time_utc','time','delta_time'}:
                     l2g_data0[key] = outp_nc[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -6031,7 +8224,7 @@ class popy(object):
                                'time','terrain_height','XCO2','XCH4']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
         self.logger.info('Level 2 data are located at '+l2_dir)
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             fn_path = os.path.join(l2_dir,fn)
             self.logger.info('Loading '+fn)
@@ -6071,8 +8264,9 @@ class popy(object):
             for key in outp.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time'}:
                     l2g_data0[key] = outp[key][validmask].squeeze()
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
         
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -6129,7 +8323,7 @@ class popy(object):
                                'time','terrain_height','XCO2','XCH4']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
         self.logger.info('Level 2 data are located at '+l2_dir)
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             fn_path = os.path.join(l2_dir,fn)
             self.logger.info('Loading '+fn)
@@ -6167,7 +8361,8 @@ class popy(object):
             for key in outp.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time'}:
                     l2g_data0[key] = outp[key][validmask].squeeze()
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.logger.warning('adding ones as column_uncertainty for MethaneSAT!')
         l2g_data['column_uncertainty'] = np.ones_like(l2g_data['latc'])
         self.l2g_data = l2g_data
@@ -6231,7 +8426,7 @@ class popy(object):
         
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
         
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             self.logger.info('Loading '+os.path.split(fn)[-1])
             nc = Dataset(fn,'r')
@@ -6272,8 +8467,9 @@ class popy(object):
             l2g_data0['colh2o'] = l2g_data0['colh2o']/18.01528*1e4    
             # hPa to Pa
             l2g_data0['surface_pressure'] = l2g_data0['surface_pressure']*100.0
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
             nc.close()
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -6336,7 +8532,7 @@ class popy(object):
         
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
         
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             self.logger.info('Loading '+os.path.split(fn)[-1])
             nc = Dataset(fn,'r')
@@ -6381,8 +8577,9 @@ class popy(object):
             # sron inconsistent with official data
             l2g_data0['colh2o'] = l2g_data0['colh2o']/6.022141e19       
             l2g_data0['surface_pressure'] = l2g_data0['surface_pressure']*100.0
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
             nc.close()
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -6394,7 +8591,8 @@ class popy(object):
                         if_trop_xch4=False,s5p_product='*',
                         merra2_interp_variables=None,
                         merra2_dir='./',
-                        geos_interp_variables=None,geos_time_collection=''):
+                        geos_interp_variables=None,geos_time_collection='',
+                        ncores=1,bbox_prune=True):
         """ 
         function to subset tropomi ch4 level 2 data, calling self.F_read_S5P_nc
         path: directory containing S5PCH4 level 2 files, OR path to control.txt
@@ -6424,6 +8622,10 @@ class popy(object):
             the geos class for geos fp data handling
         geos_time_collection:
             choose from inst3, tavg1, tavg3
+        ncores:
+            number of processes reading granules concurrently, see F_read_granules
+        bbox_prune:
+            if True, only read scanlines intersecting west/east/south/north
         updated on 2019/05/08
         updated from 2019/05/24 to add tropospheric xch4
         updated on 2019/06/20 to include more interpolation options from geos fp
@@ -6530,16 +8732,9 @@ class popy(object):
                                 'albedo','surface_altitude']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
         
-        l2g_data = {}
-        for fn in l2_list:
-            self.logger.info('Loading '+os.path.split(fn)[-1])
-            
-            try:
-                outp_nc = self.F_read_S5P_nc(fn,data_fields,data_fields_l2g)
-            except Exception as e:
-                self.logger.warning(fn+' gives error:')
-                self.logger.warning(e)
-                continue
+        l2g_builder = L2GBuilder()
+        for fn,outp_nc in self.F_read_granules(l2_list,'F_read_S5P_nc',(data_fields,data_fields_l2g),
+                                               ncores=ncores,bbox_prune=bbox_prune):
             
 #            if if_trop_xch4:
 #                
@@ -6551,14 +8746,16 @@ class popy(object):
                 sounding_interp = F_interp_merra2(outp_nc['lonc'],outp_nc['latc'],outp_nc['UTC_matlab_datenum'],\
                                                 merra2_dir=merra2_dir,\
                                                 interp_fields=merra2_interp_variables,\
-                                                fn_header='MERRA2_300.tavg1_2d_slv_Nx')
+                                                fn_header='MERRA2_300.tavg1_2d_slv_Nx',\
+                                                met_cache=self.met_cache)
                 for var in merra2_interp_variables:
                     outp_nc['merra2_'+var] = sounding_interp[var]
             if geos_interp_variables != []:
                 sounding_interp = F_interp_geos_mat(outp_nc['lonc'],outp_nc['latc'],outp_nc['UTC_matlab_datenum'],\
                                                 geos_dir='/mnt/Data2/GEOS/s5p_interp/',\
                                                 interp_fields=geos_interp_variables,\
-                                                time_collection=geos_time_collection)
+                                                time_collection=geos_time_collection,\
+                                                met_cache=self.met_cache)
                 for var in geos_interp_variables:
                     outp_nc[var] = sounding_interp[var]
                 outp_nc['merra2_TROPPT'] = outp_nc['TROPPT']
@@ -6611,7 +8808,8 @@ class popy(object):
                     l2g_data0['methane_ap_column_strat'][il2] = f(tropp)
                 del l2g_data0['dry_air_subcolumns']
                 del l2g_data0['methane_profile_apriori']                
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -6621,9 +8819,14 @@ class popy(object):
     def F_subset_S5PCO(self,l2_list=None,l2_path_pattern=None,
                        path=None,data_fields=None,data_fields_l2g=None,
                        s5p_product='*',geos_interp_variables=None,
-                       geos_time_collection=''):
+                       geos_time_collection='',
+                       ncores=1,bbox_prune=True):
         """ 
         function to subset tropomi co level 2 data, calling self.F_read_S5P_nc
+        ncores:
+            number of processes reading granules concurrently, see F_read_granules
+        bbox_prune:
+            if True, only read scanlines intersecting west/east/south/north
         created on 2019/08/12 based on F_subset_S5PNO2
         updated on 2022/06/24
         """    
@@ -6699,20 +8902,15 @@ class popy(object):
                                'column_amount_uncorrected','column_amount','column_uncertainty','avk']
         self.logger.info('Read, subset, and store level 2 data to l2g_data')
         
-        l2g_data = {}
-        for fn in l2_list:
-            self.logger.info('Loading '+os.path.split(fn)[-1])
-            try:
-                outp_nc = self.F_read_S5P_nc(fn,data_fields,data_fields_l2g)
-            except Exception as e:
-                self.logger.warning(fn+' gives error:');
-                self.logger.warning(e)
-                continue
+        l2g_builder = L2GBuilder()
+        for fn,outp_nc in self.F_read_granules(l2_list,'F_read_S5P_nc',(data_fields,data_fields_l2g),
+                                               ncores=ncores,bbox_prune=bbox_prune):
             if geos_interp_variables != []:
                 sounding_interp = F_interp_geos_mat(outp_nc['lonc'],outp_nc['latc'],outp_nc['UTC_matlab_datenum'],\
                                                 geos_dir='/mnt/Data2/GEOS/s5p_interp/',\
                                                 interp_fields=geos_interp_variables,\
-                                                time_collection=geos_time_collection)
+                                                time_collection=geos_time_collection,\
+                                                met_cache=self.met_cache)
                 for var in geos_interp_variables:
                     outp_nc[var] = sounding_interp[var]
             f1 = outp_nc['SolarZenithAngle'] <= maxsza
@@ -6747,7 +8945,8 @@ class popy(object):
             for key in outp_nc.keys():
                 if key not in {'latitude_bounds','longitude_bounds','time_utc','time','delta_time','avk'}:
                     l2g_data0[key] = outp_nc[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         # the inconsistency causes trouble in 2021/07 when the transition happened, just remove uncorrected vcd
         if 'column_amount_uncorrected' in l2g_data.keys():
             l2g_data.pop('column_amount_uncorrected');
@@ -6814,7 +9013,7 @@ class popy(object):
         end_date = self.end_python_datetime.date()
         days = (end_date-start_date).days+1
         DATES = [start_date + datetime.timedelta(days=d) for d in range(days)]
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             file_path = os.path.join(l2_dir,fn)
             self.logger.info('loading '+fn)
@@ -6856,7 +9055,8 @@ class popy(object):
             for key in outp_h5.keys():
                 if key not in {'VcdQualityFlags','XTrackQualityFlags','FoV75CornerLatitude','FoV75CornerLongitude','TimeUTC','BEHRQualityFlags'}:
                     l2g_data0[key] = outp_h5[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         # standardize pressure from hPa to Pa
         l2g_data['surface_pressure'] = l2g_data['surface_pressure']*100
         l2g_data['tropopause_pressure'] = l2g_data['tropopause_pressure']*100
@@ -6895,7 +9095,8 @@ class popy(object):
             
         
     def F_subset_OMNO2(self,path,l2_path_structure=None,
-                       data_fields=None,data_fields_l2g=None):
+                       data_fields=None,data_fields_l2g=None,
+                       ncores=1,bbox_prune=True):
         """ 
         function to subset omno2, nasa sp level 2 data, calling self.F_read_he5
         path:
@@ -6908,6 +9109,10 @@ class popy(object):
             a list of strings indicating which fields in the l2 file to keep
         data_fields_l2g:
             shortened data_fields used in the output dictionary l2g_data
+        ncores:
+            number of processes reading granules concurrently, see F_read_granules
+        bbox_prune:
+            if True, only read scanlines intersecting west/east/south/north
         updated on 2019/07/17
         modified on 2020/05/19 to include data_fields as input
         """      
@@ -6958,15 +9163,10 @@ class popy(object):
         end_date = self.end_python_datetime.date()
         days = (end_date-start_date).days+1
         DATES = [start_date + datetime.timedelta(days=d) for d in range(days)]
-        l2g_data = {}
-        for fn in l2_list:
-            file_path = os.path.join(l2_dir,fn)
-            self.logger.info('loading '+fn)
-            try:
-                outp_he5 = self.F_read_he5(file_path,swathname,data_fields,geo_fields,data_fields_l2g,geo_fields_l2g)
-            except:
-                self.logger.warning(fn+' cannot be read!')
-                continue
+        l2g_builder = L2GBuilder()
+        for fn,outp_he5 in self.F_read_granules([os.path.join(l2_dir,fn) for fn in l2_list],'F_read_he5',
+                                                (swathname,data_fields,geo_fields,data_fields_l2g,geo_fields_l2g),
+                                                ncores=ncores,bbox_prune=bbox_prune):
             f1 = outp_he5['SolarZenithAngle'] <= maxsza
             f2 = outp_he5['cloud_fraction'] <= maxcf
             f3 = (outp_he5['VcdQualityFlags'] == 0) & \
@@ -6999,7 +9199,8 @@ class popy(object):
             for key in outp_he5.keys():
                 if key not in {'VcdQualityFlags','XTrackQualityFlags','FoV75CornerLatitude','FoV75CornerLongitude','TimeUTC'}:
                     l2g_data0[key] = outp_he5[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -7069,7 +9270,7 @@ class popy(object):
         end_date = self.end_python_datetime.date()
         days = (end_date-start_date).days+1
         DATES = [start_date + datetime.timedelta(days=d) for d in range(days)]
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             file_path = os.path.join(l2_dir,fn)
             self.logger.info('loading '+fn)
@@ -7106,7 +9307,8 @@ class popy(object):
             for key in outp_he5.keys():
                 if key not in {'MainDataQualityFlag','PixelCornerLatitudes','PixelCornerLongitudes','TimeUTC'}:
                     l2g_data0[key] = outp_he5[key][validmask]
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -7134,7 +9336,7 @@ class popy(object):
        end_date = self.end_python_datetime.date()
        days = (end_date-start_date).days+1
        DATES = [start_date + datetime.timedelta(days=d) for d in range(days)]
-       l2g_data = {}
+       l2g_builder = L2GBuilder()
        for DATE in DATES:
            date_dir = l2_dir+DATE.strftime("%Y/%m/%d/")
            flist = glob.glob(date_dir+'*.he5')
@@ -7171,7 +9373,8 @@ class popy(object):
                for key in outp_he5.keys():
                    if key not in {'MainDataQualityFlag','PixelCornerLatitudes','PixelCornerLongitudes','TimeUTC'}:
                        l2g_data0[key] = outp_he5[key][validmask]
-               l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+               l2g_builder.append(l2g_data0)
+       l2g_data = l2g_builder.finalize()
        self.l2g_data = l2g_data
        if not l2g_data:
            self.nl2 = 0
@@ -7219,7 +9422,7 @@ class popy(object):
         east = self.east
         south = self.south
         north = self.north
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         for fn in l2_list:
             file_path = os.path.join(l2_dir,fn)
             self.logger.info('loading '+fn)
@@ -7292,7 +9495,8 @@ class popy(object):
             l2g_data0['utc'] = outp['UTC_matlab_datenum'][validmask]
             l2g_data0['dofs'] = outp['DOFs'][validmask]
             
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -7361,7 +9565,7 @@ class popy(object):
         east = self.east
         south = self.south
         north = self.north
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         pixel_lut = loadmat(ellipse_lut_path)
         f_uuu = RegularGridInterpolator((np.arange(-90.,91.),np.arange(1,121)),pixel_lut['uuu4']) 
         f_vvv = RegularGridInterpolator((np.arange(-90.,91.),np.arange(1,121)),pixel_lut['vvv4']) 
@@ -7417,8 +9621,9 @@ class popy(object):
             l2g_data0['cloud_fraction'] = outp['cloud_coverage'][validmask]/100
             if version in ['4','4R']:
                 l2g_data0['surface_altitude'] = outp['ground_height'][validmask]*1e3 # km to m
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
         
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -7482,7 +9687,7 @@ class popy(object):
         east = self.east
         south = self.south
         north = self.north
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         pixel_lut = loadmat(ellipse_lut_path)
         f_uuu = RegularGridInterpolator((np.arange(-90.,91.),np.arange(1,271)),pixel_lut['uuu4']) 
         f_vvv = RegularGridInterpolator((np.arange(-90.,91.),np.arange(1,271)),pixel_lut['vvv4']) 
@@ -7547,8 +9752,9 @@ class popy(object):
                 l2g_data0['sfcvmr'][io] = xretv[0]
                 l2g_data0['surface_pressure'][io] = pressure[0]
             
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
         
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -7610,7 +9816,7 @@ class popy(object):
         east = self.east
         south = self.south
         north = self.north
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         pixel_lut = loadmat(ellipse_lut_path)
         f_uuu = RegularGridInterpolator((np.arange(-90.,91.),np.arange(1,271)),pixel_lut['uuu4']) 
         f_vvv = RegularGridInterpolator((np.arange(-90.,91.),np.arange(1,271)),pixel_lut['vvv4']) 
@@ -7702,7 +9908,8 @@ class popy(object):
             # a priori type in string format might slow down the whole thing
             #l2g_data0['xa_type'] = outp['xa_Type'][validmask]
             
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -7755,7 +9962,7 @@ class popy(object):
         east = self.east
         south = self.south
         north = self.north
-        l2g_data = {}
+        l2g_builder = L2GBuilder()
         pixel_lut = loadmat(ellipse_lut_path)
         f_uuu = RegularGridInterpolator((np.arange(-90.,91.),np.arange(1,271)),pixel_lut['uuu4']) 
         f_vvv = RegularGridInterpolator((np.arange(-90.,91.),np.arange(1,271)),pixel_lut['vvv4']) 
@@ -7844,7 +10051,8 @@ class popy(object):
             # a priori type in string format might slow down the whole thing
             #l2g_data0['xa_type'] = outp['xa_Type'][validmask]
             
-            l2g_data = self.F_merge_l2g_data(l2g_data,l2g_data0)
+            l2g_builder.append(l2g_data0)
+        l2g_data = l2g_builder.finalize()
         self.l2g_data = l2g_data
         if not l2g_data:
             self.nl2 = 0
@@ -8152,6 +10360,57 @@ class popy(object):
             else:# otherwise, the order of 2d array is COMPLETELY screwed
                 l2g_data[key] = np.asfortranarray(l2g_data[key])
         scipy.io.savemat(file_path,{'output_subset':l2g_data})
+    
+    def F_save_l2g_to_store(self,store_dir,data_fields=None,data_fields_l2g=None,chunk_size=65536):
+        """
+        save l2g dictionary to a columnar l2g store, i.e., a directory with one little-endian
+        .npy per field and a manifest.json with per-field min/max and per-chunk min/max of
+        latc, lonc and UTC_matlab_datenum, read by F_l2g_store_reader/F_mat_reader
+        store_dir:
+            directory to save, e.g., one per month
+        data_fields and data_fields_l2g:
+            see F_save_l2g_to_mat
+        chunk_size:
+            number of pixels per chunk of the manifest statistics
+        created on 2026/10/17
+        """
+        if not self.l2g_data:
+            self.logger.warning('l2g_data is empty. Nothing to save.')
+            return
+        import json
+        data_fields = data_fields or []
+        data_fields_l2g = data_fields_l2g or []
+        l2g_data = self.l2g_data.copy()
+        for i in range(len(data_fields)):
+            if data_fields[i] in l2g_data.keys():
+                l2g_data[data_fields_l2g[i]] = l2g_data.pop(data_fields[i])
+        if not os.path.exists(store_dir):
+            os.makedirs(store_dir)
+        def F_minmax(v):
+            if v.dtype.kind not in 'iufb' or v.size == 0 or np.all(np.isnan(v)):
+                return None
+            return [float(np.nanmin(v)),float(np.nanmax(v))]
+        nl2 = len(l2g_data['latc'])
+        manifest = {'nl2':nl2,'chunk_size':chunk_size,'fields':{},'chunks':[]}
+        for key in l2g_data.keys():
+            # same precision as F_save_l2g_to_mat
+            if key not in {'UTC_matlab_datenum','utc','ift','across_track_position','xa_type'}:
+                v = np.asarray(l2g_data[key],dtype='<f4')
+            else:
+                v = np.asarray(l2g_data[key])
+                v = v.astype(v.dtype.newbyteorder('<'),copy=False)
+            np.save(os.path.join(store_dir,key+'.npy'),v)
+            minmax = F_minmax(v) or [None,None]
+            manifest['fields'][key] = {'dtype':v.dtype.str,'shape':list(v.shape),
+                                       'min':minmax[0],'max':minmax[1]}
+        for start in range(0,nl2,chunk_size):
+            stop = min(start+chunk_size,nl2)
+            manifest['chunks'].append({'start':start,'stop':stop,
+                                       'stats':{k:F_minmax(np.asarray(l2g_data[k][start:stop],dtype=np.float64))
+                                                for k in ['latc','lonc','UTC_matlab_datenum'] if k in l2g_data.keys()}})
+        # manifest is written last, so an incomplete store is never read
+        with open(os.path.join(store_dir,'manifest.json'),'w') as f:
+            json.dump(manifest,f)
         
         
     def F_generalized_SG(self,x,y,fwhmx,fwhmy):
@@ -8259,7 +10518,7 @@ class popy(object):
                             surface_vmr_field='surface_vmr',
                             l2g_data=None,block_length=200,ncores=0,
                             simplify_oversampling_list=True,if_daily=True,
-                            do_terrain=False):
+                            do_terrain=False,executor=None):
         '''
         call F_parallel_regrid to oversample x/y-flux daily and calculate d(x-flux)/dx
         and d(y-flux)dy to form daily divergence map. Average daily divergence to
@@ -8286,6 +10545,8 @@ class popy(object):
             if calculate spatial gradient every day. if False, calculate spatial gradient on the oversampled field
         do_terrain:
             calculate the terrain correction term or not
+        executor:
+            optional RegridExecutor reused by the daily F_parallel_regrid calls
         created on 2020/08/16
         added terrain on 2020/09/28
         '''
@@ -8334,7 +10595,8 @@ class popy(object):
         if not if_daily:
             l3_data = self.F_parallel_regrid(l2g_data=l2g_data,
                                              block_length=block_length,
-                                             ncores=ncores)
+                                             ncores=ncores,
+                                             executor=executor)
             # d(x_flux)/dx
             xdiv = np.full(l3_data['x_flux'].shape,np.nan,dtype=np.float64)
             for irow in range(self.nrows):
@@ -8363,7 +10625,8 @@ class popy(object):
             daily_l2g_data = {k:v[mask,] for (k,v) in l2g_data.items()}
             daily_l3_data = self.F_parallel_regrid(l2g_data=daily_l2g_data,
                                                    block_length=block_length,
-                                                   ncores=ncores)
+                                                   ncores=ncores,
+                                                   executor=executor)
             # d(x_flux)/dx
             xdiv = np.full(daily_l3_data['x_flux'].shape,np.nan,dtype=np.float64)
             for irow in range(self.nrows):
@@ -8410,7 +10673,447 @@ class popy(object):
         self.oversampling_list = oversampling_list_full
         return l3_data
         
-    def F_parallel_regrid(self,l2g_data=None,block_length=200,ncores=None):
+    def F_build_regrid_operator(self,l2g_data=None):
+        '''
+        build the sparse pixel-to-grid weight operator (see F_block_regrid_operator) on the
+        whole l3 mesh, so that F_parallel_regrid(operator=W) can oversample any field of the
+        same pixels without repeating the geometry and kernel work
+        l2g_data:
+            l2g_data in popy-compatible dict format. by default use self.l2g_data. pixels are
+            filtered by the lat/lon box and time interval in the same way as F_parallel_regrid
+        return:
+            scipy.sparse.csr_matrix of shape (nrows*ncols, number of valid pixels)
+        '''
+        if l2g_data == None:
+            l2g_data = self.l2g_data
+        if 'UTC_matlab_datenum' not in l2g_data.keys():
+            l2g_data['UTC_matlab_datenum'] = l2g_data.pop('utc')
+        if self.proj is not None and 'xc' not in l2g_data.keys():
+            self.logger.info('mapping pixel from latlon to xy')
+            l2g_data['xc'],l2g_data['yc'] = self.proj(l2g_data['lonc'],l2g_data['latc'])
+            l2g_data['xr'],l2g_data['yr'] = self.proj(l2g_data['lonr'],l2g_data['latr'])
+        validmask = self.F_l2g_valid_mask(l2g_data)
+        l2g_data = {k:v[validmask,] for (k,v) in l2g_data.items()}
+        self.logger.info('building regrid operator for %d pixels on a %d x %d grid'%(len(l2g_data['latc']),self.nrows,self.ncols))
+        return F_block_regrid_operator(l2g_data,self.xmesh,self.ymesh,
+                                       self.pixel_shape,self.error_model,
+                                       self.k1,self.k2,self.k3,self.xmargin,self.ymargin,
+                                       inflatex=self.inflatex,inflatey=self.inflatey,
+                                       sg_scaling=self.sg_scaling,sg_tol=self.sg_tol)
+    
+    def F_l2g_valid_mask(self,l2g_data):
+        '''
+        mask of pixels within the lat/lon box and time interval, as used by F_parallel_regrid
+        '''
+        tmplon = l2g_data['lonc']-self.west
+        tmplon[tmplon < 0] = tmplon[tmplon < 0]+360
+        validmask = (tmplon >= 0) & (tmplon <= self.east-self.west) &\
+        (l2g_data['latc'] >= self.south) & (l2g_data['latc'] <= self.north) &\
+        (l2g_data['UTC_matlab_datenum'] >= self.start_matlab_datenum) &\
+        (l2g_data['UTC_matlab_datenum'] <= self.end_matlab_datenum)
+        return validmask
+    
+    def F_regrid_with_operator(self,l2g_data,operator,oversampling_list,bin_by=None,bin_edges=None):
+        '''
+        oversample l2g fields by sparse mat-vec with an operator from F_build_regrid_operator.
+        l2g_data has to contain exactly the pixels the operator was built from
+        bin_by/bin_edges:
+            see F_block_regrid_ccm. pixels out of a bin are zeroed in the mat-vec
+        '''
+        nl2 = len(l2g_data['latc'])
+        if operator.shape != (self.nrows*self.ncols,nl2):
+            self.logger.error('operator shape {} does not match {} cells and {} pixels'.format(
+                operator.shape,self.nrows*self.ncols,nl2))
+            return
+        uncertainty_weight = F_uncertainty_weight(l2g_data,self.error_model)
+        if uncertainty_weight is None:
+            return
+        grid_flds,pcld_idx = F_block_grid_fields(l2g_data,oversampling_list,self.error_model)
+        shape = (self.nrows,self.ncols)
+        # W holds SG/area/uncertainty, so SG is recovered by scaling pixels back
+        sample_scale = F_pixel_area(l2g_data,self.pixel_shape)*uncertainty_weight
+        if bin_by is None:
+            pixel_masks = [np.ones(nl2)]
+        else:
+            pixel_bin = F_bin_index(l2g_data[bin_by],bin_edges)
+            pixel_masks = [np.float64(pixel_bin == ibin) for ibin in range(len(bin_edges)-1)]
+        l3_bins = []
+        for pixel_mask in pixel_masks:
+            total_sample_weight = (operator @ pixel_mask).reshape(shape)
+            num_samples = (operator @ (pixel_mask*sample_scale)).reshape(shape)
+            sum_aboves = [(operator @ (pixel_mask*grid_flds[:,ivar])).reshape(shape) for ivar in range(len(oversampling_list))]
+            if 'cloud_fraction' in oversampling_list and pcld_idx > 0:
+                pres_mask = pixel_mask*(l2g_data['cloud_fraction'] > 0.0)
+                pres_total_sample_weight = (operator @ pres_mask).reshape(shape)
+                pres_num_samples = (operator @ (pres_mask*sample_scale)).reshape(shape)
+                pres_sum_aboves = (operator @ (pres_mask*grid_flds[:,pcld_idx])).reshape(shape)
+            else:
+                pres_total_sample_weight = np.zeros(shape)
+                pres_num_samples = np.zeros(shape)
+                pres_sum_aboves = np.zeros(shape)
+            l3_bins.append(F_block_l3_from_sums(self.xmesh,self.ymesh,oversampling_list,
+                                                total_sample_weight,num_samples,sum_aboves,
+                                                pres_total_sample_weight,pres_num_samples,pres_sum_aboves))
+        if bin_by is None:
+            return l3_bins[0]
+        return {k:(v if k in ['xmesh','ymesh'] else np.stack([l3_bin[k] for l3_bin in l3_bins]))
+                for (k,v) in l3_bins[0].items()}
+    
+    def F_wrap_l3_data(self,l3_data,bin_edges=None,proj=None,bin_by=None):
+        '''
+        wrap a l3_data dict from the regrid engines into Level3_Data. if bin_edges is provided,
+        fields have a leading bin axis and a list of Level3_Data, one for each bin, is returned.
+        if bin_by is UTC_matlab_datenum, each bin's start/end_python_datetime follow its edges
+        '''
+        l3_data['xgrid'] = self.xgrid
+        l3_data['ygrid'] = self.ygrid
+        if bin_edges is None:
+            l3_data_list = [l3_data]
+            time_coverages = [(self.start_python_datetime,self.end_python_datetime)]
+        else:
+            l3_data_list = [{k:(v[ibin] if k not in ['xgrid','ygrid','xmesh','ymesh'] else v)
+                             for (k,v) in l3_data.items()} for ibin in range(len(bin_edges)-1)]
+            if bin_by == 'UTC_matlab_datenum':
+                time_coverages = [(datedev_py(bin_edges[ibin]),datedev_py(bin_edges[ibin+1]))
+                                  for ibin in range(len(bin_edges)-1)]
+            else:
+                time_coverages = [(self.start_python_datetime,self.end_python_datetime)]*len(l3_data_list)
+        l3_objects = []
+        for (l3_data,time_coverage) in zip(l3_data_list,time_coverages):
+            l3_object = Level3_Data(grid_size=self.grid_size,
+                                    start_python_datetime=time_coverage[0],
+                                    end_python_datetime=time_coverage[1],
+                                    instrum=self.instrum,product=self.product,proj=proj)
+            l3_object.assimilate(l3_data)
+            l3_object.check()
+            l3_object.oversampling_list = self.oversampling_list_final
+            l3_objects.append(l3_object)
+        if bin_edges is None:
+            return l3_objects[0]
+        return l3_objects
+    
+    def F_shared_memory_regrid(self,l2g_data,oversampling_list,
+                               pixel_west,pixel_east,pixel_south,pixel_north,
+                               nblock_row,nblock_col,ncores,engine='loop',
+                               bin_by=None,bin_edges=None,executor=None):
+        '''
+        shared memory backend of F_parallel_regrid. pixels are sorted by latitude and only the
+        columns needed by F_block_regrid_ccm are copied, once, into shared memory. each task
+        is a l3 block plus the index range of sorted pixels that may overlap it
+        pixel_west/east/south/north:
+            pixel extents including x/ymargin, used to select pixels for each block
+        executor:
+            optional RegridExecutor whose pool is used instead of a new one
+        return:
+            l3_data dict on the full mesh
+        '''
+        keys = {'latc','lonc','latr','lonr','u','v','t','xc','yc','xr','yr',
+                'column_uncertainty','cloud_fraction'}.union(oversampling_list)
+        if bin_by is not None:
+            keys.add(bin_by)
+            out_shape = (len(bin_edges)-1,self.nrows,self.ncols)
+        else:
+            out_shape = (self.nrows,self.ncols)
+        order = np.argsort(l2g_data['latc'],kind='stable')
+        columns = {k:v[order,] for (k,v) in l2g_data.items() if k in keys}
+        columns['pixel_west'] = pixel_west[order]
+        columns['pixel_east'] = pixel_east[order]
+        columns['pixel_south'] = pixel_south[order]
+        columns['pixel_north'] = pixel_north[order]
+        sorted_latc = columns['latc']
+        max_half_height = np.max(np.maximum(columns['pixel_north']-sorted_latc,
+                                            sorted_latc-columns['pixel_south']))
+        output_keys = oversampling_list+['total_sample_weight','num_samples']
+        if 'cloud_fraction' in oversampling_list:
+            output_keys = output_keys+['pres_total_sample_weight','pres_num_samples']
+        l2g_shm,l2g_spec = F_shared_memory_publish(columns)
+        del columns
+        out_shm,out_spec = F_shared_memory_publish({k:np.zeros(out_shape) for k in output_keys})
+        try:
+            row_splits = np.array_split(np.arange(self.nrows),nblock_row)
+            col_splits = np.array_split(np.arange(self.ncols),nblock_col)
+            args = []
+            iblock = 0
+            for rows in row_splits:
+                # sorted by latc, so candidate pixels of a block row are contiguous
+                i0 = np.searchsorted(sorted_latc,self.ygrid[rows[0]]-max_half_height,side='left')
+                i1 = np.searchsorted(sorted_latc,self.ygrid[rows[-1]]+max_half_height,side='right')
+                for cols in col_splits:
+                    args.append((l2g_spec,out_spec,i0,i1,rows[0],rows[-1]+1,cols[0],cols[-1]+1,
+                                 self.xgrid,self.ygrid,oversampling_list,
+                                 self.pixel_shape,self.error_model,
+                                 self.k1,self.k2,self.k3,self.xmargin,self.ymargin,
+                                 iblock,self.verbose,self.inflatex,self.inflatey,self.sg_scaling,engine,
+                                 bin_by,bin_edges,self.sg_tol))
+                    iblock += 1
+            with F_regrid_pool(ncores,executor) as pp:
+                block_npix = pp.map(F_block_regrid_shared_wrapper,args)
+            for (iblock,npix) in enumerate(block_npix):
+                self.logger.info('block %d'%(iblock+1)+' contains %d pixels'%npix)
+            l3_data = {k:np.ndarray(out_spec[k][1],dtype=out_spec[k][2],buffer=out_shm[k].buf).copy()
+                       for k in output_keys}
+        finally:
+            for shm in list(l2g_shm.values())+list(out_shm.values()):
+                shm.close()
+                shm.unlink()
+        l3_data['xmesh'] = self.xmesh
+        l3_data['ymesh'] = self.ymesh
+        return l3_data
+    
+    def F_cost_blocks(self,pixel_west,pixel_east,pixel_south,pixel_north,
+                      nblock_row,nblock_col,max_block_cost=None):
+        '''
+        cut the l3 mesh into blocks and estimate the cost of each block as the number of
+        l3 cells covered by the pixel kernel patches in it (pixel count x mean patch area)
+        pixel_west/east/south/north:
+            pixel extents including x/ymargin
+        nblock_row/nblock_col:
+            initial blocks, as in F_parallel_regrid
+        max_block_cost:
+            if provided, blocks costing more are split into quadrants (quadtree) until they
+            cost less or are too small to split. a side is only halved if it keeps >= 2 cells,
+            as F_block_regrid_ccm takes the grid size from the block mesh. like a smaller
+            block_length, this moves block boundaries, where kernel patches of pixels are cut
+        return:
+            a list of dicts with row0, row1, col0, col1, mask (pixels overlapping the block),
+            npix and cost, ordered by decreasing cost
+        created on 2026/10/17
+        '''
+        dx = np.abs(np.median(np.diff(self.xgrid))) if self.ncols > 1 else self.grid_size
+        dy = np.abs(np.median(np.diff(self.ygrid))) if self.nrows > 1 else self.grid_size
+        def F_block(row0,row1,col0,col1):
+            x0 = self.xgrid[col0]-dx/2;x1 = self.xgrid[col1-1]+dx/2
+            y0 = self.ygrid[row0]-dy/2;y1 = self.ygrid[row1-1]+dy/2
+            mask = (pixel_west <= self.xgrid[col1-1]) & (pixel_east >= self.xgrid[col0]) &\
+            (pixel_south <= self.ygrid[row1-1]) & (pixel_north >= self.ygrid[row0])
+            # kernel patch of each pixel clipped by the block, in l3 cells
+            patch = (np.minimum(pixel_east[mask],x1)-np.maximum(pixel_west[mask],x0))/dx*\
+            (np.minimum(pixel_north[mask],y1)-np.maximum(pixel_south[mask],y0))/dy
+            return dict(row0=row0,row1=row1,col0=col0,col1=col1,mask=mask,
+                        npix=int(np.sum(mask)),cost=float(np.sum(np.maximum(patch,1.))))
+        row_splits = np.array_split(np.arange(self.nrows),nblock_row)
+        col_splits = np.array_split(np.arange(self.ncols),nblock_col)
+        todo = [F_block(rows[0],rows[-1]+1,cols[0],cols[-1]+1) for rows in row_splits for cols in col_splits]
+        blocks = []
+        while len(todo) > 0:
+            block = todo.pop()
+            nr = block['row1']-block['row0'];nc = block['col1']-block['col0']
+            if max_block_cost is None or block['cost'] <= max_block_cost or (nr < 4 and nc < 4):
+                blocks.append(block)
+                continue
+            rmid = block['row0']+nr//2 if nr >= 4 else block['row1']
+            cmid = block['col0']+nc//2 if nc >= 4 else block['col1']
+            for (row0,row1) in [(block['row0'],rmid),(rmid,block['row1'])]:
+                for (col0,col1) in [(block['col0'],cmid),(cmid,block['col1'])]:
+                    if row1 > row0 and col1 > col0:
+                        todo.append(F_block(row0,row1,col0,col1))
+        blocks.sort(key=lambda b:b['cost'],reverse=True)
+        return blocks
+    
+    def F_cost_scheduled_regrid(self,l2g_data,oversampling_list,
+                                pixel_west,pixel_east,pixel_south,pixel_north,
+                                nblock_row,nblock_col,ncores,engine='loop',
+                                bin_by=None,bin_edges=None,chunksize=1,max_block_cost=None,
+                                executor=None):
+        '''
+        cost-model backend of F_parallel_regrid. blocks from F_cost_blocks are dispatched
+        largest-first with imap_unordered and written into the full mesh as they return.
+        per-block timings are logged and saved in self.block_timings
+        chunksize:
+            chunksize of imap_unordered
+        max_block_cost:
+            see F_cost_blocks
+        executor:
+            optional RegridExecutor whose pool is used instead of a new one
+        return:
+            l3_data dict on the full mesh
+        created on 2026/10/17
+        '''
+        import time
+        blocks = self.F_cost_blocks(pixel_west,pixel_east,pixel_south,pixel_north,
+                                    nblock_row,nblock_col,max_block_cost)
+        self.nblock = len(blocks)
+        self.logger.info('l3 mesh grid is cut into %d blocks, largest cost %.3g, median cost %.3g'%(
+            len(blocks),blocks[0]['cost'],np.median([b['cost'] for b in blocks])))
+        def F_args():
+            for (itask,b) in enumerate(blocks):
+                mask = b.pop('mask')
+                yield (itask,{k:v[mask,] for (k,v) in l2g_data.items()},
+                       self.xmesh[b['row0']:b['row1'],b['col0']:b['col1']],
+                       self.ymesh[b['row0']:b['row1'],b['col0']:b['col1']],
+                       oversampling_list,self.pixel_shape,self.error_model,
+                       self.k1,self.k2,self.k3,self.xmargin,self.ymargin,itask,self.verbose,
+                       self.inflatex,self.inflatey,self.sg_scaling,engine,bin_by,bin_edges,
+                       self.sg_tol)
+        l3_data = {}
+        t0 = time.time()
+        with F_regrid_pool(ncores,executor) as pp:
+            for (itask,l3_block,seconds) in pp.imap_unordered(F_block_regrid_timed_wrapper,F_args(),chunksize=chunksize):
+                b = blocks[itask]
+                b['seconds'] = seconds
+                self.logger.info('block %d (%d pixels, cost %.3g) took %.3f s'%(itask+1,b['npix'],b['cost'],seconds))
+                for (key,value) in l3_block.items():
+                    if key in ['xmesh','ymesh']:
+                        continue
+                    if key not in l3_data.keys():
+                        l3_data[key] = np.zeros(value.shape[:-2]+(self.nrows,self.ncols),dtype=value.dtype)
+                    l3_data[key][...,b['row0']:b['row1'],b['col0']:b['col1']] = value
+        self.block_timings = blocks
+        seconds = np.array([b['seconds'] for b in blocks])
+        self.logger.info('%d blocks took %.2f s on %d cores, longest block %.3f s, mean %.3f s'%(
+            len(blocks),time.time()-t0,ncores,seconds.max(),seconds.mean()))
+        l3_data['xmesh'] = self.xmesh
+        l3_data['ymesh'] = self.ymesh
+        return l3_data
+    
+    def F_time_bin_edges(self,time_bins):
+        '''
+        UTC_matlab_datenum bin edges for time-binned oversampling
+        time_bins:
+            monotonically increasing matlab datenum edges, or a pandas period frequency (e.g., 'D',
+            'W', 'M', 'Q') that cuts [start_python_datetime, end_python_datetime] into calendar
+            periods. the first and last bins are clipped to the popy time range
+        created on 2026/10/17
+        '''
+        if not isinstance(time_bins,str):
+            return np.asarray(time_bins,dtype=np.float64)
+        import pandas as pd
+        periods = pd.period_range(self.start_python_datetime,self.end_python_datetime,freq=time_bins)
+        inner_edges = [datetime2datenum(p.start_time.to_pydatetime()) for p in periods[1:]]
+        inner_edges = [e for e in inner_edges if self.start_matlab_datenum < e < self.end_matlab_datenum]
+        return np.array([self.start_matlab_datenum]+inner_edges+[self.end_matlab_datenum])
+    
+    def F_stream_regrid(self,granule_iterator,engine='loop',time_bins=None):
+        '''
+        out-of-core regrid. granules are read and folded one at a time into running sums
+        (total_sample_weight, num_samples, sum_aboves and pres_*) on the whole l3 grid, which
+        are divided once at the end. each granule is regridded only on the rows/columns its
+        pixel kernels reach, so peak memory is the grid plus one granule
+        granule_iterator:
+            iterable of l2g_data dicts (e.g., one per orbit or day), or of l2g file paths that
+            are read by F_mat_reader (.mat files or l2g store directories)
+        engine:
+            'loop' or 'vectorized', see F_block_regrid_ccm
+        time_bins:
+            if provided, datenum edges or a pandas frequency, see F_time_bin_edges. the sums get a
+            leading time bin axis and a list of Level3_Data, one for each period, is returned
+        return:
+            Level3_Data of all granules merged. pixels are first filtered by the lat/lon box and
+            time interval (F_l2g_valid_mask) as F_parallel_regrid does with ncores > 0, so the
+            result equals F_parallel_regrid(ncores=0) on the merged, filtered pixels. a field
+            missing from some granules is averaged over the granules that have it
+        created on 2026/10/17
+        '''
+        if time_bins is None:
+            bin_by = None;bin_edges = None
+            shape = (self.nrows,self.ncols)
+        else:
+            bin_by = 'UTC_matlab_datenum'
+            bin_edges = self.F_time_bin_edges(time_bins)
+            shape = (len(bin_edges)-1,self.nrows,self.ncols)
+        total_sample_weight = np.zeros(shape)
+        num_samples = np.zeros(shape)
+        sum_aboves = [np.zeros(shape) for key in self.oversampling_list]
+        pres_total_sample_weight = np.zeros(shape)
+        pres_num_samples = np.zeros(shape)
+        pres_sum_aboves = np.zeros(shape)
+        # total_sample_weight of fields missing from some granules, counting only granules that have them
+        field_sample_weights = {}
+        found_keys = set()
+        ngranule = 0
+        nl2 = 0
+        for granule in granule_iterator:
+            if isinstance(granule,str):
+                self.F_mat_reader(granule)
+                l2g_data = self.l2g_data
+            else:
+                l2g_data = granule
+            if not l2g_data:
+                continue
+            if 'UTC_matlab_datenum' not in l2g_data.keys():
+                l2g_data['UTC_matlab_datenum'] = l2g_data.pop('utc')
+            oversampling_list = self.oversampling_list.copy()
+            for key in self.oversampling_list:
+                if key not in l2g_data.keys():
+                    oversampling_list.remove(key)
+                    self.logger.warning('You asked to oversample '+key+', but I cannot find it in your data!')
+            validmask = self.F_l2g_valid_mask(l2g_data)
+            if np.sum(validmask) == 0:
+                continue
+            l2g_data = {k:v[validmask,] for (k,v) in l2g_data.items()}
+            if 'lonr' in l2g_data.keys():
+                pixel_width = np.ptp(l2g_data['lonr'],axis=1)
+                pixel_height = np.ptp(l2g_data['latr'],axis=1)
+            else:
+                pixel_width = np.max([l2g_data['u'],l2g_data['v']],axis=0)*3
+                pixel_height = pixel_width
+            # rows/columns reached by the kernels, padded so that no patch is cut
+            col0 = max(np.searchsorted(self.xgrid,np.min(l2g_data['lonc']-pixel_width/2*self.xmargin))-2,0)
+            col1 = min(np.searchsorted(self.xgrid,np.max(l2g_data['lonc']+pixel_width/2*self.xmargin))+2,self.ncols)
+            row0 = max(np.searchsorted(self.ygrid,np.min(l2g_data['latc']-pixel_height/2*self.ymargin))-2,0)
+            row1 = min(np.searchsorted(self.ygrid,np.max(l2g_data['latc']+pixel_height/2*self.ymargin))+2,self.nrows)
+            window = np.s_[...,row0:row1,col0:col1]
+            sums = F_block_regrid_ccm(l2g_data,self.xmesh[row0:row1,col0:col1],self.ymesh[row0:row1,col0:col1],
+                                      oversampling_list,self.pixel_shape,self.error_model,
+                                      self.k1,self.k2,self.k3,self.xmargin,self.ymargin,
+                                      iblock=ngranule+1,verbose=self.verbose,
+                                      inflatex=self.inflatex,inflatey=self.inflatey,
+                                      sg_scaling=self.sg_scaling,engine=engine,
+                                      bin_by=bin_by,bin_edges=bin_edges,sg_tol=self.sg_tol,
+                                      return_sums=True)
+            if sums is None:
+                self.logger.warning('granule %d cannot be regridded, skipping'%(ngranule+1))
+                continue
+            for key in self.oversampling_list:
+                if key in oversampling_list and key in field_sample_weights.keys():
+                    field_sample_weights[key][window] += sums[0]
+                elif key not in oversampling_list and key not in field_sample_weights.keys():
+                    # previous granules all had this field
+                    field_sample_weights[key] = total_sample_weight.copy()
+            total_sample_weight[window] += sums[0]
+            num_samples[window] += sums[1]
+            for ivar,key in enumerate(oversampling_list):
+                sum_aboves[self.oversampling_list.index(key)][window] += sums[2][ivar]
+            pres_total_sample_weight[window] += sums[3]
+            pres_num_samples[window] += sums[4]
+            pres_sum_aboves[window] += sums[5]
+            found_keys.update(oversampling_list)
+            ngranule += 1
+            nl2 += len(l2g_data['latc'])
+            self.logger.info('granule %d: %d pixels folded into rows %d-%d, columns %d-%d'%(
+                ngranule,len(l2g_data['latc']),row0,row1,col0,col1))
+        self.nl2 = nl2
+        if ngranule == 0:
+            self.logger.warning('No pixel to be regridded, returning...')
+            return
+        oversampling_list = [key for key in self.oversampling_list if key in found_keys]
+        sum_aboves = [sum_aboves[self.oversampling_list.index(key)] for key in oversampling_list]
+        self.oversampling_list_final = oversampling_list
+        with np.errstate(invalid='ignore',divide='ignore'):
+            if bin_by is None:
+                l3_data = F_block_l3_from_sums(self.xmesh,self.ymesh,oversampling_list,
+                                               total_sample_weight,num_samples,sum_aboves,
+                                               pres_total_sample_weight,pres_num_samples,pres_sum_aboves)
+            else:
+                l3_bins = [F_block_l3_from_sums(self.xmesh,self.ymesh,oversampling_list,
+                                                total_sample_weight[ibin],num_samples[ibin],
+                                                [sum_above[ibin] for sum_above in sum_aboves],
+                                                pres_total_sample_weight[ibin],pres_num_samples[ibin],
+                                                pres_sum_aboves[ibin]) for ibin in range(len(bin_edges)-1)]
+                l3_data = {k:(v if k in ['xmesh','ymesh'] else np.stack([l3_bin[k] for l3_bin in l3_bins]))
+                           for (k,v) in l3_bins[0].items()}
+            # cloud_pressure is averaged by the pres_* sums, which only granules with it add to
+            for key in oversampling_list:
+                if key in field_sample_weights.keys() and key != 'cloud_pressure':
+                    l3_data[key] = sum_aboves[oversampling_list.index(key)]/field_sample_weights[key]
+        if bin_by is None:
+            return self.F_wrap_l3_data(l3_data)
+        return self.F_wrap_l3_data(l3_data,bin_edges,bin_by=bin_by)
+    
+    def F_parallel_regrid(self,l2g_data=None,block_length=200,ncores=None,engine='loop',
+                          operator=None,shared_memory=False,bin_by=None,bin_edges=None,
+                          scheduler=None,chunksize=1,max_block_cost=None,executor=None,
+                          time_bins=None):
         '''
         regrid from l2g to l3 in parallel by cutting the l3 mesh into blocks
         l2g_data:
@@ -8419,23 +11122,67 @@ class popy(object):
             l3 mesh grid will be cut to square blocks with this length
         ncores:
             number of cores
+        engine:
+            'loop' or 'vectorized', see F_block_regrid_ccm
+        operator:
+            sparse weight operator from F_build_regrid_operator, built from the same l2g_data.
+            if provided, fields are oversampled by mat-vec and ncores/block_length/engine are ignored
+        shared_memory:
+            if True, l2g columns are published once in multiprocessing.shared_memory, pixels are
+            sorted by latitude so each block reads a contiguous index range, and workers write their
+            block directly into shared output arrays. avoids pickling per-block l2g_data and l3 dicts
+        bin_by/bin_edges:
+            if provided, oversample pixels binned by l2g_data[bin_by] in one pass (see F_block_regrid_ccm)
+            and return a list of Level3_Data, one for each bin
+        scheduler:
+            None dispatches equal blocks in order with Pool.map. 'cost' orders blocks by estimated
+            cost (pixel count x kernel patch area), optionally splits heavy ones, and dispatches
+            them largest-first with imap_unordered, see F_cost_scheduled_regrid
+        chunksize/max_block_cost:
+            imap_unordered chunksize and quadtree split threshold for scheduler='cost'
+        executor:
+            optional RegridExecutor. its persistent pool is used and ncores is taken from it
+        time_bins:
+            datenum edges or a pandas frequency ('D', 'W', 'M', ...), see F_time_bin_edges. shortcut
+            for bin_by='UTC_matlab_datenum', giving one Level3_Data per period from a single pass.
+            coarser periods can be derived exactly by summing Level3_Accumulator of the bins.
+            with a list of l2g_data, each period is coarsened and merged across layers separately
         created on 2020/07/19
         fix on 2020/08/17 so multiprocess does not consume all the memory
+        updated on 2026/10/17 to add scheduler, executor, and time_bins
         '''
         if l2g_data == None:
             l2g_data = self.l2g_data
+        if time_bins is not None:
+            bin_by = 'UTC_matlab_datenum'
+            bin_edges = self.F_time_bin_edges(time_bins)
         if isinstance(l2g_data,list):
             self.logger.info('l2g_data appears to be a list. each unique layer will be oversampled, coarsened, flux-generated separately, and then merged')
-            l3_object = Level3_Data(proj=self.proj,grid_size=self.flux_grid_size)
+            if operator is not None:
+                raise ValueError('a regrid operator is built from one l2g_data and cannot be applied to a list of l2g_data')
+            # with bin_by/time_bins, each bin is coarsened, flux-generated, and merged separately
+            nbin = 1 if bin_by is None else len(bin_edges)-1
+            l3_objects = [Level3_Data(proj=self.proj,grid_size=self.flux_grid_size) for ibin in range(nbin)]
             for l2g in l2g_data:
-                l3_orbit = self.F_parallel_regrid(l2g,block_length,ncores).block_reduce(self.flux_grid_size)
-                if hasattr(self,'calculate_flux_divergence_kw'):
-                    l3_orbit.calculate_flux_divergence(**self.calculate_flux_divergence_kw)
-                if hasattr(self,'calculate_gradient_kw'):
-                    l3_orbit.calculate_gradient(**self.calculate_gradient_kw)
-                l3_object = l3_object.merge(l3_orbit)
-            l3_object.check()
-            return l3_object
+                l3_layer = self.F_parallel_regrid(l2g,block_length,ncores,engine,
+                                                  shared_memory=shared_memory,bin_by=bin_by,bin_edges=bin_edges,
+                                                  scheduler=scheduler,chunksize=chunksize,
+                                                  max_block_cost=max_block_cost,executor=executor)
+                if not l3_layer:
+                    continue
+                for ibin,l3_orbit in enumerate(l3_layer if bin_by is not None else [l3_layer]):
+                    l3_orbit = l3_orbit.block_reduce(self.flux_grid_size)
+                    if hasattr(self,'calculate_flux_divergence_kw'):
+                        l3_orbit.calculate_flux_divergence(**self.calculate_flux_divergence_kw)
+                    if hasattr(self,'calculate_gradient_kw'):
+                        l3_orbit.calculate_gradient(**self.calculate_gradient_kw)
+                    l3_objects[ibin] = l3_objects[ibin].merge(l3_orbit)
+            for l3_object in l3_objects:
+                if len(l3_object.keys()) > 0:
+                    l3_object.check()
+            if bin_by is not None:
+                return l3_objects
+            return l3_objects[0]
         
         west = self.west ; east = self.east ; south = self.south ; north = self.north
         nrows = self.nrows; ncols = self.ncols
@@ -8455,22 +11202,26 @@ class popy(object):
         self.oversampling_list_final = oversampling_list
 #        error_model = self.error_model
         
+        if operator is not None:
+            validmask = self.F_l2g_valid_mask(l2g_data)
+            l2g_data = {k:v[validmask,] for (k,v) in l2g_data.items()}
+            self.nl2 = len(l2g_data['latc'])
+            self.logger.info('oversampling %d pixels with a precomputed regrid operator'%self.nl2)
+            l3_data = self.F_regrid_with_operator(l2g_data,operator,oversampling_list,bin_by,bin_edges)
+            if l3_data is None:
+                return
+            return self.F_wrap_l3_data(l3_data,bin_edges,proj=self.proj,bin_by=bin_by)
+        
+        if executor is not None:
+            ncores = executor.ncores
         if ncores == 0:
             self.logger.info('ncores = 0 means no parallel and calling F_block_regridd_ccm using the entire domain as a block')
             l3_data = F_block_regrid_ccm(l2g_data,xmesh,ymesh,
                        oversampling_list,self.pixel_shape,self.error_model,
                        self.k1,self.k2,self.k3,xmargin,ymargin,
-                       iblock=1,inflatex=self.inflatex,inflatey=self.inflatey,sg_scaling=self.sg_scaling)
-            l3_data['xgrid'] = self.xgrid
-            l3_data['ygrid'] = self.ygrid
-            l3_object = Level3_Data(grid_size=self.grid_size,
-                                    start_python_datetime=self.start_python_datetime,
-                                    end_python_datetime=self.end_python_datetime,
-                                    instrum=self.instrum,product=self.product)
-            l3_object.assimilate(l3_data)
-            l3_object.check()
-            l3_object.oversampling_list = self.oversampling_list_final
-            return l3_object
+                       iblock=1,inflatex=self.inflatex,inflatey=self.inflatey,sg_scaling=self.sg_scaling,
+                       engine=engine,bin_by=bin_by,bin_edges=bin_edges,sg_tol=self.sg_tol)
+            return self.F_wrap_l3_data(l3_data,bin_edges,bin_by=bin_by)
         
         import multiprocessing
         
@@ -8522,14 +11273,6 @@ class popy(object):
         pixel_south = latc-pixel_height/2*ymargin
         pixel_north = latc+pixel_height/2*ymargin
         
-        block_l2g_data = []
-        for iblock in range(nblock):
-            mask = (pixel_west <= block_xmesh[iblock][0,-1]) &\
-            (pixel_east >= block_xmesh[iblock][0,0]) &\
-            (pixel_south <= block_ymesh[iblock][-1,0]) &\
-            (pixel_north >= block_ymesh[iblock][0,0])
-            self.logger.info('block %d'%(iblock+1)+' contains %d pixels'%np.sum(mask))
-            block_l2g_data.append({k:v[mask,] for (k,v) in l2g_data.items()})
         # parallel stuff
         ncores_max = multiprocessing.cpu_count()
         if(ncores is None):
@@ -8539,15 +11282,37 @@ class popy(object):
             if ncores > ncores_max:
                 self.logger.warning('You asked for more cores than you have! Use max number %d'%ncores_max)
                 ncores = ncores_max
-        self.logger.info('Start parallel computing on '+str(ncores)+' cores...')
-        with multiprocessing.Pool(ncores) as pp:
-            l3_data_list = pp.map( F_block_regrid_wrapper, \
-                        ((block_l2g_data[iblock],block_xmesh[iblock],\
-                          block_ymesh[iblock],oversampling_list,\
-                          self.pixel_shape,self.error_model, \
-                          self.k1,self.k2,self.k3,
-                          xmargin,ymargin,iblock,self.verbose,
-                          self.inflatex,self.inflatey,self.sg_scaling) for iblock in range(nblock) ) )
+        if shared_memory:
+            self.logger.info('Start parallel computing on '+str(ncores)+' cores with shared memory...')
+            l3_data = self.F_shared_memory_regrid(l2g_data,oversampling_list,
+                                                  pixel_west,pixel_east,pixel_south,pixel_north,
+                                                  nblock_row,nblock_col,ncores,engine,
+                                                  bin_by,bin_edges,executor)
+        elif scheduler == 'cost':
+            self.logger.info('Start cost-scheduled parallel computing on '+str(ncores)+' cores...')
+            l3_data = self.F_cost_scheduled_regrid(l2g_data,oversampling_list,
+                                                   pixel_west,pixel_east,pixel_south,pixel_north,
+                                                   nblock_row,nblock_col,ncores,engine,
+                                                   bin_by,bin_edges,chunksize,max_block_cost,executor)
+        else:
+            block_l2g_data = []
+            for iblock in range(nblock):
+                mask = (pixel_west <= block_xmesh[iblock][0,-1]) &\
+                (pixel_east >= block_xmesh[iblock][0,0]) &\
+                (pixel_south <= block_ymesh[iblock][-1,0]) &\
+                (pixel_north >= block_ymesh[iblock][0,0])
+                self.logger.info('block %d'%(iblock+1)+' contains %d pixels'%np.sum(mask))
+                block_l2g_data.append({k:v[mask,] for (k,v) in l2g_data.items()})
+            self.logger.info('Start parallel computing on '+str(ncores)+' cores...')
+            with F_regrid_pool(ncores,executor) as pp:
+                l3_data_list = pp.map( F_block_regrid_wrapper, \
+                            ((block_l2g_data[iblock],block_xmesh[iblock],\
+                              block_ymesh[iblock],oversampling_list,\
+                              self.pixel_shape,self.error_model, \
+                              self.k1,self.k2,self.k3,
+                              xmargin,ymargin,iblock,self.verbose,
+                              self.inflatex,self.inflatey,self.sg_scaling,engine,
+                              bin_by,bin_edges,self.sg_tol) for iblock in range(nblock) ) )
 #        pp = multiprocessing.Pool(ncores)
 #        l3_data_list = pp.map( F_block_regrid_wrapper, \
 #                        ((block_l2g_data[iblock],block_xmesh[iblock],\
@@ -8555,32 +11320,26 @@ class popy(object):
 #                          self.instrum,self.error_model, \
 #                          self.k1,self.k2,self.k3,
 #                          xmargin,ymargin,iblock) for iblock in range(nblock) ) )
-        self.logger.info('Reassemble blocks back to l3 grid')
-        dict_of_lists = {}
-        for iblock in range(nblock):
-            l3_data0 = l3_data_list[iblock]
-            if iblock == 0:
+            self.logger.info('Reassemble blocks back to l3 grid')
+            dict_of_lists = {}
+            for iblock in range(nblock):
+                l3_data0 = l3_data_list[iblock]
+                if iblock == 0:
+                    for key in l3_data0.keys():
+                        dict_of_lists[key] = []
                 for key in l3_data0.keys():
-                    dict_of_lists[key] = []
+                    dict_of_lists[key].append(l3_data0[key])
+            l3_data = {}
             for key in l3_data0.keys():
-                dict_of_lists[key].append(l3_data0[key])
-        l3_data = {}
-        for key in l3_data0.keys():
-            l3_data[key] = np.block([dict_of_lists[key][i:i+nblock_col] for i in range(0,nblock,nblock_col)])
-        l3_data['xgrid'] = self.xgrid
-        l3_data['ygrid'] = self.ygrid
-        l3_object = Level3_Data(grid_size=self.grid_size,
-                                start_python_datetime=self.start_python_datetime,
-                                end_python_datetime=self.end_python_datetime,
-                                instrum=self.instrum,product=self.product)
-        l3_object.assimilate(l3_data)
-        l3_object.check()
-        l3_object.oversampling_list = self.oversampling_list_final
-        return l3_object
+                l3_data[key] = np.block([dict_of_lists[key][i:i+nblock_col] for i in range(0,nblock,nblock_col)])
+        return self.F_wrap_l3_data(l3_data,bin_edges,bin_by=bin_by)
     
-    def F_parallel_regrid_proj(self,l2g_data=None,block_length=200,ncores=None):
+    def F_parallel_regrid_proj(self,l2g_data=None,block_length=200,ncores=None,engine='loop',
+                               executor=None):
         '''
         projection version of F_parallel_regrid. written on 2021/09/26
+        executor:
+            optional RegridExecutor, see F_parallel_regrid. added on 2026/10/17
         '''
         if self.proj is None:
             self.logger.error('this function is only for projection')
@@ -8613,6 +11372,8 @@ class popy(object):
         self.oversampling_list_final = oversampling_list
 #        error_model = self.error_model
         
+        if executor is not None:
+            ncores = executor.ncores
         if ncores == 0:
             self.logger.info('ncores forced to be 1 and use multiprocessing')
             ncores = 1
@@ -8686,14 +11447,15 @@ class popy(object):
                 self.logger.warning('You asked for more cores than you have! Use max number %d'%ncores_max)
                 ncores = ncores_max
         self.logger.info('Start parallel computing on '+str(ncores)+' cores...')
-        with multiprocessing.Pool(ncores) as pp:
+        with F_regrid_pool(ncores,executor) as pp:
             l3_data_list = pp.map( F_block_regrid_wrapper, \
                         ((block_l2g_data[iblock],block_xmesh[iblock],\
                           block_ymesh[iblock],oversampling_list,\
                           self.pixel_shape,self.error_model, \
                           self.k1,self.k2,self.k3,
                           xmargin,ymargin,iblock,self.verbose,
-                          self.inflatex,self.inflatey,self.sg_scaling) for iblock in range(nblock) ) )
+                          self.inflatex,self.inflatey,self.sg_scaling,engine,
+                          None,None,self.sg_tol) for iblock in range(nblock) ) )
         
         self.logger.info('Reassemble blocks back to l3 grid')
         dict_of_lists = {}
@@ -8727,9 +11489,6 @@ class popy(object):
         if self.proj is not None:
             self.logger.error('projection not supported here')
             return
-        import cv2
-        # conda install -c scitools/label/archive shapely
-        from shapely.geometry import Polygon
         west = self.west ; east = self.east ; south = self.south ; north = self.north
         nrows = self.nrows; ncols = self.ncols
         xgrid = self.xgrid ; ygrid = self.ygrid ; xmesh = self.xmesh ; ymesh = self.ymesh
@@ -8820,7 +11579,7 @@ class popy(object):
             # This might be faster
             patch_lonr = np.array([lonr[i,:] - patch_west[i] for i in range(nl2)]) ; patch_lonr[patch_lonr<0.0] += 360.0
             patch_lonc = lonc - patch_west ; patch_lonc[patch_lonc<0.0] += 360.0
-            area_weight = [Polygon(np.column_stack([patch_lonr[i,:],latr[i,:].squeeze()])).area for i in range(nl2)]
+            area_weight = F_polygon_area(patch_lonr,latr)
             # Compute transforms for SG outside loop
             vlist = np.zeros((nl2,4,2),dtype=np.float32)
             for n in range(4):
@@ -8831,7 +11590,7 @@ class popy(object):
             fwhmx = np.linalg.norm(xvector,axis=1)
             fwhmy = np.linalg.norm(yvector,axis=1)
             fixedPoints = np.array([[-fwhmx,-fwhmy],[-fwhmx,fwhmy],[fwhmx,fwhmy],[fwhmx,-fwhmy]],dtype=np.float32).transpose((2,0,1))/2.0
-            tform = [cv2.getPerspectiveTransform(vlist[i,:,:].squeeze(),fixedPoints[i,:,:].squeeze()) for i in range(nl2)]
+            tform = F_perspective_transforms(vlist,fixedPoints)
         
         elif self.pixel_shape == 'elliptical':
             # Set 
@@ -9389,7 +12148,7 @@ class popy(object):
             sounding_interp = F_interp_era5_3D(sounding_lon,sounding_lat,sounding_datenum,
                                                sounding_p0,sounding_p1,nlevel,
                                                era5_dir=met_dir,interp_fields=['u','v'],
-                                               fn_header=fn_header_local)
+                                               fn_header=fn_header_local,met_cache=self.met_cache)
             self.logger.info('averaging 3D wind vertically...')
             if fix_height is None:
                 self.l2g_data['era5_ubar'] = np.nanmean(sounding_interp['u'],axis=1)
@@ -9424,7 +12183,8 @@ class popy(object):
             sounding_profiles,sounding_pEdge = \
             F_interp_gcrs(sounding_lon,sounding_lat,sounding_datenum,
                           sounding_ps,gcrs_dir=met_dir,
-                          product=self.product,if_monthly=if_monthly)
+                          product=self.product,if_monthly=if_monthly,
+                          met_cache=self.met_cache)
             self.l2g_data['gcrs_'+self.product+'_profiles'] = sounding_profiles
             self.l2g_data['gcrs_plevel'] = sounding_pEdge
             self.logger.info('GEOS-Chem profiles sampled at level 2 g locations')
@@ -9455,7 +12215,8 @@ class popy(object):
         sounding_datenum = self.l2g_data['UTC_matlab_datenum']
         if which_met in {'era','era5','ERA','ERA5'}:
             sounding_interp = F_interp_era5(sounding_lon,sounding_lat,sounding_datenum,
-                                            met_dir,interp_fields,fn_header)
+                                            met_dir,interp_fields,fn_header,
+                                            met_cache=self.met_cache)
             for key in sounding_interp.keys():
                 self.logger.info(key+' from ERA5 is sampled to L2g coordinate/time')
                 self.l2g_data['era5_'+key] = np.float32(sounding_interp[key])
@@ -9466,7 +12227,8 @@ class popy(object):
             else:
                 fn_header_local = fn_header
             sounding_interp = F_interp_geos_mat(sounding_lon,sounding_lat,sounding_datenum,
-                                            met_dir,interp_fields,time_collection,fn_header_local)
+                                            met_dir,interp_fields,time_collection,fn_header_local,
+                                            met_cache=self.met_cache)
             for key in sounding_interp.keys():
                 self.logger.info(key+' from GEOS-FP is sampled to L2g coordinate/time')
                 self.l2g_data['geosfp_'+key] = np.float32(sounding_interp[key])
@@ -9476,7 +12238,8 @@ class popy(object):
             else:
                 fn_header_local = fn_header
             sounding_interp = F_interp_narr_mat(sounding_lon,sounding_lat,sounding_datenum,
-                                            met_dir,interp_fields,fn_header_local)
+                                            met_dir,interp_fields,fn_header_local,
+                                            met_cache=self.met_cache)
             for key in sounding_interp.keys():
                 self.logger.info(key+' from NARR is sampled to L2g coordinate/time')
                 self.l2g_data['narr_'+key] = np.float32(sounding_interp[key])
@@ -9486,13 +12249,15 @@ class popy(object):
             else:
                 fn_header_local = fn_header
             sounding_interp = F_interp_merra2(sounding_lon,sounding_lat,sounding_datenum,
-                                            met_dir,interp_fields,fn_header_local)
+                                            met_dir,interp_fields,fn_header_local,
+                                            met_cache=self.met_cache)
             for key in sounding_interp.keys():
                 self.logger.info(key+' from MERRA2 is sampled to L2g coordinate/time')
                 self.l2g_data['merra2_'+key] = np.float32(sounding_interp[key])
         elif which_met.lower() == 'hrrr':
             sounding_interp = F_interp_hrrr_mat(sounding_lon,sounding_lat,sounding_datenum,
-                                                met_dir,interp_fields)
+                                                met_dir,interp_fields,
+                                                met_cache=self.met_cache)
             for key in sounding_interp.keys():
                 self.logger.info(key+' from HRRR is sampled to L2g coordinate/time')
                 self.l2g_data['hrrr_'+key] = np.float32(sounding_interp[key])
@@ -0,0 +1,75 @@
+'''
+synthetic level 2g swaths and level 3 comparisons shared by the tests
+'''
+import numpy as np
+import pytest
+
+import popy
+
+WEST,EAST,SOUTH,NORTH = -100.,-98.,30.,32.
+
+def make_popy(grid_size=0.02,oversampling_list=None,**kwargs):
+    '''a small TROPOMI NO2 domain over three days'''
+    o = popy.popy(instrum='TROPOMI',product='NO2',west=WEST,east=EAST,south=SOUTH,north=NORTH,
+                  grid_size=grid_size,start_year=2020,start_month=1,start_day=1,
+                  end_year=2020,end_month=1,end_day=3,**kwargs)
+    o.oversampling_list = oversampling_list or ['column_amount','cloud_fraction','cloud_pressure']
+    return o
+
+def make_l2g(o,n=400,seed=0):
+    '''skewed quadrilateral pixels, some outside the box and time interval'''
+    rng = np.random.default_rng(seed)
+    lonc = rng.uniform(WEST-0.1,EAST+0.1,n)
+    latc = rng.uniform(SOUTH-0.1,NORTH+0.1,n)
+    dx = rng.uniform(0.02,0.06,n)
+    dy = rng.uniform(0.02,0.05,n)
+    lonr = np.stack([lonc-dx,lonc-dx*0.9,lonc+dx,lonc+dx*1.1],axis=1)
+    latr = np.stack([latc-dy,latc+dy,latc+dy*1.1,latc-dy*0.9],axis=1)
+    cloud_fraction = np.where(rng.random(n) < 0.3,0.,rng.random(n))
+    return {'lonc':lonc,'latc':latc,'lonr':lonr,'latr':latr,
+            'column_amount':rng.normal(1,0.3,n),
+            'column_uncertainty':rng.uniform(0.1,0.3,n),
+            'cloud_fraction':cloud_fraction,
+            'cloud_pressure':rng.uniform(300,900,n),
+            'albedo':rng.uniform(0,0.3,n),
+            'UTC_matlab_datenum':rng.uniform(o.start_matlab_datenum-0.2,o.end_matlab_datenum+0.2,n)}
+
+def copy_l2g(l2g):
+    '''regrid functions may pop and filter keys in place'''
+    return {k:v.copy() for (k,v) in l2g.items()}
+
+def assert_l3_close(a,b,keys=('column_amount','total_sample_weight','num_samples'),rtol=1e-9):
+    for key in keys:
+        x = np.asarray(a[key],dtype=np.float64)
+        y = np.asarray(b[key],dtype=np.float64)
+        np.testing.assert_array_equal(np.isnan(x),np.isnan(y),err_msg=key)
+        np.testing.assert_allclose(x[~np.isnan(x)],y[~np.isnan(y)],rtol=rtol,
+                                   atol=rtol*np.nanmax(np.abs(y)),err_msg=key)
+
+def make_wind_l3(seed=0,nrows=40,ncols=50):
+    '''a TROPOMI NO2 l3 with wind_column = wind_topo/scale height + chemistry + albedo bias + noise'''
+    rng = np.random.default_rng(seed)
+    l3 = popy.Level3_Data(grid_size=0.1,instrum='TROPOMI',product='NO2')
+    l3['xgrid'] = WEST+0.05+np.arange(ncols)*0.1
+    l3['ygrid'] = SOUTH+0.05+np.arange(nrows)*0.1
+    shape = (nrows,ncols)
+    l3['num_samples'] = rng.uniform(1,10,shape)
+    l3['total_sample_weight'] = l3['num_samples']*rng.uniform(0.5,2,shape)
+    l3['column_amount'] = rng.uniform(5e-5,2e-4,shape)
+    l3['wind_topo'] = l3['column_amount']*rng.uniform(0.0005,0.06,shape)*rng.choice([-1,1],shape)
+    l3['albedo'] = rng.uniform(0,0.3,shape)
+    l3['wind_albedo_0'] = rng.normal(0,1e-9,shape)
+    l3['wind_albedo_1'] = l3['wind_albedo_0']*rng.uniform(0,0.3,shape)
+    l3['wind_column'] = -l3['wind_topo']/1500+l3['column_amount']*2e-5+2*l3['wind_albedo_1']\
+    +rng.standard_t(3,shape)*1e-9
+    # missing wind columns outside the fit_topography range, which fit_bc drops after resampling
+    l3['wind_column'][(np.abs(l3['wind_topo']/l3['column_amount']) < 0.001) & (rng.random(shape) < 0.5)] = np.nan
+    return l3
+
+@pytest.fixture
+def o():
+    return make_popy()
+
+@pytest.fixture
+def l2g(o):
+    return make_l2g(o)
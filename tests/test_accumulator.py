@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import popy
+from conftest import make_popy,make_l2g,copy_l2g,assert_l3_close
+
+def regrid(o,l2g,**kwargs):
+    return o.F_parallel_regrid(copy_l2g(l2g),block_length=30,ncores=2,engine='vectorized',**kwargs)
+
+@pytest.mark.parametrize('oversampling_list',[['column_amount','cloud_fraction','cloud_pressure','albedo'],
+                                              ['column_amount','albedo']])
+def test_save_read_round_trip(tmp_path,oversampling_list):
+    o = make_popy(oversampling_list=oversampling_list)
+    acc = popy.Level3_Accumulator(regrid(o,make_l2g(o)))
+    # without cloud_fraction, there are no pres_* weights to save
+    assert ('pres_total_sample_weight' in acc) == ('cloud_fraction' in oversampling_list)
+    filename = str(tmp_path/'acc.nc')
+    acc.save_nc(filename)
+    acc_read = popy.Level3_Accumulator().read_nc(filename)
+    assert set(acc_read.keys()) == set(acc.keys())
+    for key in acc.keys():
+        np.testing.assert_array_equal(acc_read[key],acc[key],err_msg=key)
+    np.testing.assert_allclose(acc_read.xgrid,acc.xgrid)
+    np.testing.assert_allclose(acc_read.ygrid,acc.ygrid)
+    # Level3_Data.read_nc also reads every saved sum by default
+    l3 = popy.Level3_Data().read_nc(filename,read_sums=True)
+    assert set(l3.sums.keys()) == set(acc.keys())
+    assert_l3_close(acc_read.to_level3(),acc.to_level3(),oversampling_list+['total_sample_weight','num_samples'])
+
+def test_daily_sums_add_up_to_the_period(o,l2g):
+    l3s = regrid(o,l2g,time_bins='D')
+    assert len(l3s) == 3
+    total = sum(popy.Level3_Accumulator(l3) for l3 in l3s)
+    ref = regrid(o,l2g)
+    keys = ('column_amount','cloud_fraction','cloud_pressure','total_sample_weight','num_samples')
+    assert_l3_close(total.to_level3(),ref,keys)
+    # a list may also start with a Level3_Data, or hold only Level3_Data
+    assert_l3_close(sum([l3s[0],popy.Level3_Accumulator(l3s[1]),l3s[2]]).to_level3(),ref,keys)
+    assert_l3_close(sum(l3s).to_level3(),ref,keys)
+    assert total.start_python_datetime == min(l3.start_python_datetime for l3 in l3s)
+    assert total.end_python_datetime == max(l3.end_python_datetime for l3 in l3s)
@@ -0,0 +1,107 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+import popy
+
+pytest.importorskip('geopandas')
+pytest.importorskip('cartopy')
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'RRNES'))
+import basin_emissions
+
+from conftest import make_wind_l3
+
+BASIN_XYS = [(np.array([-99.6,-98.4,-98.2,-99.1,-99.7]),np.array([30.3,30.5,31.6,33.,31.9]))]
+
+def loop_bootstrap_sums(l3s,fit_name,base_field,basis_fields,remove_intercept):
+    '''form each bootstrap field and sum it by sum_by_mask, one replicate at a time'''
+    b_sum_mat = np.full((len(l3s),getattr(l3s[0],fit_name).nbootstrap),np.nan)
+    for (il,l) in enumerate(l3s):
+        for (ib,bparam) in enumerate(getattr(l,fit_name).bootstrap_params):
+            l['b_field'] = l[base_field].copy()
+            for (k,v) in basis_fields(l).items():
+                l['b_field'] -= bparam[k]*l[v]
+            if remove_intercept:
+                l['b_field'] -= bparam['Intercept']
+            b_sum_mat[il,ib] = l.sum_by_mask(xys=BASIN_XYS,fields_to_sum=['b_field'])['b_field']
+            l.pop('b_field')
+    return b_sum_mat
+
+@pytest.mark.parametrize('remove_intercept',[True,False])
+def test_bootstrap_sum_mat_matches_loop(remove_intercept):
+    basin = basin_emissions.Basin(xys=BASIN_XYS,name='test')
+    l3s = []
+    for seed in range(3):
+        l3 = make_wind_l3(seed=seed)
+        l3['total_sample_weight'][0,:5] = np.nan
+        l3.fit_topography(max_iter=1,solver='numpy',nbootstrap=10)
+        l3.fit_bc(keys=['albedo'],orders=[[0,1]],solver='numpy',nbootstrap=10)
+        l3s.append(l3)
+    b_sum_mat = basin.get_bootstrap_sum_mat(l3s,'topo_fit','wind_column',{'wt':'wind_topo'},
+                                            remove_intercept=remove_intercept)
+    ref = loop_bootstrap_sums(l3s,'topo_fit','wind_column',lambda l:{'wt':'wind_topo'},remove_intercept)
+    assert b_sum_mat.shape == (3,10)
+    np.testing.assert_allclose(b_sum_mat,ref,rtol=1e-12)
+    b_sum_mat = basin.get_bootstrap_sum_mat(l3s,'bc_fit','wind_column_topo',remove_intercept=remove_intercept)
+    ref = loop_bootstrap_sums(l3s,'bc_fit','wind_column_topo',lambda l:{k:k for k in l.bc_fields},remove_intercept)
+    np.testing.assert_allclose(b_sum_mat,ref,rtol=1e-12)
+
+def make_inventory(grid_size=0.01,seed=0):
+    rng = np.random.default_rng(seed)
+    inv = basin_emissions.Inventory(west=-100,east=-98,south=30,north=32)
+    inv.grid_size = grid_size
+    inv['xgrid'] = np.arange(-100+grid_size/2,-98,grid_size)
+    inv['ygrid'] = np.arange(30+grid_size/2,32,grid_size)
+    inv['data'] = rng.random((len(inv['ygrid']),len(inv['xgrid'])))
+    inv['data'][rng.random(inv['data'].shape) < 0.1] = np.nan
+    return inv
+
+def make_target(grid_size,west=-99.5,east=-98.3,south=30.2,north=31.6):
+    l3 = popy.Level3_Data(grid_size=grid_size)
+    l3['xgrid'] = np.arange(west+grid_size/2,east,grid_size)
+    l3['ygrid'] = np.arange(south+grid_size/2,north,grid_size)
+    return l3
+
+def test_drop_in_the_box_matches_loop():
+    inv = make_inventory()
+    l3 = make_target(0.05,west=-99.513)
+    data = inv.regrid(l3,method='drop_in_the_box',fields_to_copy=[])['data']
+    ref = np.full((len(l3['ygrid']),len(l3['xgrid'])),np.nan)
+    for (iy,y) in enumerate(l3['ygrid']):
+        ymask = (inv['ygrid'] >= y-l3.grid_size/2) & (inv['ygrid'] < y+l3.grid_size/2)
+        for (ix,x) in enumerate(l3['xgrid']):
+            xmask = (inv['xgrid'] >= x-l3.grid_size/2) & (inv['xgrid'] < x+l3.grid_size/2)
+            with np.errstate(invalid='ignore'):
+                ref[iy,ix] = np.nanmean(inv['data'][np.ix_(ymask,xmask)])
+    np.testing.assert_allclose(data,ref,rtol=1e-12)
+
+def test_conservative_regrid_conserves_mass():
+    inv = make_inventory()
+    inv['data'] = np.nan_to_num(inv['data'])
+    # target cells covering the whole source grid
+    l3 = make_target(0.05,west=-100,east=-98,south=30,north=32)
+    data = inv.regrid(l3,method='conservative',fields_to_copy=[])['data']
+    xoverlap,yoverlap = inv.get_overlap(l3['xgrid'],l3['ygrid'],l3.grid_size)
+    area = np.cos(np.deg2rad(inv['ygrid']))[:,np.newaxis]
+    dst_area = yoverlap@np.broadcast_to(area,inv['data'].shape)@xoverlap.T
+    np.testing.assert_allclose(np.sum(data*dst_area),np.sum(inv['data']*area)*inv.grid_size**2,rtol=1e-12)
+    # a constant field stays constant, and the same grid is the identity
+    inv['data'][:] = 2.
+    np.testing.assert_allclose(inv.regrid(l3,method='conservative',fields_to_copy=[])['data'],2.,rtol=1e-12)
+    inv = make_inventory()
+    same = make_target(inv.grid_size,west=-100,east=-98,south=30,north=32)
+    np.testing.assert_allclose(inv.regrid(same,method='conservative',fields_to_copy=[])['data'],inv['data'],rtol=1e-12)
+
+def test_overlap_cache_is_bounded():
+    inv = make_inventory()
+    l3 = make_target(0.05)
+    overlaps = inv.get_overlap(l3['xgrid'],l3['ygrid'],l3.grid_size)
+    assert inv.get_overlap(l3['xgrid'],l3['ygrid'],l3.grid_size) is overlaps
+    for i in range(inv.overlap_cache_size+3):
+        l3 = make_target(0.05+0.001*i)
+        inv.regrid(l3,method='conservative',fields_to_copy=[])
+    assert len(inv.overlap_cache) == inv.overlap_cache_size
+    # caches are per inventory
+    assert len(make_inventory().overlap_cache) == 0
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+import popy
+from conftest import make_popy,make_l2g,copy_l2g,WEST,EAST,SOUTH,NORTH
+
+def fine_masks(grid_size):
+    '''a binary disk and a fractional square on a grid 7 times finer, centers off the l3 cell edges'''
+    res = grid_size/7
+    xgrid = np.arange(WEST+res/3,EAST,res)
+    ygrid = np.arange(NORTH-res/3,SOUTH,-res)
+    xmesh,ymesh = np.meshgrid(xgrid,ygrid)
+    disk = np.hypot(xmesh+99.2,ymesh-31.1) < 0.3
+    square = np.where((np.abs(xmesh+98.6) < 0.2) & (np.abs(ymesh-30.7) < 0.25),0.5,0.)
+    square[disk] = 1.
+    return [dict(xgrid=xgrid,ygrid=ygrid,data=disk,xres=res,yres=-res),
+            dict(xgrid=xgrid,ygrid=ygrid,data=square,xres=res,yres=-res)]
+
+def loop_mask(l3,tif_dict):
+    '''fine mask values summed in each l3 cell, one cell at a time'''
+    mask = np.zeros(l3['num_samples'].shape)
+    for (ix,x) in enumerate(l3['xgrid']):
+        for (iy,y) in enumerate(l3['ygrid']):
+            xmask = (tif_dict['xgrid'] >= x-l3.grid_size/2) & (tif_dict['xgrid'] <= x+l3.grid_size/2)
+            ymask = (tif_dict['ygrid'] >= y-l3.grid_size/2) & (tif_dict['ygrid'] <= y+l3.grid_size/2)
+            mask[iy,ix] = np.nansum(tif_dict['data'][np.ix_(ymask,xmask)])
+    return mask
+
+def make_l3s(n=2):
+    o = make_popy(grid_size=0.05)
+    return [o.F_parallel_regrid(copy_l2g(make_l2g(o,seed=seed)),ncores=0) for seed in range(n)]
+
+def test_finer_mask_weights_match_loop():
+    l3 = make_l3s(1)[0]
+    tif_dicts = fine_masks(l3.grid_size)
+    weights = popy.F_finer_mask_weights(l3['xgrid'],l3['ygrid'],tif_dicts,grid_size=l3.grid_size)
+    for (iregion,tif_dict) in enumerate(tif_dicts):
+        ref = loop_mask(l3,tif_dict)
+        assert ref.max() > 0
+        np.testing.assert_allclose(weights[iregion].toarray().reshape(ref.shape),ref,rtol=1e-12)
+    # a label raster gives one region per label
+    labels = dict(tif_dicts[0],data=np.where(tif_dicts[0]['data'],3,0)+(tif_dicts[1]['data'] == 0.5)*5)
+    weights = popy.F_finer_mask_weights(l3['xgrid'],l3['ygrid'],labels,labels=[5,3],grid_size=l3.grid_size)
+    np.testing.assert_allclose(weights[1].toarray().reshape(l3['num_samples'].shape),loop_mask(l3,tif_dicts[0]))
+    np.testing.assert_allclose(weights[0].toarray().reshape(l3['num_samples'].shape),
+                               loop_mask(l3,dict(tif_dicts[1],data=tif_dicts[1]['data'] == 0.5)))
+
+def test_average_by_finer_mask_matches_loop():
+    l3 = make_l3s(1)[0]
+    for tif_dict in fine_masks(l3.grid_size):
+        result = l3.average_by_finerMask(tif_dict=tif_dict)
+        ref = l3.average_by_nonBinaryMask(loop_mask(l3,tif_dict))
+        assert set(result.keys()) == set(ref.keys())
+        for key in ref.keys():
+            np.testing.assert_allclose(result[key],ref[key],rtol=1e-9,err_msg=key)
+
+def test_average_by_finer_masks_matches_one_mask_at_a_time():
+    l3s = make_l3s(2)
+    tif_dicts = fine_masks(l3s[0].grid_size)
+    fields_to_average = ['column_amount','num_samples']
+    one_at_a_time = popy.Level3_List(pd.period_range('2020-01-01',periods=len(l3s),freq='D'))
+    all_at_once = popy.Level3_List(pd.period_range('2020-01-01',periods=len(l3s),freq='D'))
+    for l3 in l3s:
+        one_at_a_time.append(l3)
+        all_at_once.append(l3)
+    for (name,tif_dict) in zip(['disk','square'],tif_dicts):
+        # plain dicts have no name and are saved as unknown_mask columns
+        one_at_a_time.average_by_finerMask(tif_dict,fields_to_average=fields_to_average)
+        one_at_a_time.df = one_at_a_time.df.rename(columns=lambda c:c.replace('unknown_mask',name))
+    all_at_once.average_by_finerMasks(tif_dicts,mask_names=['disk','square'],fields_to_average=fields_to_average)
+    # the caller's list is not extended with sum_num_samples
+    assert fields_to_average == ['column_amount','num_samples']
+    for name in ['disk','square']:
+        for f in ['column_amount','num_samples','sum_num_samples']:
+            column = '{}_{}'.format(name,f)
+            np.testing.assert_allclose(all_at_once.df[column],one_at_a_time.df[column],rtol=1e-9,err_msg=column)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import popy
+from conftest import make_wind_l3
+
+def test_ols_matches_statsmodels():
+    smf = pytest.importorskip('statsmodels.formula.api')
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a':rng.normal(0,1e-6,200),'b':rng.normal(5e3,10,200)})
+    df['y'] = 3*df['a']-1e-4*df['b']+rng.normal(0,1e-7,200)
+    ref = smf.ols('y ~ a + b',data=df).fit()
+    fit = popy.F_ols(df['y'].values,df[['a','b']].values,['a','b'])
+    # the intercept cancels b*params['b'], so it keeps fewer digits
+    np.testing.assert_allclose(fit.params.values,ref.params.values,rtol=1e-6)
+    np.testing.assert_allclose(fit.bse.values,ref.bse.values,rtol=1e-6)
+    np.testing.assert_allclose(fit.resid,ref.resid.values,rtol=0,atol=1e-10*np.abs(df['y']).max())
+    assert fit.rsquared == pytest.approx(ref.rsquared,rel=1e-10)
+    assert fit.mse_resid == pytest.approx(ref.mse_resid,rel=1e-10)
+    assert list(fit.params.index) == list(ref.params.index)
+
+@pytest.mark.parametrize('max_iter',[1,3])
+def test_fit_topography_bootstrap_matches_serial_fits(max_iter):
+    pytest.importorskip('statsmodels')
+    nbootstrap = 20
+    l3 = make_wind_l3()
+    l3.fit_topography(max_iter=max_iter,solver='statsmodels')
+    ref_fit = l3.topo_fit
+    np.random.seed(1)
+    l3.fit_topography(max_iter=max_iter,solver='numpy',nbootstrap=nbootstrap)
+    np.testing.assert_allclose(l3.topo_fit.params.values,ref_fit.params.values,rtol=1e-8)
+    np.testing.assert_allclose(l3.topo_fit.bse.values,ref_fit.bse.values,rtol=1e-8)
+    bootstrap_params = l3.topo_fit.bootstrap_params
+    assert len(bootstrap_params) == nbootstrap
+    # the same resampled rows as if_bootstrap fits drawn one by one from the same seed
+    np.random.seed(1)
+    for i in range(nbootstrap):
+        l3.fit_topography(max_iter=max_iter,solver='statsmodels',if_bootstrap=True)
+        np.testing.assert_allclose(bootstrap_params[i].values,l3.topo_fit.params.values,rtol=1e-8)
+
+def test_fit_bc_bootstrap_matches_serial_fits():
+    pytest.importorskip('statsmodels')
+    nbootstrap = 20
+    l3 = make_wind_l3()
+    l3.fit_topography(max_iter=1)
+    np.random.seed(2)
+    l3.fit_bc(keys=['albedo'],orders=[[0,1]],solver='numpy',nbootstrap=nbootstrap)
+    bootstrap_params = l3.bc_fit.bootstrap_params
+    np.random.seed(2)
+    for i in range(nbootstrap):
+        l3.fit_bc(keys=['albedo'],orders=[[0,1]],if_bootstrap=True)
+        np.testing.assert_allclose(bootstrap_params[i].values,l3.bc_fit.params.values,rtol=1e-8)
+
+def test_numpy_solver_matches_statsmodels():
+    pytest.importorskip('statsmodels')
+    fits = {}
+    for solver in ['statsmodels','numpy']:
+        l3 = make_wind_l3()
+        l3.fit_topography(max_iter=3,solver=solver)
+        l3.fit_chemistry(min_windtopo=0.001,max_windtopo=0.01,max_wind_column=1,max_iter=2,solver=solver)
+        # fit_albedo also corrects XCH4 (ppb)
+        l3['XCH4'] = np.full(l3['albedo'].shape,1850.)
+        l3.fit_albedo(min_windtopo=0.001,max_windtopo=0.01,max_iter=2,solver=solver)
+        l3.fit_bc(keys=['albedo'],orders=[[0,1]],solver=solver)
+        fits[solver] = l3
+    for attr in ['topo_fit','chem_fit','alb_fit','bc_fit']:
+        ref = getattr(fits['statsmodels'],attr)
+        fit = getattr(fits['numpy'],attr)
+        np.testing.assert_allclose(fit.params.values,ref.params.values,rtol=1e-7,err_msg=attr)
+        np.testing.assert_allclose(fit.bse.values,ref.bse.values,rtol=1e-7,err_msg=attr)
+    for key in ['wind_column_topo','wind_column_topo_chem','wind_column_topo_alb','wind_column_topo_bc']:
+        np.testing.assert_allclose(fits['numpy'][key],fits['statsmodels'][key],rtol=1e-7,atol=1e-20,err_msg=key)
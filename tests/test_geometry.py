@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+import popy
+
+def test_perspective_transforms_match_opencv():
+    cv2 = pytest.importorskip('cv2')
+    rng = np.random.default_rng(0)
+    n = 50
+    src = rng.normal(0,0.05,(n,4,2))+np.array([[-1,-1],[-1,1],[1,1],[1,-1]])*rng.uniform(0.02,0.1,(n,1,1))
+    dst = np.tile(np.array([[-1.,-1.],[-1.,1.],[1.,1.],[1.,-1.]]),(n,1,1))
+    tforms = popy.F_perspective_transforms(src,dst)
+    assert tforms.shape == (n,3,3)
+    for i in range(n):
+        ref = cv2.getPerspectiveTransform(np.float32(src[i]),np.float32(dst[i]))
+        np.testing.assert_allclose(tforms[i],ref,rtol=1e-4,atol=1e-4*np.abs(ref).max())
+
+def test_polygon_area_matches_loop():
+    rng = np.random.default_rng(0)
+    x = np.array([0.,1.,1.2,-0.1])+rng.normal(0,0.05,(20,4))
+    y = np.array([0.,0.,1.,0.9])+rng.normal(0,0.05,(20,4))
+    ref = [0.5*abs(sum(xi[j]*yi[(j+1)%4]-xi[(j+1)%4]*yi[j] for j in range(4))) for (xi,yi) in zip(x,y)]
+    np.testing.assert_allclose(popy.F_polygon_area(x,y),ref,rtol=1e-12)
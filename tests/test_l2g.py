@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import popy
+from conftest import make_popy,make_l2g,copy_l2g
+
+def granules(o,n=5):
+    return [make_l2g(o,n=50+10*i,seed=i) for i in range(n)]
+
+def test_l2g_builder_matches_repeated_concatenation(o):
+    gs = granules(o)
+    # a field missing from one granule is dropped, as F_merge_l2g_data keeps common fields
+    gs[2].pop('albedo')
+    ref = copy_l2g(gs[0])
+    for g in gs[1:]:
+        ref = {k:np.concatenate((ref[k],g[k]),0) for k in ref.keys() if k in g.keys()}
+    builder = popy.L2GBuilder(dtypes={'cloud_pressure':np.float32})
+    for g in gs:
+        builder.append(g)
+    assert builder.nl2 == sum(len(g['latc']) for g in gs)
+    l2g_data = builder.finalize()
+    assert set(l2g_data.keys()) == set(ref.keys())
+    for key in ref.keys():
+        np.testing.assert_array_equal(l2g_data[key],ref[key].astype(l2g_data[key].dtype),err_msg=key)
+    assert l2g_data['cloud_pressure'].dtype == np.float32 and l2g_data['lonr'].shape == ref['lonr'].shape
+    merged = o.F_merge_l2g_data(copy_l2g(gs[0]),copy_l2g(gs[1]))
+    for key in gs[0].keys():
+        np.testing.assert_array_equal(merged[key],np.concatenate((gs[0][key],gs[1][key]),0))
+
+def save_l2g(o,l2g,tmp_path,chunk_size=64):
+    o.l2g_data = copy_l2g(l2g)
+    mat_filename = str(tmp_path/'l2g.mat')
+    store_dir = str(tmp_path/'l2g_store')
+    o.F_save_l2g_to_mat(mat_filename)
+    o.F_save_l2g_to_store(store_dir,chunk_size=chunk_size)
+    return mat_filename,store_dir
+
+def assert_l2g_equal(a,b):
+    assert set(a.keys()) == set(b.keys())
+    for key in a.keys():
+        np.testing.assert_array_equal(a[key],b[key],err_msg=key)
+
+def test_l2g_store_matches_mat_file(o,l2g,tmp_path):
+    # pixels sorted by latitude, so that chunks outside the box are skipped
+    order = np.argsort(l2g['latc'])
+    l2g = {k:v[order,] for (k,v) in l2g.items()}
+    mat_filename,store_dir = save_l2g(o,l2g,tmp_path)
+    for kwargs in [dict(),dict(usekeys=['column_amount','lonr','latr']),dict(if_conserve=True)]:
+        o.F_mat_reader(mat_filename,**kwargs)
+        ref = o.l2g_data
+        o.F_mat_reader(store_dir,**kwargs)
+        assert_l2g_equal({k:np.asarray(v) for (k,v) in o.l2g_data.items()},ref)
+        assert o.nl2 == len(ref['latc'])
+    # a box in the south skips the northern chunks, with the same pixels as the .mat file
+    o_south = make_popy()
+    o_south.north = o_south.south+0.5
+    o_south.F_mat_reader(mat_filename)
+    ref = o_south.l2g_data
+    import json
+    with open(store_dir+'/manifest.json') as f:
+        manifest = json.load(f)
+    assert len(o_south.F_l2g_store_chunks(manifest)) < len(manifest['chunks'])
+    o_south.F_mat_reader(store_dir)
+    assert len(ref['latc']) > 0
+    assert_l2g_equal(o_south.l2g_data,ref)
+    # in-place changes never reach the store
+    o.F_mat_reader(store_dir,if_conserve=True)
+    o.l2g_data['column_amount'][:] = 0
+    o.F_mat_reader(store_dir,if_conserve=True)
+    assert np.any(o.l2g_data['column_amount'] != 0)
+
+def test_mat_reader_filter_first_matches_filtered_full_read(o,l2g,tmp_path):
+    mat_filename,_ = save_l2g(o,l2g,tmp_path)
+    o_box = make_popy()
+    o_box.north = (o_box.south+o_box.north)/2
+    o_box.maxcf = 0.3
+    o_box.F_mat_reader(mat_filename,if_conserve=True)
+    full = o_box.l2g_data
+    mask = o_box.F_l2g_filter_mask(full)
+    assert 0 < mask.sum() < len(mask)
+    ref = {k:v[mask,] for (k,v) in full.items()}
+    o_box.F_mat_reader(mat_filename)
+    assert_l2g_equal(o_box.l2g_data,ref)
+    assert o_box.nl2 == mask.sum()
+    usekeys = ['column_amount','latr']
+    o_box.F_mat_reader(mat_filename,usekeys=usekeys)
+    assert_l2g_equal(o_box.l2g_data,{k:ref[k] for k in usekeys+['latc','lonc','UTC_matlab_datenum']})
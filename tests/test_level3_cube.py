@@ -0,0 +1,71 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import popy
+from conftest import make_wind_l3
+
+FIELDS = ['wind_column','column_amount']
+
+@pytest.fixture
+def l3_files(tmp_path):
+    filenames = []
+    for (i,start) in enumerate(pd.date_range('2020-01-01',periods=4,freq='MS')):
+        l3 = make_wind_l3(seed=i)
+        l3.start_python_datetime = start.to_pydatetime()
+        l3.end_python_datetime = (start+pd.offsets.MonthEnd(1)).to_pydatetime()
+        filenames.append(str(tmp_path/'l3_{}.nc'.format(i)))
+        # save_nc appends the grid and weights to the list it is given
+        l3.save_nc(filenames[-1],fields_name=list(FIELDS))
+    return filenames
+
+def read_list(l3_files):
+    l3s = popy.Level3_List(pd.period_range('2020-01',periods=len(l3_files),freq='M'))
+    for filename in l3_files:
+        l3s.append(popy.Level3_Data().read_nc(filename,fields_name=FIELDS))
+    return l3s
+
+def test_cube_matches_level3_list(l3_files,tmp_path):
+    l3s = read_list(l3_files)
+    for memmap_dir in [None,str(tmp_path/'memmap')]:
+        l3c = popy.Level3_Cube(l3s.dt_array,memmap_dir=memmap_dir).read_nc_pattern(l3_list=l3_files,fields_name=FIELDS)
+        # fields are read on first access
+        assert 'column_amount' in l3c and len(dict.keys(l3c)) == 0
+        assert l3c['column_amount'].shape == (4,)+l3s[0]['column_amount'].shape
+        assert list(dict.keys(l3c)) == ['column_amount']
+        for (itime,l3) in enumerate(l3s):
+            l3_cube = l3c.get_l3(itime)
+            assert l3_cube.start_python_datetime == l3.start_python_datetime
+            for key in FIELDS+['num_samples','total_sample_weight']:
+                np.testing.assert_allclose(l3_cube[key],l3[key],rtol=1e-6,err_msg=key)
+
+def test_cube_aggregate_matches_merge(l3_files):
+    l3s = read_list(l3_files)
+    l3c = popy.Level3_Cube(l3s.dt_array).read_nc_pattern(l3_list=l3_files,fields_name=FIELDS)
+    merged = popy.Level3_Data()
+    for l3 in l3s[1:3]:
+        merged = merged.merge(l3)
+    aggregated = l3c.aggregate(datetime.datetime(2020,2,1),datetime.datetime(2020,3,31))
+    assert aggregated.start_python_datetime == merged.start_python_datetime
+    for key in FIELDS+['num_samples','total_sample_weight']:
+        # float32 fields, summed in a different order
+        np.testing.assert_allclose(aggregated[key],merged[key],rtol=1e-6,
+                                   atol=1e-6*np.nanmax(np.abs(merged[key])),err_msg=key)
+
+def test_cube_trim_and_sum_by_mask_match_level3_list(l3_files):
+    l3s = read_list(l3_files)
+    l3c = popy.Level3_Cube(l3s.dt_array).read_nc_pattern(l3_list=l3_files,fields_name=FIELDS)
+    l3c['wind_column']
+    box = dict(west=-99.5,east=-98.1,south=30.4,north=32.)
+    trimmed = l3c.trim(**box)
+    for (itime,l3) in enumerate(l3s):
+        l3_trimmed = l3.trim(**box)
+        for key in FIELDS:
+            np.testing.assert_allclose(trimmed.get_l3(itime)[key],l3_trimmed[key],rtol=1e-6,err_msg=key)
+    xys = [(np.array([-99.6,-98.4,-98.2,-99.1]),np.array([30.3,30.5,31.6,33.]))]
+    l3c.sum_by_mask(xys=xys,fields_to_sum=['wind_column'])
+    l3s.sum_by_mask(xys=xys,fields_to_sum=['wind_column'])
+    for column in ['summed_wind_column','averaged_num_samples']:
+        np.testing.assert_allclose(l3c.df[column],l3s.df[column],rtol=1e-6,err_msg=column)
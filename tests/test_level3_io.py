@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+import popy
+from conftest import make_wind_l3
+
+FIELDS = ['wind_column','column_amount','albedo']
+
+def test_windowed_read_matches_trim(tmp_path):
+    l3 = make_wind_l3()
+    filename = str(tmp_path/'l3.nc')
+    l3.save_nc(filename,fields_name=list(FIELDS),chunksizes=(16,16))
+    full = popy.Level3_Data().read_nc(filename,fields_name=FIELDS)
+    for key in FIELDS+['num_samples','total_sample_weight']:
+        np.testing.assert_allclose(full[key],l3[key],rtol=1e-6,err_msg=key)
+    box = dict(west=l3['xgrid'][7]-0.01,east=l3['xgrid'][30]+0.01,south=l3['ygrid'][3]-0.01,north=l3['ygrid'][21]+0.01)
+    window = popy.Level3_Data().read_nc(filename,fields_name=FIELDS,**box)
+    trimmed = full.trim(**box)
+    assert window['column_amount'].shape == (19,24)
+    for key in ['xgrid','ygrid','num_samples','total_sample_weight']+FIELDS:
+        np.testing.assert_array_equal(window[key],trimmed[key],err_msg=key)
+    # only the fields asked for are read
+    assert 'albedo' not in popy.Level3_Data().read_nc(filename,fields_name=['column_amount'],**box).keys()
+
+def test_quantized_fields_keep_their_digits(tmp_path):
+    l3 = make_wind_l3()
+    l3['albedo_scaled'] = l3['albedo']*100
+    filename = str(tmp_path/'l3.nc')
+    l3.save_nc(filename,fields_name=['albedo_scaled','column_amount'],
+               fields_policy={'albedo_scaled':{'least_significant_digit':2,'complevel':9}})
+    l3_read = popy.Level3_Data().read_nc(filename,fields_name=['albedo_scaled','column_amount'])
+    np.testing.assert_allclose(l3_read['albedo_scaled'],l3['albedo_scaled'],rtol=0,atol=0.01)
+    np.testing.assert_allclose(l3_read['column_amount'],l3['column_amount'],rtol=1e-6)
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+
+import popy
+
+class CountingReader(object):
+    '''a met reader that records which variables it decodes'''
+    def __init__(self):
+        self.calls = []
+    def __call__(self,fn,varnames,window=None):
+        self.calls.append(list(varnames))
+        rng = np.random.default_rng(len(os.path.basename(fn)))
+        out = {'lat':np.linspace(-10,10,21),'lon':np.linspace(0,30,31)}
+        for varname in ['u','v']:
+            out[varname] = rng.normal(size=(24,21,31))
+        if window is not None:
+            out = {k:(v[window] if v.ndim == 3 else v) for (k,v) in out.items()}
+        return {k:out[k] for k in varnames}
+
+def test_met_cache_decodes_only_missing_variables(tmp_path):
+    fn = str(tmp_path/'era5_20200101.nc')
+    open(fn,'w').close()
+    reader = CountingReader()
+    cache = popy.MetCache()
+    first = cache.F_read('era5',fn,['lat','u'],reader=reader)
+    second = cache.F_read('era5',fn,['lat','u','v'],reader=reader)
+    assert reader.calls == [['lat','u'],['v']]
+    assert second['u'] is first['u'] and not second['u'].flags.writeable
+    np.testing.assert_array_equal(second['v'],reader(fn,['v'])['v'])
+    assert (cache.hits,cache.misses) == (2,3)
+    # windows are cached separately
+    window = (slice(0,6),slice(2,9),slice(None))
+    np.testing.assert_array_equal(cache.F_read('era5',fn,['u'],reader=reader,window=window)['u'],first['u'][window])
+    assert cache.misses == 4
+
+def test_met_cache_lru_and_disk(tmp_path):
+    fn = str(tmp_path/'era5_20200101.nc')
+    open(fn,'w').close()
+    reader = CountingReader()
+    u = reader(fn,['u'])['u']
+    cache = popy.MetCache(max_bytes=u.nbytes+100)
+    cache.F_read('era5',fn,['u','v'],reader=reader)
+    assert len(cache.data) == 1 and cache.nbytes <= cache.max_bytes
+    cache_dir = str(tmp_path/'cache')
+    popy.MetCache(cache_dir=cache_dir).F_read('era5',fn,['lat','u'],reader=reader)
+    # a new process memory-maps the float32 cube instead of decoding
+    cache = popy.MetCache(cache_dir=cache_dir)
+    ncalls = len(reader.calls)
+    cached = cache.F_read('era5',fn,['lat','u'],reader=reader)
+    assert len(reader.calls) == ncalls
+    assert cached['u'].dtype == np.float32 and cached['lat'].dtype == np.float64
+    np.testing.assert_allclose(cached['u'],u,rtol=1e-6)
+    # touching the met file invalidates its cubes
+    os.utime(fn,(os.path.getatime(fn),os.path.getmtime(fn)+10))
+    popy.MetCache(cache_dir=cache_dir).F_read('era5',fn,['u'],reader=reader)
+    assert reader.calls[-1] == ['u']
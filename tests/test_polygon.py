@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from matplotlib import path
+
+import popy
+
+def ring(x0,y0,r,n=7,reverse=False,seed=0):
+    '''a star-shaped non-convex ring'''
+    rng = np.random.default_rng(seed)
+    theta = np.sort(rng.uniform(0,2*np.pi,n))
+    radius = r*rng.uniform(0.4,1,n)
+    x = x0+radius*np.cos(theta) ; y = y0+radius*np.sin(theta)
+    return (x[::-1],y[::-1]) if reverse else (x,y)
+
+def compound_path(rings):
+    '''a path with explicit CLOSEPOLY codes, one subpath per ring'''
+    vertices = [] ; codes = []
+    for (x,y) in rings:
+        vertices += list(zip(x,y))+[(x[0],y[0])]
+        codes += [path.Path.MOVETO]+[path.Path.LINETO]*(len(x)-1)+[path.Path.CLOSEPOLY]
+    return path.Path(vertices,codes)
+
+def square(x0,y0,r,reverse=False):
+    x = x0+np.array([-r,r,r,-r]) ; y = y0+np.array([-r,-r,r,r])
+    return (x[::-1],y[::-1]) if reverse else (x,y)
+
+# grid centers off the polygon vertices, so that no center falls on a boundary
+XGRID = np.linspace(-1.013,1.011,157)
+YGRID = np.linspace(-0.987,1.009,143)
+
+PATHS = {'star':[ring(0,0,0.9,n=11)],
+         'nested same orientation':[square(0,0,0.8),square(0,0,0.4)],
+         'nested opposite orientation':[square(0,0,0.8),square(0,0,0.4,reverse=True)],
+         'three levels':[square(0,0,0.9),square(0,0,0.6,reverse=True),square(0,0,0.3)],
+         'overlapping':[ring(-0.3,0,0.6,seed=1),ring(0.3,0.1,0.6,seed=2,reverse=True)]}
+
+def contains(p,xgrid,ygrid):
+    xmesh,ymesh = np.meshgrid(xgrid,ygrid)
+    return p.contains_points(np.column_stack([xmesh.ravel(),ymesh.ravel()])).reshape(xmesh.shape)
+
+@pytest.mark.parametrize('name',PATHS.keys())
+def test_polygon_raster_matches_contains_points(name):
+    p = compound_path(PATHS[name])
+    ref = contains(p,XGRID,YGRID)
+    assert ref.any() and not ref.all()
+    np.testing.assert_array_equal(popy.F_polygon_raster(XGRID,YGRID,p),ref)
+    # descending grids
+    np.testing.assert_array_equal(popy.F_polygon_raster(XGRID[::-1],YGRID[::-1],p),ref[::-1,::-1])
+    # each ring as a (x, y) polygon in a list
+    np.testing.assert_array_equal(popy.F_polygon_raster(XGRID,YGRID,PATHS[name]),ref)
+
+@pytest.mark.parametrize('name',PATHS.keys())
+def test_polygon_raster_evenodd(name):
+    p = compound_path(PATHS[name])
+    ref = np.zeros((len(YGRID),len(XGRID)),dtype=bool)
+    for r in PATHS[name]:
+        ref ^= contains(path.Path(np.column_stack(r)),XGRID,YGRID)
+    np.testing.assert_array_equal(popy.F_polygon_raster(XGRID,YGRID,p,evenodd=True),ref)
+
+def test_polygon_raster_coverage():
+    p = compound_path([square(0.05,-0.02,0.5)])
+    coverage = popy.F_polygon_raster(XGRID,YGRID,p,subsample=8)
+    cell_area = np.median(np.diff(XGRID))*np.median(np.diff(YGRID))
+    assert np.sum(coverage)*cell_area == pytest.approx(1.,rel=2e-2)
+    assert coverage.min() == 0 and coverage.max() == 1
+
+def test_polygon_mask_cache(tmp_path):
+    p = compound_path(PATHS['three levels'])
+    cache = popy.PolygonMaskCache(cache_dir=str(tmp_path))
+    mask = popy.F_polygon_mask(XGRID,YGRID,p,cache=cache)
+    np.testing.assert_array_equal(mask,popy.F_polygon_raster(XGRID,YGRID,p))
+    assert popy.F_polygon_mask(XGRID,YGRID,p,cache=cache) is mask
+    assert (cache.hits,cache.misses) == (1,1)
+    assert not mask.flags.writeable
+    # the fill rule is part of the key
+    assert not np.array_equal(popy.F_polygon_mask(XGRID,YGRID,p,cache=cache,evenodd=True),mask)
+    assert cache.misses == 2
+    # a new process loads the masks saved on disk
+    cache = popy.PolygonMaskCache(cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(cache.F_mask(XGRID,YGRID,p),mask)
+    assert (cache.hits,cache.misses) == (1,0)
+    # the lru stays within max_bytes
+    cache = popy.PolygonMaskCache(max_bytes=mask.nbytes*2)
+    for r in [0.2,0.3,0.4,0.5]:
+        cache.F_mask(XGRID,YGRID,[square(0,0,r)])
+    assert len(cache.data) == 2 and cache.nbytes <= cache.max_bytes
+
+def test_points_in_polygons_matches_contains_point():
+    rng = np.random.default_rng(0)
+    n = 200
+    rings = [ring(0,0,1,n=5,seed=i) for i in range(n)]
+    xr = np.array([r[0] for r in rings]) ; yr = np.array([r[1] for r in rings])
+    x = rng.uniform(-1,1,n) ; y = rng.uniform(-1,1,n)
+    ref = [path.Path(np.column_stack([xr[i],yr[i]])).contains_point((x[i],y[i])) for i in range(n)]
+    inside = popy.F_points_in_polygons(x,y,xr,yr)
+    assert 0 < np.sum(inside) < n
+    np.testing.assert_array_equal(inside,ref)
@@ -0,0 +1,167 @@
+import numpy as np
+import pytest
+
+import popy
+from conftest import make_popy,make_l2g,copy_l2g,assert_l3_close
+
+KEYS = ('column_amount','cloud_fraction','cloud_pressure','total_sample_weight','num_samples',
+        'pres_total_sample_weight','pres_num_samples')
+
+def test_vectorized_engine_matches_loop(o,l2g):
+    loop = o.F_parallel_regrid(copy_l2g(l2g),ncores=0,engine='loop')
+    vectorized = o.F_parallel_regrid(copy_l2g(l2g),ncores=0,engine='vectorized')
+    assert np.sum(np.isfinite(loop['cloud_pressure'])) > 0
+    assert_l3_close(vectorized,loop,KEYS)
+
+def filtered(o,l2g):
+    '''pixels within the box and time interval, as the ncores > 0 paths regrid them'''
+    mask = o.F_l2g_valid_mask(copy_l2g(l2g))
+    return {k:v[mask,] for (k,v) in l2g.items()}
+
+def test_regrid_operator_matches_block_regrid(o,l2g):
+    ref = o.F_parallel_regrid(filtered(o,l2g),ncores=0,engine='loop')
+    operator = o.F_build_regrid_operator(copy_l2g(l2g))
+    l3 = o.F_parallel_regrid(copy_l2g(l2g),operator=operator)
+    assert_l3_close(l3,ref,KEYS)
+    # the same operator regrids any other field of the same pixels
+    l2g_new = copy_l2g(l2g)
+    l2g_new['column_amount'] = l2g_new['column_amount']**2
+    ref = o.F_parallel_regrid(filtered(o,l2g_new),ncores=0,engine='loop')
+    assert_l3_close(o.F_parallel_regrid(l2g_new,operator=operator),ref,KEYS)
+
+def test_shared_memory_matches_block_regrid(o,l2g):
+    ref = o.F_parallel_regrid(copy_l2g(l2g),block_length=30,ncores=2,engine='vectorized')
+    l3 = o.F_parallel_regrid(copy_l2g(l2g),block_length=30,ncores=2,engine='vectorized',shared_memory=True)
+    assert_l3_close(l3,ref,KEYS)
+
+def test_binned_regrid_matches_regrid_by_bin(o,l2g):
+    bin_edges = np.array([0.,0.1,0.2,0.3])
+    l3s = o.F_parallel_regrid(copy_l2g(l2g),ncores=0,bin_by='albedo',bin_edges=bin_edges)
+    assert len(l3s) == len(bin_edges)-1
+    for (ibin,l3) in enumerate(l3s):
+        inbin = (l2g['albedo'] >= bin_edges[ibin]) & (l2g['albedo'] < bin_edges[ibin+1])
+        ref = o.F_parallel_regrid({k:v[inbin,] for (k,v) in l2g.items()},ncores=0,engine='loop')
+        assert_l3_close(l3,ref,KEYS)
+
+def test_binned_regrid_of_l2g_list():
+    o = make_popy(flux_grid_size=0.04,oversampling_list=['column_amount'])
+    l2g = make_l2g(o)
+    half = len(l2g['latc'])//2
+    layers = [{k:v[:half,] for (k,v) in l2g.items()},{k:v[half:,] for (k,v) in l2g.items()}]
+    bin_edges = np.array([0.,0.15,0.3])
+    l3s = o.F_parallel_regrid([copy_l2g(layer) for layer in layers],block_length=30,ncores=2,
+                              bin_by='albedo',bin_edges=bin_edges)
+    assert len(l3s) == len(bin_edges)-1
+    for (ibin,l3) in enumerate(l3s):
+        ref = o.F_parallel_regrid([{k:v[(layer['albedo'] >= bin_edges[ibin]) & (layer['albedo'] < bin_edges[ibin+1]),]
+                                    for (k,v) in layer.items()} for layer in layers],block_length=30,ncores=2)
+        assert_l3_close(l3,ref)
+    with pytest.raises(ValueError):
+        o.F_parallel_regrid([copy_l2g(layer) for layer in layers],operator=o.F_build_regrid_operator(copy_l2g(l2g)))
+
+def test_cost_scheduler_matches_block_regrid(o,l2g):
+    ref = o.F_parallel_regrid(copy_l2g(l2g),block_length=30,ncores=2,engine='vectorized')
+    l3 = o.F_parallel_regrid(copy_l2g(l2g),block_length=30,ncores=2,engine='vectorized',
+                             scheduler='cost',chunksize=2)
+    assert_l3_close(l3,ref,KEYS)
+    # heavy blocks are split into quadrants, which moves block boundaries. compare with
+    # regridding every scheduled block by the loop engine from the filtered pixels whose
+    # extents reach it, as F_parallel_regrid selects them for each block
+    l3 = o.F_parallel_regrid(copy_l2g(l2g),block_length=30,ncores=2,engine='vectorized',
+                             scheduler='cost',max_block_cost=1000)
+    assert len(o.block_timings) > 9
+    l2g_valid = filtered(o,l2g)
+    half_width = np.ptp(l2g_valid['lonr'],axis=1)/2*o.xmargin
+    half_height = np.ptp(l2g_valid['latr'],axis=1)/2*o.ymargin
+    ref = {key:np.full((o.nrows,o.ncols),np.nan) for key in KEYS}
+    for b in o.block_timings:
+        rows = slice(b['row0'],b['row1']);cols = slice(b['col0'],b['col1'])
+        mask = (np.abs(l2g_valid['lonc']-np.clip(l2g_valid['lonc'],o.xgrid[cols][0],o.xgrid[cols][-1])) <= half_width) &\
+        (np.abs(l2g_valid['latc']-np.clip(l2g_valid['latc'],o.ygrid[rows][0],o.ygrid[rows][-1])) <= half_height)
+        l3_block = popy.F_block_regrid_ccm({k:v[mask,] for (k,v) in l2g_valid.items()},o.xmesh[rows,cols],o.ymesh[rows,cols],
+                                           o.oversampling_list,o.pixel_shape,o.error_model,
+                                           o.k1,o.k2,o.k3,o.xmargin,o.ymargin,
+                                           inflatex=o.inflatex,inflatey=o.inflatey,sg_scaling=o.sg_scaling)
+        for key in KEYS:
+            ref[key][rows,cols] = l3_block[key]
+    assert_l3_close(l3,ref,KEYS)
+    # tiny cost thresholds stop at blocks of 2-3 cells a side
+    l3 = o.F_parallel_regrid(copy_l2g(l2g),block_length=30,ncores=2,engine='vectorized',
+                             scheduler='cost',max_block_cost=1)
+    assert min(min(b['row1']-b['row0'],b['col1']-b['col0']) for b in o.block_timings) >= 2
+
+def test_executor_matches_new_pools(o,l2g):
+    kwargs = [dict(),dict(shared_memory=True),dict(scheduler='cost')]
+    refs = [o.F_parallel_regrid(copy_l2g(l2g),block_length=30,ncores=2,engine='vectorized',**kw) for kw in kwargs]
+    with popy.RegridExecutor(ncores=2) as executor:
+        pool = executor.pool
+        for (kw,ref) in zip(kwargs,refs):
+            l3 = o.F_parallel_regrid(copy_l2g(l2g),block_length=30,engine='vectorized',executor=executor,**kw)
+            assert_l3_close(l3,ref,KEYS)
+            # the same workers serve every call
+            assert executor.pool is pool
+    assert executor.pool is None
+
+def test_stream_regrid_matches_merged_regrid(o,l2g):
+    granules = [{k:v[i::3,] for (k,v) in l2g.items()} for i in range(3)]
+    l3 = o.F_stream_regrid([copy_l2g(g) for g in granules])
+    ref = o.F_parallel_regrid(filtered(o,l2g),ncores=0,engine='loop')
+    assert_l3_close(l3,ref,KEYS)
+    # a field missing from a granule is averaged over the granules that have it
+    o = make_popy(oversampling_list=['column_amount','albedo'])
+    granules[1].pop('albedo')
+    l3 = o.F_stream_regrid([copy_l2g(g) for g in granules])
+    ref = o.F_parallel_regrid(filtered(o,l2g),ncores=0,engine='loop')
+    assert_l3_close(l3,ref,('column_amount','total_sample_weight','num_samples'))
+    o_albedo = make_popy(oversampling_list=['albedo'])
+    ref = o_albedo.F_parallel_regrid(filtered(o_albedo,{k:np.concatenate([granules[0][k],granules[2][k]])
+                                                        for k in l2g.keys()}),ncores=0,engine='loop')
+    assert_l3_close(l3,ref,('albedo',))
+
+def test_stream_regrid_time_bins(o,l2g):
+    granules = [{k:v[i::3,] for (k,v) in l2g.items()} for i in range(3)]
+    l3s = o.F_stream_regrid([copy_l2g(g) for g in granules],time_bins='D')
+    bin_edges = o.F_time_bin_edges('D')
+    assert len(l3s) == len(bin_edges)-1
+    l2g_valid = filtered(o,l2g)
+    for (ibin,l3) in enumerate(l3s):
+        inbin = (l2g_valid['UTC_matlab_datenum'] >= bin_edges[ibin]) & (l2g_valid['UTC_matlab_datenum'] < bin_edges[ibin+1])
+        ref = o.F_parallel_regrid({k:v[inbin,] for (k,v) in l2g_valid.items()},ncores=0,engine='loop')
+        assert_l3_close(l3,ref,KEYS)
+
+def test_time_bins_match_regrid_by_day(o,l2g):
+    bin_edges = o.F_time_bin_edges('D')
+    np.testing.assert_allclose(bin_edges,o.start_matlab_datenum+np.arange(4))
+    # weekly periods are clipped to the popy time range
+    np.testing.assert_allclose(o.F_time_bin_edges('W')[[0,-1]],[o.start_matlab_datenum,o.end_matlab_datenum])
+    l2g_valid = filtered(o,l2g)
+    refs = []
+    for ibin in range(len(bin_edges)-1):
+        inbin = (l2g_valid['UTC_matlab_datenum'] >= bin_edges[ibin]) & (l2g_valid['UTC_matlab_datenum'] < bin_edges[ibin+1])
+        refs.append(o.F_parallel_regrid({k:v[inbin,] for (k,v) in l2g_valid.items()},ncores=0,engine='loop'))
+    for kwargs in [dict(time_bins='D'),dict(time_bins=bin_edges),dict(time_bins='D',shared_memory=True)]:
+        l3s = o.F_parallel_regrid(copy_l2g(l2g_valid),ncores=0 if len(kwargs) == 1 else 2,**kwargs)
+        assert len(l3s) == len(refs)
+        for (l3,ref) in zip(l3s,refs):
+            assert_l3_close(l3,ref,KEYS)
+
+@pytest.mark.parametrize('engine',['loop','vectorized'])
+def test_sg_tol_truncation_error_is_bounded(o,l2g,engine):
+    exact = o.F_parallel_regrid(copy_l2g(l2g),ncores=0,engine=engine)
+    weight = exact['total_sample_weight']
+    npix = len(l2g['latc'])
+    for sg_tol in [1e-300,1e-6,1e-3]:
+        o.sg_tol = sg_tol
+        l3 = o.F_parallel_regrid(copy_l2g(l2g),ncores=0,engine=engine)
+        # only kernel values below sg_tol times their peak, at most a cell's weight, are dropped
+        dropped = weight-l3['total_sample_weight']
+        assert dropped.min() >= -1e-12*weight.max()
+        assert dropped.max() <= sg_tol*npix*weight.max()
+        # so an average changes by at most the dropped fraction of its weight times the field range
+        covered = weight > 1e-2*weight.max()
+        field_range = np.nanmax(np.abs(l2g['column_amount']))*2
+        error = np.abs(l3['column_amount']-exact['column_amount'])[covered]
+        assert np.all(error <= dropped[covered]/l3['total_sample_weight'][covered]*field_range+1e-12*field_range)
+    # a vanishing tolerance keeps every cell
+    o.sg_tol = 1e-300
+    assert_l3_close(o.F_parallel_regrid(copy_l2g(l2g),ncores=0,engine=engine),exact,KEYS)
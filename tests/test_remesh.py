@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.interpolate import RegularGridInterpolator
+
+import popy
+from conftest import make_wind_l3
+
+WEIGHT_KEYS = ['total_sample_weight','pres_total_sample_weight','num_samples','pres_num_samples']
+GRID_KEYS = ['xgrid','ygrid','nrows','nrow','ncols','ncol','xmesh','ymesh','lonmesh','latmesh']
+
+def interpolator_remesh(l3,xgrid,ygrid):
+    '''the former Level3_Data.remesh by RegularGridInterpolator(method='nearest')'''
+    new_grid_size = np.mean([np.median(np.diff(xgrid)),np.median(np.diff(ygrid))])
+    if new_grid_size >= 2*l3.grid_size:
+        l3 = l3.block_reduce(new_grid_size)
+    ymesh,xmesh = np.meshgrid(ygrid,xgrid,indexing='ij')
+    result = {}
+    for key in l3.keys():
+        if key in GRID_KEYS:
+            continue
+        fill_value = 0. if key in WEIGHT_KEYS else np.nan
+        f = RegularGridInterpolator((l3['ygrid'],l3['xgrid']),l3[key],bounds_error=False,
+                                    fill_value=fill_value,method='nearest')
+        result[key] = f((ymesh,xmesh))
+        if key in WEIGHT_KEYS:
+            result[key][np.isnan(result[key])] = 0.
+    return result
+
+def assert_remeshed(l3_new,ref):
+    assert set(k for k in l3_new.keys() if k not in GRID_KEYS) == set(ref.keys())
+    for key in ref.keys():
+        np.testing.assert_array_equal(l3_new[key],ref[key],err_msg=key)
+
+@pytest.mark.parametrize('grid_size,offset',[(0.1,0.03),(0.1,-0.31),(0.04,0.013),(0.25,0.),(0.3,0.07)])
+def test_remesh_matches_interpolator(grid_size,offset):
+    l3 = make_wind_l3()
+    xgrid = np.arange(l3['xgrid'][0]-1+offset,l3['xgrid'][-1]+0.5,grid_size)
+    ygrid = np.arange(l3['ygrid'][0]-0.5+offset,l3['ygrid'][-1]+1,grid_size)
+    l3_new = l3.remesh(xgrid,ygrid)
+    np.testing.assert_array_equal(l3_new['xgrid'],xgrid)
+    np.testing.assert_array_equal(l3_new['ygrid'],ygrid)
+    assert_remeshed(l3_new,interpolator_remesh(l3,xgrid,ygrid))
+
+def test_remesh_align():
+    l3 = make_wind_l3()
+    # a larger grid that contains every source cell center
+    xgrid = l3['xgrid'][0]+np.arange(-7,len(l3['xgrid'])+3)*l3.grid_size
+    ygrid = l3['ygrid'][0]+np.arange(-2,len(l3['ygrid'])+9)*l3.grid_size
+    l3_new = l3.remesh_align(xgrid,ygrid)
+    assert_remeshed(l3_new,interpolator_remesh(l3,xgrid,ygrid))
+    for key in ['wind_column','num_samples']:
+        np.testing.assert_array_equal(l3_new[key][2:2+len(l3['ygrid']),7:7+len(l3['xgrid'])],l3[key])
+    # grids that do not align fall back to remesh
+    assert_remeshed(l3.remesh_align(xgrid+0.04,ygrid),interpolator_remesh(l3,xgrid+0.04,ygrid))
+
+def test_level3_list_remesh_reuses_index_maps():
+    l3s = popy.Level3_List(pd.period_range('2020-01',periods=3,freq='M'))
+    for seed in range(3):
+        l3s.append(make_wind_l3(seed=seed))
+    xgrid = np.arange(l3s[0]['xgrid'][0]+0.02,l3s[0]['xgrid'][-1],0.2)
+    ygrid = np.arange(l3s[0]['ygrid'][0]-0.3,l3s[0]['ygrid'][-1],0.2)
+    for (l3,l3_new) in zip(l3s,l3s.remesh(xgrid,ygrid)):
+        assert_remeshed(l3_new,interpolator_remesh(l3,xgrid,ygrid))
+    remesher = popy.Remesher(l3s[0]['xgrid'],l3s[0]['ygrid'],l3s[0].grid_size,xgrid,ygrid)
+    assert_remeshed(l3s[1].remesh(xgrid,ygrid,remesher=remesher),interpolator_remesh(l3s[1],xgrid,ygrid))